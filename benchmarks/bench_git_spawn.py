@@ -0,0 +1,85 @@
+"""Compare the latency of running git through a shell with exec'ing it directly.
+
+Usage:
+    python benchmarks/bench_git_spawn.py [path/to/repo] [--runs N]
+
+Each of moonbunny's request types is run the old way (`shlex.join` and
+`create_subprocess_shell`, with the inherited environment) and the current way
+(`create_subprocess_exec` with the runner's tuned environment), and the median
+wall time of each is reported.
+"""
+
+import argparse
+import asyncio
+import os
+import shlex
+import statistics
+import time
+
+from moonbunny.git import (
+    _GIT_ENVIRONMENT,
+    _GIT_OPTIONS,
+    GitRequestAllFileDiffs,
+    GitRequestCommits,
+    GitRequestCurrentBranchName,
+    GitRequestFileStatus,
+    GitRequestRefs,
+)
+from moonbunny.messages import GitCommand
+from moonbunny.models import RefKind
+
+
+async def run_shell(argv: list[str]) -> None:
+    process = await asyncio.create_subprocess_shell(
+        shlex.join(argv),
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    await process.communicate()
+
+
+async def run_exec(argv: list[str]) -> None:
+    process = await asyncio.create_subprocess_exec(
+        *argv,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        env=_GIT_ENVIRONMENT,
+    )
+    await process.communicate()
+
+
+async def median_ms(run, argv: list[str], runs: int) -> float:
+    timings: list[float] = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        await run(argv)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("repo", nargs="?", default=os.getcwd())
+    parser.add_argument("--runs", type=int, default=30)
+    args = parser.parse_args()
+
+    commands: list[GitCommand] = [
+        GitRequestCurrentBranchName(),
+        GitRequestFileStatus(),
+        GitRequestRefs(RefKind.BRANCH),
+        GitRequestCommits("HEAD"),
+        GitRequestAllFileDiffs(),
+    ]
+
+    print(f"{'command':<32} {'shell ms':>10} {'exec ms':>10} {'saved ms':>10}")
+    for command in commands:
+        shell_argv = ["git", "-C", args.repo, *command.command[1:]]
+        exec_argv = ["git", *_GIT_OPTIONS, "-C", args.repo, *command.command[1:]]
+        shell = await median_ms(run_shell, shell_argv, args.runs)
+        exec_ = await median_ms(run_exec, exec_argv, args.runs)
+        name = type(command).__name__
+        print(f"{name:<32} {shell:>10.2f} {exec_:>10.2f} {shell - exec_:>10.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,95 @@
+"""Benchmark turning `git log` output into the commits panel's items.
+
+Usage:
+    python benchmarks/bench_log.py [--commits N] [--runs N]
+
+A synthetic log of `--commits` commits is handled the old way (`|` separated
+lines, split again for each option's ID and search text, and once more to
+store the commits) and the current way (`%x00` separated lines, parsed once
+into `Commit` records by `moonbunny.porcelain.parse_log`). The median wall
+time and the peak memory allocated by each are reported.
+"""
+
+import argparse
+import random
+import statistics
+import time
+import tracemalloc
+from typing import Callable
+
+from moonbunny.porcelain import parse_log
+
+_WORDS = (
+    "fix add update remove refactor panel branch commit diff status cache "
+    "watcher search index startup history settings config docs test release"
+).split()
+
+
+def make_commits(commits: int) -> list[tuple[str, str, str]]:
+    return [
+        (
+            f"{random.getrandbits(28):07x}",
+            random.choice(["Darren Burns", "Alex Smith", "Sam Jones"]),
+            " ".join(random.sample(_WORDS, 6)).capitalize(),
+        )
+        for _ in range(commits)
+    ]
+
+
+def old_pipeline(output: bytes) -> tuple[list[object], ...]:
+    """What moonbunny did before `parse_log`."""
+    lines = [line for line in output.decode("utf-8").splitlines() if line.strip()]
+    items = [(line.split("|")[0], line) for line in lines if line.strip()]
+    search_texts = [" ".join(line.split("|")) for _, line in items]
+    stored = [tuple((line.split("|", 2) + ["", ""])[:3]) for line in lines]
+    return items, search_texts, stored
+
+
+def new_pipeline(output: bytes) -> tuple[list[object], ...]:
+    commits = parse_log(output)
+    items = [(commit.hash, commit) for commit in commits]
+    search_texts = [
+        f"{commit.hash} {commit.author} {commit.subject}" for commit in commits
+    ]
+    # The records are stored as they are.
+    return items, search_texts
+
+
+def median_ms(run: Callable[[], object], runs: int) -> float:
+    timings: list[float] = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def peak_kib(run: Callable[[], object]) -> float:
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--commits", type=int, default=20_000)
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+    random.seed(0)
+
+    commits = make_commits(args.commits)
+    old_output = "\n".join("|".join(commit) for commit in commits).encode("utf-8")
+    new_output = "".join("\0".join(commit) + "\n" for commit in commits).encode()
+
+    print(f"{'pipeline':<8} {'median ms':>10} {'peak KiB':>10}")
+    for name, run in [
+        ("old", lambda: old_pipeline(old_output)),
+        ("new", lambda: new_pipeline(new_output)),
+    ]:
+        print(f"{name:<8} {median_ms(run, args.runs):>10.1f} {peak_kib(run):>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Benchmark parsing `git status --porcelain=v2` output.
+
+Usage:
+    python benchmarks/bench_porcelain.py [--entries N] [--runs N]
+
+Synthetic status outputs with `--entries` records are parsed the old way (the
+newline separated output, split line by line into a `pathlib.Path` each) and
+with `moonbunny.porcelain.parse_status` (the `-z` output, as bytes), and the
+median wall time of each is reported. The old parser only understood `1` and
+`?` records, so it's only timed on outputs made of those.
+"""
+
+import argparse
+from pathlib import Path
+import random
+import statistics
+import time
+from typing import Callable
+
+from moonbunny.porcelain import parse_status
+
+_OID = "0123456789abcdef0123456789abcdef01234567"
+
+
+def _path(index: int) -> str:
+    return f"src/package_{index % 97}/module_{index}.py"
+
+
+def changed(index: int) -> str:
+    xy = random.choice(["M.", ".M", "MM", "A.", ".D"])
+    return f"1 {xy} N... 100644 100644 100644 {_OID} {_OID} {_path(index)}"
+
+
+def renamed(index: int) -> str:
+    # The original path follows as a separate field.
+    return (
+        f"2 R. N... 100644 100644 100644 {_OID} {_OID} R100 {_path(index)}"
+        f"\0{_path(index)}.orig"
+    )
+
+
+def unmerged(index: int) -> str:
+    return f"u UU N... 100644 100644 100644 100644 {_OID} {_OID} {_OID} {_path(index)}"
+
+
+def untracked(index: int) -> str:
+    return f"? {_path(index)}"
+
+
+def ignored(index: int) -> str:
+    return f"! {_path(index)}"
+
+
+_HEADERS = [
+    f"# branch.oid {_OID}",
+    "# branch.head main",
+    "# branch.upstream origin/main",
+    "# branch.ab +1 -2",
+    "# stash 3",
+]
+
+SCENARIOS: dict[str, list[Callable[[int], str]]] = {
+    "changed": [changed],
+    "untracked": [untracked],
+    "changed+untracked": [changed, untracked],
+    "all record types": [changed, renamed, unmerged, untracked, ignored],
+}
+
+
+def make_records(makers: list[Callable[[int], str]], entries: int) -> list[str]:
+    return _HEADERS + [makers[index % len(makers)](index) for index in range(entries)]
+
+
+def parse_lines(output: str) -> list[tuple[Path, bool, bool, str]]:
+    """The parser moonbunny used before `moonbunny.porcelain`."""
+    file_statuses: list[tuple[Path, bool, bool, str]] = []
+    for line in output.splitlines():
+        if line.strip():
+            parts = line.split(maxsplit=8)
+            if len(parts) >= 9 and parts[0] == "1":
+                xy_status = parts[1]
+                path = Path(parts[8])
+                staged = xy_status[0] != "."
+                unstaged = xy_status[1] != "."
+                file_statuses.append((path, staged, unstaged, xy_status))
+            elif line.startswith("?"):
+                file_statuses.append((Path(line[2:]), False, True, "?"))
+    return file_statuses
+
+
+def median_ms(run: Callable[[], object], runs: int) -> float:
+    timings: list[float] = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, default=100_000)
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+    random.seed(0)
+
+    print(f"{'scenario':<20} {'MiB':>6} {'lines ms':>10} {'-z bytes ms':>12}")
+    for name, makers in SCENARIOS.items():
+        records = make_records(makers, args.entries)
+        output = "\0".join(records).encode("utf-8") + b"\0"
+        old = "-"
+        if all(maker in (changed, untracked) for maker in makers):
+            text = "\n".join(records) + "\n"
+            old = f"{median_ms(lambda: parse_lines(text), args.runs):.1f}"
+        new = median_ms(lambda: parse_status(output), args.runs)
+        size = len(output) / 1024 / 1024
+        print(f"{name:<20} {size:>6.1f} {old:>10} {new:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Benchmark turning a listing of branches into the branches panel's items.
+
+Usage:
+    python benchmarks/bench_refs.py [--refs N] [--runs N]
+
+A synthetic listing of `--refs` branches is handled the old way (`git branch`
+output split on `|`, formatted into "3h name" strings which the panel split
+again to make each prompt) and the current way (`git for-each-ref` output
+parsed into `Branch` records by `moonbunny.porcelain.parse_refs`, with the
+ages worked out as the prompts are made), and the median wall time of each is
+reported. The current way is timed on the first page too, which is all that
+has to be handled before the panel is first shown.
+"""
+
+import argparse
+import random
+import statistics
+import time
+from typing import Callable
+
+from textual.content import Content
+
+from moonbunny.git import GitRequestRefs, format_relative_time
+from moonbunny.porcelain import parse_refs
+from moonbunny.widgets.branches_panel import _make_prompt
+
+
+def make_branches(refs: int) -> list[tuple[str, int, str]]:
+    now = int(time.time())
+    branches = [
+        (
+            f"feature/topic-{index}",
+            now - random.randrange(365 * 24 * 60 * 60),
+            random.choice(["", "", f"origin/feature/topic-{index}"]),
+        )
+        for index in range(refs)
+    ]
+    return sorted(branches, key=lambda branch: -branch[1])
+
+
+def old_pipeline(output: bytes) -> list[tuple[str, object]]:
+    """What moonbunny did before `parse_refs`."""
+    entries = []
+    for line in output.decode("utf-8").splitlines():
+        committer_date, _, branch_name = line.partition("|")
+        if committer_date.isdigit():
+            entries.append(f"{format_relative_time(int(committer_date))} {branch_name}")
+    items = []
+    for entry in entries:
+        parts = entry.split(" ", 1)
+        if (
+            len(parts) == 2
+            and any(
+                parts[0].endswith(suffix) for suffix in ["m", "h", "d", "w", "mo", "y"]
+            )
+            or parts[0] == "now"
+        ):
+            prompt = Content.assemble(
+                (f"{parts[0]:>3}", "$text-accent on $accent-muted 30%"), " ", parts[1]
+            )
+            items.append((parts[1], prompt))
+        else:
+            items.append((entry, Content(entry)))
+    return items
+
+
+def new_pipeline(output: bytes) -> list[tuple[str, object]]:
+    return [(branch.ref, _make_prompt(branch)) for branch in parse_refs(output)]
+
+
+def median_ms(run: Callable[[], object], runs: int) -> float:
+    timings: list[float] = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--refs", type=int, default=20_000)
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+    random.seed(0)
+
+    branches = make_branches(args.refs)
+    old_output = "".join(f"{date}|{name}\n" for name, date, _ in branches).encode(
+        "utf-8"
+    )
+    new_output = "".join(
+        f"refs/heads/{name}\0{date}\0{upstream}\n" for name, date, upstream in branches
+    ).encode("utf-8")
+
+    page_output = b"".join(new_output.splitlines(True)[: GitRequestRefs.PAGE_SIZE])
+
+    old = median_ms(lambda: old_pipeline(old_output), args.runs)
+    page = median_ms(lambda: new_pipeline(page_output), args.runs)
+    parse = median_ms(lambda: parse_refs(new_output), args.runs)
+    new = median_ms(lambda: new_pipeline(new_output), args.runs)
+    print(f"{'refs':>8} {'old ms':>10} {'page ms':>10} {'parse ms':>10} {'new ms':>10}")
+    print(f"{args.refs:>8} {old:>10.1f} {page:>10.1f} {parse:>10.1f} {new:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
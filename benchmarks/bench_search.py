@@ -0,0 +1,91 @@
+"""Benchmark filtering a panel with `moonbunny.search.SearchIndex`.
+
+Usage:
+    python benchmarks/bench_search.py [--entries N] [--runs N]
+
+An index of `--entries` synthetic branch names and commit messages is built,
+then each query is "typed" a character at a time, and the median and worst
+time per keystroke is reported alongside a plain substring scan of every
+entry. Updating the index with a few changed entries is timed too, as that's
+what happens when a panel receives new data.
+"""
+
+import argparse
+import random
+import statistics
+import time
+from typing import Callable
+
+from moonbunny.search import SearchIndex
+
+_WORDS = (
+    "fix add update remove refactor panel branch commit diff status cache "
+    "watcher search index startup history settings config docs test release "
+    "parser render highlight worker queue timing workspace review bump"
+).split()
+
+
+def branch_name(index: int) -> str:
+    prefix = random.choice(["feature", "fix", "chore", "release", "user/alex"])
+    words = "-".join(random.sample(_WORDS, 3))
+    return f"{prefix}/{words}-{index}"
+
+
+def commit_message(index: int) -> str:
+    words = " ".join(random.sample(_WORDS, 5))
+    return f"{words.capitalize()} (#{index})"
+
+
+QUERIES = ["fix", "watcher", "feature/search", "cache idx", "zzz", "fxpnl"]
+"""Typed one character at a time. The last two match nothing, and fuzzily."""
+
+
+def scan(texts: list[str], query: str) -> list[int]:
+    """Find the matches without an index, for comparison."""
+    terms = query.lower().split()
+    return [
+        index
+        for index, text in enumerate(texts)
+        if all(term in text.lower() for term in terms)
+    ][: SearchIndex.MAX_RESULTS]
+
+
+def time_ms(run: Callable[[], object]) -> float:
+    start = time.perf_counter()
+    run()
+    return (time.perf_counter() - start) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, default=50_000)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+    random.seed(0)
+
+    for name, make_text in [("branches", branch_name), ("commits", commit_message)]:
+        texts = [make_text(index) for index in range(args.entries)]
+        entries = [(str(index), text) for index, text in enumerate(texts)]
+        index = SearchIndex()
+        build = time_ms(lambda: index.update(entries))
+        changed = list(entries)
+        for position in random.sample(range(len(changed)), 10):
+            changed[position] = (changed[position][0], make_text(-position))
+        update = time_ms(lambda: index.update(changed))
+        print(f"{name}: build {build:.0f} ms, update 10 entries {update:.1f} ms")
+
+        print(f"  {'query':<16} {'median ms':>10} {'max ms':>8} {'scan ms':>8}")
+        for query in QUERIES:
+            keystrokes: list[float] = []
+            for _ in range(args.runs):
+                for length in range(1, len(query) + 1):
+                    keystrokes.append(time_ms(lambda: index.search(query[:length])))
+            scanned = time_ms(lambda: scan(texts, query))
+            median = statistics.median(keystrokes)
+            print(
+                f"  {query:<16} {median:>10.3f} {max(keystrokes):>8.3f} {scanned:>8.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
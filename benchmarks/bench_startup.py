@@ -0,0 +1,80 @@
+"""Measure moonbunny's cold start, failing if it's over budget.
+
+Usage:
+    python benchmarks/bench_startup.py [path/to/repo] [--runs N] [--budget-ms MS]
+
+`moonbunny --profile-startup` is run headless in the repository `--runs` times,
+each in a fresh interpreter, and the median time each stage of startup was
+reached is reported. Exits with status 1 if the median time until every panel
+was filled is over `--budget-ms`, or if any run failed to fill every panel.
+"""
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+from moonbunny.profiling import StartupProfile
+
+_REPORT_LINE = re.compile(r"^(.+?)\s+([\d.]+) ms$")
+
+
+def profile_startup(repo: str) -> dict[str, float] | None:
+    """The stages reached by a single cold start, or None if it didn't finish."""
+    result = subprocess.run(
+        [sys.executable, "-m", "moonbunny.cli", "--profile-startup", "--headless"],
+        cwd=repo,
+        capture_output=True,
+        text=True,
+        # So the user's own settings don't skew the results.
+        env={
+            key: value
+            for key, value in os.environ.items()
+            if not key.startswith("MOONBUNNY_")
+        },
+    )
+    marks = {}
+    for line in result.stdout.splitlines():
+        if match := _REPORT_LINE.match(line):
+            marks[match[1]] = float(match[2])
+    if result.returncode or not all(panel in marks for panel in StartupProfile.PANELS):
+        return None
+    return marks
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("repo", nargs="?", default=".")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=1500)
+    args = parser.parse_args()
+
+    runs: list[dict[str, float]] = []
+    for _ in range(args.runs):
+        marks = profile_startup(args.repo)
+        if marks is None:
+            print("moonbunny didn't fill every panel", file=sys.stderr)
+            sys.exit(1)
+        runs.append(marks)
+
+    # Stages in the order they're usually reached.
+    stages = sorted(runs[0], key=lambda stage: runs[0][stage])
+    medians = {
+        stage: statistics.median(marks[stage] for marks in runs if stage in marks)
+        for stage in stages
+    }
+    for stage, elapsed in medians.items():
+        print(f"{stage:<24} {elapsed:>8.1f} ms")
+
+    ready = statistics.median(
+        max(marks[panel] for panel in StartupProfile.PANELS) for marks in runs
+    )
+    print(f"{'all panels':<24} {ready:>8.1f} ms (budget {args.budget_ms:.0f} ms)")
+    if ready > args.budget_ms:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+from collections import OrderedDict
+import os
+from pathlib import Path
+from typing import Hashable, Iterable, NamedTuple
+
+from moonbunny.messages import GitCommand, GitState
+from moonbunny.watcher import ChangeKind, RepositoryPaths
+
+type Fingerprint = tuple[Hashable, ...]
+
+
+class CachedResult(NamedTuple):
+    fingerprint: Fingerprint
+    stdout: bytes
+    stderr: bytes
+    returncode: int | None
+
+
+def _stat(path: Path) -> tuple[int, int, int] | None:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+def _read(path: Path) -> bytes | None:
+    try:
+        return path.read_bytes()
+    except OSError:
+        return None
+
+
+# Which kinds of file system change affect which parts of the repository state.
+_INVALIDATES: dict[ChangeKind, tuple[GitState, ...]] = {
+    ChangeKind.REFS: (GitState.REFS,),
+    ChangeKind.INDEX: (GitState.INDEX,),
+    ChangeKind.WORKTREE: (GitState.WORKTREE,),
+}
+
+
+class GitResultCache:
+    """Caches the output of git commands for as long as the repository is unchanged.
+
+    Each command declares the parts of the repository state its output depends on
+    (`GitCommand.depends_on`). A cached result is only reused if a cheap
+    fingerprint of those parts still matches:
+
+    - HEAD: the contents of `HEAD` and of the ref it points to (i.e. the oid).
+    - REFS: the above, `packed-refs`, and a count of changes seen by the watcher.
+    - INDEX: the stat information of the index, and a count of changes.
+    - WORKTREE: a count of changes seen by the watcher.
+
+    Entries are evicted least recently used first, to stay under `max_bytes`.
+    """
+
+    def __init__(self, paths: RepositoryPaths, max_bytes: int = 32 * 1024 * 1024):
+        self.paths = paths
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_bytes // 4
+        """Results larger than this aren't cached, so one can't flush everything."""
+        self._entries: OrderedDict[Hashable, CachedResult] = OrderedDict()
+        self._size = 0
+        self._generations = dict.fromkeys(GitState, 0)
+
+    @staticmethod
+    def is_cacheable(command: GitCommand) -> bool:
+        return command.depends_on is not None
+
+    def invalidate(self, kinds: Iterable[ChangeKind]) -> None:
+        """Mark state as changed, after the watcher sees changes of the given kinds."""
+        for kind in kinds:
+            for state in _INVALIDATES[kind]:
+                self._generations[state] += 1
+
+    def fingerprint(self, command: GitCommand) -> Fingerprint:
+        """Capture the state that a command's output depends on, as it is now."""
+        git_dir = self.paths.git_dir
+        parts: list[Hashable] = []
+        depends_on = command.depends_on or frozenset()
+        for state in GitState:
+            if state not in depends_on:
+                continue
+            parts.append(self._generations[state])
+            match state:
+                case GitState.HEAD | GitState.REFS:
+                    head = _read(git_dir / "HEAD")
+                    parts.append(head)
+                    if head is not None and head.startswith(b"ref: "):
+                        ref_path = head[5:].strip().decode("utf-8", errors="replace")
+                        parts.append(_read(git_dir / ref_path))
+                    parts.append(_stat(git_dir / "packed-refs"))
+                case GitState.INDEX:
+                    parts.append(_stat(git_dir / "index"))
+        return tuple(parts)
+
+    def get(self, command: GitCommand) -> CachedResult | None:
+        """Get the cached result of a command, if it's still valid."""
+        key = command.key
+        if (entry := self._entries.get(key)) is None:
+            return None
+        if entry.fingerprint != self.fingerprint(command):
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def put(
+        self,
+        command: GitCommand,
+        fingerprint: Fingerprint,
+        stdout: bytes,
+        stderr: bytes,
+        returncode: int | None,
+    ) -> None:
+        """Cache the result of a command.
+
+        Args:
+            command: The command that was run.
+            fingerprint: The fingerprint taken *before* the command was run, so a
+                change made while it was running invalidates the result.
+            stdout: The command's stdout.
+            stderr: The command's stderr.
+            returncode: The command's return code.
+        """
+        size = len(stdout) + len(stderr)
+        if size > self.max_entry_bytes:
+            return
+        key = command.key
+        self._remove(key)
+        self._entries[key] = CachedResult(fingerprint, stdout, stderr, returncode)
+        self._size += size
+        while self._size > self.max_bytes and self._entries:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: Hashable) -> None:
+        if (entry := self._entries.pop(key, None)) is not None:
+            self._size -= len(entry.stdout) + len(entry.stderr)
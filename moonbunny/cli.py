@@ -0,0 +1,40 @@
+import argparse
+import time
+
+
+def main(argv: list[str] | None = None) -> None:
+    """The `moonbunny` command."""
+    started = time.perf_counter()
+    parser = argparse.ArgumentParser(prog="moonbunny")
+    parser.add_argument(
+        "repositories",
+        nargs="*",
+        metavar="REPOSITORY",
+        help="repositories to open, as paths or glob patterns; if more than one "
+        "matches, they're opened side by side as a workspace",
+    )
+    parser.add_argument(
+        "--profile-startup",
+        action="store_true",
+        help="exit once every panel has been filled, and report how long it took",
+    )
+    # Lets benchmarks/bench_startup.py run without a terminal.
+    parser.add_argument("--headless", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    # Imported here rather than at the top, so the import can be timed.
+    from moonbunny.main import Moonbunny
+    from moonbunny.profiling import StartupProfile
+
+    profile = None
+    if args.profile_startup:
+        profile = StartupProfile(started)
+        profile.mark("import")
+    app = Moonbunny(repositories=args.repositories, startup_profile=profile)
+    app.run(headless=args.headless)
+    if profile is not None:
+        print(profile.report())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+from textual import on
+from textual.app import ComposeResult
+from textual.binding import Binding
+from textual.screen import ModalScreen
+from textual.widgets import Footer, Input
+
+
+class CommitMessageScreen(ModalScreen[str]):
+    """Asks for the message of a commit of whatever is staged.
+
+    Dismisses with the message, or with `None` if cancelled.
+    """
+
+    BINDINGS = [Binding("escape", "dismiss", "cancel")]
+
+    def compose(self) -> ComposeResult:
+        message_input = Input(placeholder="commit message", id="commit-message-input")
+        message_input.border_title = "Commit"
+        yield message_input
+        yield Footer(show_command_palette=False)
+
+    @on(Input.Submitted)
+    def commit(self, event: Input.Submitted) -> None:
+        if event.value.strip():
+            self.dismiss(event.value)
@@ -0,0 +1,161 @@
+import time
+
+from textual.app import ComposeResult
+from textual.binding import Binding
+from textual.screen import Screen
+from textual.widgets import DataTable, Footer, Label
+
+from moonbunny.git import GitTaskRunner
+from moonbunny.timings import CommandTiming, Histogram
+from moonbunny.xdg import data_directory
+
+
+def _milliseconds(value: float) -> str:
+    return f"{value:.0f}" if value >= 10 else f"{value:.1f}"
+
+
+def _percentiles(histogram: Histogram) -> str:
+    """The median and 95th percentile of a histogram, e.g. "4.0/20"."""
+    if not histogram.count:
+        return "-"
+    median = _milliseconds(histogram.percentile(50))
+    return f"{median}/{_milliseconds(histogram.percentile(95))}"
+
+
+def _size(size: int) -> str:
+    if size < 1024:
+        return f"{size} B"
+    if size < 1024 * 1024:
+        return f"{size / 1024:.1f} KiB"
+    return f"{size / 1024 / 1024:.1f} MiB"
+
+
+def _outcome(timing: CommandTiming) -> str:
+    if timing.cached:
+        return "cached"
+    if timing.returncode is None:
+        return "failed"
+    return f"exit {timing.returncode}"
+
+
+class DiagnosticsScreen(Screen[None]):
+    """Shows where the time goes when running git commands.
+
+    The top table has a row per type of command, with the median and 95th
+    percentile time (in milliseconds) it spent in each stage: waiting in the
+    queue, starting git, running, and being handled by the app. The bottom
+    table lists the most recent commands, newest first.
+    """
+
+    BINDINGS = [
+        Binding("escape", "app.pop_screen", "back"),
+        Binding("x", "export", "export"),
+    ]
+
+    REFRESH_INTERVAL = 1.0
+    """How often the tables are refreshed, in seconds."""
+
+    RECENT_WINDOW = 10
+    """Commands requested within this many seconds are counted as recent."""
+
+    RECENT_ROWS = 100
+    """The number of recent commands listed."""
+
+    def __init__(self, git: GitTaskRunner) -> None:
+        super().__init__()
+        self.git = git
+
+    def compose(self) -> ComposeResult:
+        yield Label(id="diagnostics-header")
+        yield DataTable(id="command-stats", cursor_type="row", zebra_stripes=True)
+        yield Label("Recent commands", classes="diagnostics-title")
+        yield DataTable(id="recent-commands", cursor_type="row", zebra_stripes=True)
+        yield Footer(show_command_palette=False)
+
+    def on_mount(self) -> None:
+        self.query_one("#command-stats", DataTable).add_columns(
+            "command",
+            "runs",
+            "cached",
+            "failed",
+            f"last {self.RECENT_WINDOW}s",
+            "queue p50/p95",
+            "spawn p50/p95",
+            "run p50/p95",
+            "run max",
+            "handle p50/p95",
+            "output",
+        )
+        self.query_one("#recent-commands", DataTable).add_columns(
+            "age",
+            "command",
+            "queue",
+            "spawn",
+            "run",
+            "handle",
+            "output",
+            "outcome",
+        )
+        self.refresh_tables()
+        self.set_interval(self.REFRESH_INTERVAL, self.refresh_tables)
+
+    def refresh_tables(self) -> None:
+        git = self.git
+        timings = git.timings
+        self.query_one("#diagnostics-header", Label).update(
+            f"Git commands: {git.queued_count} queued, {git.running_count} running"
+        )
+
+        recent_counts = timings.recent_count(self.RECENT_WINDOW)
+        stats_table = self.query_one("#command-stats", DataTable)
+        cursor_row = stats_table.cursor_row
+        stats_table.clear()
+        by_run_time = sorted(
+            timings.stats.items(),
+            key=lambda item: item[1].stages["run"].total,
+            reverse=True,
+        )
+        for command_type, stats in by_run_time:
+            stages = stats.stages
+            stats_table.add_row(
+                command_type.removeprefix("GitRequest"),
+                str(stats.runs),
+                str(stats.cache_hits),
+                str(stats.failures),
+                str(recent_counts.get(command_type, 0)),
+                _percentiles(stages["queue"]),
+                _percentiles(stages["spawn"]),
+                _percentiles(stages["run"]),
+                _milliseconds(stages["run"].max),
+                _percentiles(stages["handle"]),
+                _size(stats.stdout_bytes),
+            )
+        stats_table.move_cursor(row=cursor_row, animate=False)
+
+        recent_table = self.query_one("#recent-commands", DataTable)
+        cursor_row = recent_table.cursor_row
+        recent_table.clear()
+        now = time.time()
+        for index, timing in enumerate(reversed(timings.recent)):
+            if index == self.RECENT_ROWS:
+                break
+            recent_table.add_row(
+                f"{now - timing.submitted_at:.1f}s",
+                " ".join(timing.command[1:]),
+                _milliseconds(timing.queue),
+                _milliseconds(timing.spawn),
+                _milliseconds(timing.run),
+                _milliseconds(timing.handle),
+                _size(timing.stdout_bytes),
+                _outcome(timing),
+            )
+        recent_table.move_cursor(row=cursor_row, animate=False)
+
+    def action_export(self) -> None:
+        """Write the recent timings to the data directory as JSON lines."""
+        try:
+            path = self.git.timings.export(data_directory() / "diagnostics")
+        except OSError as error:
+            self.notify(f"Couldn't export timings: {error}", severity="error")
+            return
+        self.notify(f"Exported timings to {path}")
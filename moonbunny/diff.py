@@ -0,0 +1,352 @@
+from bisect import bisect_left, bisect_right
+import codecs
+import hashlib
+import itertools
+from typing import NamedTuple
+
+from rich.cells import cell_len
+
+
+class FileDiff(NamedTuple):
+    """The section of a diff describing the changes to a single file."""
+
+    path: str
+    """The path of the file, relative to the top of the working tree."""
+
+    blob: str
+    """The blob ids from the `index` header (e.g. `e3dcb47..2c63af2`).
+
+    These change whenever the content on either side of the diff changes, so
+    together with the path they identify a version of the section. Output
+    before the first file has no blob ids, so a hash of its text stands in.
+    """
+
+    text: str
+    """The raw text of the section, including the `diff --git` header."""
+
+    @property
+    def key(self) -> tuple[str, str]:
+        return self.path, self.blob
+
+
+_parser_ids = itertools.count()
+"""Numbers each `DiffStreamParser`, so their partial sections are told apart."""
+
+
+def _unquote(path: str) -> str:
+    """Undo git's C-style quoting of unusual paths, e.g. `"tab\\there"`."""
+    if len(path) >= 2 and path[0] == path[-1] == '"':
+        return codecs.escape_decode(path[1:-1].encode("utf-8"))[0].decode(
+            "utf-8", errors="replace"
+        )
+    return path
+
+
+def _strip_prefix(path: str) -> str:
+    """Remove the `a/` or `b/` prefix from a path in a diff header."""
+    # Git terminates paths containing spaces with a tab in ---/+++ lines.
+    path = _unquote(path.removesuffix("\t"))
+    return path[2:] if path[:2] in ("a/", "b/") else path
+
+
+def _parse_section(lines: list[str]) -> FileDiff:
+    if not lines[0].startswith("diff --git "):
+        # Output before the first file, e.g. the commit message from `git show`.
+        text = "".join(lines)
+        digest = hashlib.sha1(text.encode("utf-8", errors="surrogatepass"))
+        return FileDiff("", digest.hexdigest(), text)
+
+    header = lines[0].rstrip("\n")[len("diff --git ") :]
+    path = ""
+    blob = ""
+    for line in lines[1:]:
+        if line.startswith("@@"):
+            break
+        line = line.rstrip("\n")
+        if line.startswith("index "):
+            blob = line[len("index ") :].split(" ", 1)[0]
+        elif line.startswith("rename to "):
+            path = _unquote(line[len("rename to ") :])
+        elif line.startswith("+++ ") and line != "+++ /dev/null":
+            path = _strip_prefix(line[len("+++ ") :])
+        elif line.startswith("--- ") and not path and line != "--- /dev/null":
+            path = _strip_prefix(line[len("--- ") :])
+
+    if not path:
+        # No ---/+++ lines (e.g. binary files or mode changes), so fall back to
+        # the header. For unquoted paths it's "a/<path> b/<path>".
+        if header.startswith('"'):
+            path = _strip_prefix(header[: header.index('" ', 1) + 1])
+        else:
+            path = header[2 : (len(header) - 1) // 2]
+
+    return FileDiff(path, blob, "".join(lines))
+
+
+class DiffStreamParser:
+    """Splits the output of `git diff` into a section per file as it arrives.
+
+    Anything before the first file (such as the commit message and stat output
+    by `git show`) becomes a section of its own, with an empty path.
+    """
+
+    def __init__(self) -> None:
+        self.files: list[FileDiff] = []
+        """The sections which have been received in full."""
+        self.partial_lines: list[str] = []
+        """The lines received so far of the section after the last complete one."""
+        self.sections_started = 0
+        self._id = next(_parser_ids)
+
+    @property
+    def partial_key(self) -> tuple[str, str]:
+        """Identifies the partial section, in place of a `FileDiff.key`.
+
+        It's unique to this parser and section. Lines of the section are only
+        shown until it's received in full, so aren't worth caching by it.
+        """
+        return "", f"partial:{self._id}:{self.sections_started}"
+
+    def feed(self, text: str) -> None:
+        """Parse the next chunk of output. It must end on a line boundary."""
+        for line in text.splitlines(keepends=True):
+            if line.startswith("diff --git ") and self.partial_lines:
+                self.files.append(_parse_section(self.partial_lines))
+                self.partial_lines = []
+                self.sections_started += 1
+            self.partial_lines.append(line)
+
+    def close(self) -> list[FileDiff]:
+        """Finish parsing, returning every section."""
+        if self.partial_lines:
+            self.files.append(_parse_section(self.partial_lines))
+        self.partial_lines = []
+        return self.files
+
+
+def parse_diff(diff: str) -> list[FileDiff]:
+    """Split the output of `git diff` (or `git show`) into a section per file."""
+    parser = DiffStreamParser()
+    parser.feed(diff)
+    return parser.close()
+
+
+def line_width(line: str) -> int:
+    """The number of cells a line of a diff takes up, as `DiffPanel` shows it.
+
+    Tabs after the `+`/`-` prefix are expanded, and wide characters count twice.
+    """
+    line = line.rstrip("\r\n")
+    if "\t" in line:
+        line = line[:1] + line[1:].expandtabs()
+    # Most lines are ASCII, which is quicker to check than to measure.
+    return len(line) if line.isascii() else cell_len(line)
+
+
+class _SectionLines(NamedTuple):
+    text: str
+    lines: list[str]
+    width: int
+    hunk_starts: list[int]
+    """The index of each `@@` line, which starts a hunk."""
+
+
+class DiffDocument:
+    """A diff held as a section per file, addressable by line number.
+
+    Lines are only split out of a section once, and a section which doesn't
+    change is reused as-is when the rest of the document is updated. Finding a
+    line is a binary search over the sections, so updating a single file is
+    proportional to the number of files rather than the number of lines.
+    """
+
+    def __init__(self) -> None:
+        self._order: list[FileDiff] = []
+        """The sections, in display order. A file can have more than one, e.g.
+        when it's been replaced by a symlink."""
+        self._section_lines: dict[tuple[str, str], _SectionLines] = {}
+        """The lines of each section, keyed on `FileDiff.key`."""
+        self._starts: list[int] = []
+        """The line number each section starts on, parallel to `_order`."""
+        self._file_offsets: dict[str, int] = {}
+        self._stream: DiffStreamParser | None = None
+        """The parser of a diff which is still streaming in, if any."""
+        self._sections_line_count = 0
+        self._sections_width = 0
+        self._partial_measured = 0
+        """How many lines of the stream's partial section `width` accounts for."""
+        self.line_count = 0
+        self.width = 0
+        """The width of the widest line, in cells."""
+
+    @property
+    def files(self) -> list[FileDiff]:
+        return self._order
+
+    def set_files(self, file_diffs: list[FileDiff]) -> None:
+        """Replace every section of the document."""
+        self._stream = None
+        self._order = list(file_diffs)
+        self._reindex()
+
+    def set_stream(self, parser: DiffStreamParser) -> None:
+        """Show a diff which is still streaming in. Call again after each chunk.
+
+        The section being received is shown as it grows, so a huge diff of a
+        single file doesn't need to be received in full before it's shown.
+        """
+        if parser is not self._stream or len(parser.files) != len(self._order):
+            self._stream = parser
+            self._order = list(parser.files)
+            self._reindex()
+
+        partial_lines = parser.partial_lines
+        if self._partial_measured > len(partial_lines):
+            self._partial_measured = 0
+        self.width = max(
+            self.width,
+            max(map(line_width, partial_lines[self._partial_measured :]), default=0),
+        )
+        self._partial_measured = len(partial_lines)
+        self.line_count = self._sections_line_count + len(partial_lines)
+
+    def set_file(self, path: str, file_diffs: list[FileDiff]) -> None:
+        """Replace the section for a single file.
+
+        Args:
+            path: The path of the file, relative to the top of the working tree.
+            file_diffs: The new section(s) for the file, or an empty list if the
+                file no longer has any changes.
+        """
+        files = [file_diff for file_diff in self._order if file_diff.path != path]
+        files += file_diffs
+        # `git diff` lists files in path order - keep new files in their place.
+        # The sort is stable, so a file's sections stay in the order git gave.
+        self._order = sorted(files, key=lambda file_diff: file_diff.path)
+        self._reindex()
+
+    def _reindex(self) -> None:
+        previous_lines = self._section_lines
+        section_lines: dict[tuple[str, str], _SectionLines] = {}
+        self._starts = []
+        self._file_offsets = {}
+        line_count = 0
+        width = 0
+        for file_diff in self._order:
+            section = previous_lines.get(file_diff.key)
+            if section is None or section.text != file_diff.text:
+                lines = file_diff.text.splitlines(keepends=True)
+                section = _SectionLines(
+                    file_diff.text,
+                    lines,
+                    max(map(line_width, lines), default=0),
+                    [
+                        index
+                        for index, line in enumerate(lines)
+                        if line.startswith("@@")
+                    ],
+                )
+            section_lines[file_diff.key] = section
+            self._starts.append(line_count)
+            self._file_offsets.setdefault(file_diff.path, line_count)
+            line_count += len(section.lines)
+            width = max(width, section.width)
+        self._section_lines = section_lines
+        self._sections_line_count = self.line_count = line_count
+        self._sections_width = self.width = width
+        self._partial_measured = 0
+
+    def file_offset(self, path: str) -> int | None:
+        """The line number that a file's section starts on, if it has one."""
+        return self._file_offsets.get(path)
+
+    def get_line(self, line_number: int) -> tuple[FileDiff, int, str]:
+        """Get a line of the document.
+
+        Returns:
+            The file the line belongs to, the line's index within that file's
+            section, and the text of the line.
+        """
+        if not 0 <= line_number < self.line_count:
+            raise IndexError(line_number)
+        if line_number >= self._sections_line_count and self._stream is not None:
+            stream = self._stream
+            line_index = line_number - self._sections_line_count
+            partial = FileDiff(*stream.partial_key, "")
+            return partial, line_index, stream.partial_lines[line_index]
+
+        section_index = bisect_right(self._starts, line_number) - 1
+        file_diff = self._order[section_index]
+        line_index = line_number - self._starts[section_index]
+        section = self._section_lines[file_diff.key]
+        return file_diff, line_index, section.lines[line_index]
+
+    def is_partial(self, line_number: int) -> bool:
+        """Whether a line is in the section of the stream still being received."""
+        return self._stream is not None and line_number >= self._sections_line_count
+
+    def get_hunk_start(self, file_diff: FileDiff, line_index: int) -> int | None:
+        """The index of the `@@` line starting the hunk a line of a section is in.
+
+        Returns:
+            The index within the section, or `None` if the line isn't in a hunk
+            (e.g. it's part of the header, or the section is still streaming in).
+        """
+        if (section := self._section_lines.get(file_diff.key)) is None:
+            return None
+        hunk_starts = section.hunk_starts
+        hunk_index = bisect_right(hunk_starts, line_index) - 1
+        return hunk_starts[hunk_index] if hunk_index >= 0 else None
+
+    def get_hunk_lines(self, file_diff: FileDiff, hunk_start: int) -> list[str]:
+        """The lines of a hunk, after its `@@` line."""
+        section = self._section_lines[file_diff.key]
+        hunk_index = bisect_right(section.hunk_starts, hunk_start)
+        if hunk_index < len(section.hunk_starts):
+            return section.lines[hunk_start + 1 : section.hunk_starts[hunk_index]]
+        return section.lines[hunk_start + 1 :]
+
+    def find_hunk(self, line_number: int, step: int) -> int | None:
+        """The line number of the nearest `@@` line after or before a line.
+
+        Args:
+            line_number: The line to search from.
+            step: 1 to search forwards, or -1 to search backwards.
+        """
+        starts = self._starts
+        if not starts:
+            return None
+        section_index = max(0, bisect_right(starts, line_number) - 1)
+        stop = len(starts) if step > 0 else -1
+        for index in range(section_index, stop, step):
+            start = starts[index]
+            hunk_starts = self._section_lines[self._order[index].key].hunk_starts
+            if step > 0:
+                hunk_index = bisect_right(hunk_starts, line_number - start)
+            else:
+                hunk_index = bisect_left(hunk_starts, line_number - start) - 1
+            if 0 <= hunk_index < len(hunk_starts):
+                return start + hunk_starts[hunk_index]
+        return None
+
+    def get_hunk_patch(self, line_number: int) -> tuple[FileDiff, str] | None:
+        """A patch of the hunk a line is in, for `git apply`.
+
+        A line in a file's header counts as being in its first hunk.
+
+        Returns:
+            The file the hunk belongs to, and a patch of the file's header
+            followed by the hunk. `None` if the file has no hunks (e.g. it's
+            binary, or still streaming in).
+        """
+        file_diff, line_index, _ = self.get_line(line_number)
+        section = self._section_lines.get(file_diff.key)
+        if section is None or not section.hunk_starts:
+            return None
+        hunk_start = self.get_hunk_start(file_diff, line_index)
+        if hunk_start is None:
+            hunk_start = section.hunk_starts[0]
+        header = section.lines[: section.hunk_starts[0]]
+        hunk = section.lines[hunk_start : hunk_start + 1]
+        hunk += self.get_hunk_lines(file_diff, hunk_start)
+        return file_diff, "".join(header + hunk)
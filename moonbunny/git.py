@@ -1,160 +1,961 @@
 import asyncio
-import shlex
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from functools import partial
+import heapq
+import itertools
+import os
 import re
+import time
+from typing import AsyncIterator, Callable, Iterable
 
 from textual import log
-from textual.app import App
+from textual.message_pump import MessagePump
 
-from moonbunny.messages import GitCommand, GitCommandResult
+from moonbunny.cache import GitResultCache
+from moonbunny.git_batch import CatFileProcess
+from moonbunny.messages import (
+    GitCommand,
+    GitCommandOutput,
+    GitCommandResult,
+    GitPriority,
+    GitState,
+)
+from moonbunny.models import RefKind
+from moonbunny.timings import CommandTiming, GitTimings
 
+type GitCommandKey = tuple[str, tuple[str, ...], bytes | None]
 
-def format_relative_time(relative_time: str) -> str:
-    """Format git's relative time into a concise format.
+
+def format_relative_time(timestamp: int, now: float | None = None) -> str:
+    """Format a time as a concise age, rounding like `git log --date=relative`.
 
     Examples:
-        "2 minutes ago" -> "2m"
-        "3 hours ago" -> "3h"
-        "1 day ago" -> "1d"
-        "2 weeks ago" -> "2w"
-        "1 month ago" -> "1mo"
-        "1 year ago" -> "1y"
+        30 seconds ago -> "now"
+        2 minutes ago -> "2m"
+        3 hours ago -> "3h"
+        1 day ago -> "1d"
+        2 weeks ago -> "2w"
+        1 month ago -> "1mo"
+        1 year ago -> "1y"
     """
-    # Handle "just now" case
-    if "second" in relative_time or relative_time.strip() == "":
+    seconds = int((time.time() if now is None else now) - timestamp)
+    if seconds < 90:
         return "now"
+    if seconds < 90 * 60:
+        return f"{(seconds + 30) // 60}m"
+    if seconds < 36 * 60 * 60:
+        return f"{(seconds + 30 * 60) // (60 * 60)}h"
+
+    days = (seconds + 12 * 60 * 60) // (24 * 60 * 60)
+    if days < 14:
+        return f"{days}d"
+    if days < 70:
+        return f"{(days + 3) // 7}w"
+    if days < 365:
+        return f"{(days + 15) // 30}mo"
+    return f"{(days + 183) // 365}y"
+
+
+_GIT_ENVIRONMENT = {
+    **os.environ,
+    # Stop `git status` refreshing the index as a side effect. Otherwise each
+    # refresh writes the index, which the watcher sees and refreshes again.
+    "GIT_OPTIONAL_LOCKS": "0",
+    # Output is parsed, so it must never be paged, coloured or translated, and
+    # git must never stop to prompt for anything.
+    "GIT_PAGER": "cat",
+    "PAGER": "cat",
+    "LC_ALL": "C",
+    "GIT_TERMINAL_PROMPT": "0",
+}
+
+_GIT_OPTIONS = ["--no-pager", "-c", "color.ui=never"]
+"""Options given to every git invocation, before the command name."""
+
+
+@dataclass
+class _PendingCommand:
+    """A command waiting in the queue, shared by everyone who requested it."""
+
+    command: GitCommand
+    future: asyncio.Future[GitCommandResult]
+    sequence: int
+    """Matches the queue entry that will run this command. Older entries are stale."""
+    post_result: bool
+    """Whether the result should be posted to the app."""
+    submitted: float
+    """When the command was first requested, from `time.perf_counter`."""
+
+
+@dataclass
+class _RunningCommand:
+    """A command currently being run by one of the workers."""
+
+    command: GitCommand
+    task: asyncio.Task[tuple[bytes, bytes, int | None]]
+    future: asyncio.Future[GitCommandResult]
+    post_result: bool
+
+
+class _OutputCopy:
+    """Passes on streamed output, keeping a copy (up to a limit) for the cache."""
+
+    def __init__(self, on_output: Callable[[int, bytes], None], limit: int) -> None:
+        self.on_output = on_output
+        self.limit = limit
+        self.size = 0
+        self.chunks: list[bytes] = []
+
+    def __call__(self, index: int, chunk: bytes) -> None:
+        self.size += len(chunk)
+        if self.size <= self.limit:
+            self.chunks.append(chunk)
+        self.on_output(index, chunk)
+
+    @property
+    def stdout(self) -> bytes | None:
+        """The whole output, or `None` if it went over the limit."""
+        return b"".join(self.chunks) if self.size <= self.limit else None
+
+
+class GitProcessPool:
+    """Limits how many git processes are in flight, and how fast they're started.
+
+    A pool can be shared by several runners (one per repository in a workspace)
+    so that together they never run more than `max_processes` git processes at
+    once. When commands are waiting for a slot, the most urgent goes first.
+
+    If `max_spawns_per_second` is set, processes are started at no more than
+    that rate on average, in bursts of up to a second's worth.
+    """
 
-    # Extract number and unit
-    match = re.search(r"(\d+)\s+(minute|hour|day|week|month|year)", relative_time)
-    if not match:
-        return relative_time  # Return original if no match
+    def __init__(
+        self, max_processes: int = 4, max_spawns_per_second: float = 0
+    ) -> None:
+        self.max_processes = max(1, max_processes)
+        self.max_spawns_per_second = max_spawns_per_second
+        self._in_use = 0
+        self._waiting: list[tuple[int, int, asyncio.Future[None]]] = []
+        """Heap of commands waiting for a slot, by priority then arrival."""
+        self._sequence = itertools.count()
+        self._tokens = max_spawns_per_second
+        """Spawns allowed right now, refilled at `max_spawns_per_second`."""
+        self._refilled = time.monotonic()
+
+    def set_limits(self, max_processes: int, max_spawns_per_second: float) -> None:
+        """Change the limits, e.g. once settings have been loaded."""
+        self.max_processes = max(1, max_processes)
+        self.max_spawns_per_second = max_spawns_per_second
+        self._tokens = min(self._tokens, max_spawns_per_second)
+        self._hand_out_slots()
+
+    @asynccontextmanager
+    async def slot(self, priority: int) -> AsyncIterator[None]:
+        """Wait for a free slot, holding it for the duration of the context."""
+        await self._acquire(priority)
+        try:
+            await self._pace()
+            yield
+        finally:
+            self._release()
+
+    async def _acquire(self, priority: int) -> None:
+        if self._in_use < self.max_processes and not self._waiting:
+            self._in_use += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiting, (priority, next(self._sequence), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as this was cancelled.
+                self._release()
+            raise
+
+    def _release(self) -> None:
+        self._in_use -= 1
+        self._hand_out_slots()
+
+    def _hand_out_slots(self) -> None:
+        """Give free slots to the most urgent of the commands waiting."""
+        while self._waiting and self._in_use < self.max_processes:
+            _priority, _sequence, future = heapq.heappop(self._waiting)
+            if not future.done():
+                self._in_use += 1
+                future.set_result(None)
+
+    async def _pace(self) -> None:
+        """Wait until starting another process is within the rate limit."""
+        if (rate := self.max_spawns_per_second) <= 0:
+            return
+        now = time.monotonic()
+        self._tokens = min(rate, self._tokens + (now - self._refilled) * rate)
+        self._refilled = now
+        # Take the token now, so callers waiting behind this one queue up after it.
+        self._tokens -= 1
+        if self._tokens < 0:
+            await asyncio.sleep(-self._tokens / rate)
 
-    number, unit = match.groups()
 
-    # Map units to short forms
-    unit_map = {
-        "minute": "m",
-        "hour": "h",
-        "day": "d",
-        "week": "w",
-        "month": "mo",
-        "year": "y",
-    }
+class GitTaskRunner:
+    """Runs git commands in the background and posts the results to the app.
 
-    short_unit = unit_map.get(unit, unit)
-    return f"{number}{short_unit}"
+    Commands are pulled from a priority queue by a pool of workers, so cheap
+    interactive commands (branch name, file status) can jump ahead of slow ones
+    (full diffs, commit history) rather than waiting behind them.
 
+    Requesting a command which is identical to one already waiting in the queue
+    doesn't queue it again - the requests are merged, and the single result is
+    shared by everyone who asked for it.
 
-class GitTaskRunner:
-    def __init__(self, mb: App[None], git_dir: str | None = None):
-        self.mb: App[None] = mb
+    Commands marked as `streaming` have their output posted to the app as it
+    arrives, in `GitCommandOutput` messages, rather than all at once in the
+    `GitCommandResult`.
+
+    If `persistent_processes` is enabled, object and revision lookups are served
+    by long-running `git cat-file` processes instead of spawning git for each.
+
+    How long each command spent queued, starting and running, and how much
+    output it produced, is recorded in `timings`.
+
+    Results and output are posted to `target`, usually the screen showing the
+    repository.
+    """
+
+    CHUNK_SIZE = 64 * 1024
+    """How much output to read from a streaming command at a time."""
+
+    def __init__(
+        self,
+        target: MessagePump,
+        git_dir: str | None = None,
+        workers: int = 4,
+        max_processes: int = 4,
+        persistent_processes: bool = True,
+        pool: GitProcessPool | None = None,
+    ):
+        self.target = target
+        self.git_dir = git_dir
+        self.workers = max(1, workers)
+        """The number of commands that can be run concurrently."""
+        self.tasks: list[asyncio.Task[None]] = []
+        self.commands: asyncio.PriorityQueue[tuple[int, int, GitCommandKey]] = (
+            asyncio.PriorityQueue()
+        )
+        self.pool = GitProcessPool(max_processes) if pool is None else pool
+        """Caps the number of git processes in flight at any one time."""
+        self._sequence = itertools.count()
+        """Tie-breaker so commands of equal priority run in the order they arrived."""
+        self._pending: dict[GitCommandKey, _PendingCommand] = {}
+        self._running: dict[GitCommandKey, _RunningCommand] = {}
+        self.cache: GitResultCache | None = None
+        """If set, results of commands are cached while the repository is unchanged."""
+        self.timings = GitTimings()
+        self.persistent_processes = persistent_processes
+        self._cat_file = CatFileProcess(self._git, env=_GIT_ENVIRONMENT)
+        self._cat_file_check = CatFileProcess(
+            self._git, check_only=True, env=_GIT_ENVIRONMENT
+        )
+
+    def configure(
+        self,
+        git_dir: str | None = None,
+        workers: int = 4,
+        max_processes: int = 4,
+        persistent_processes: bool = True,
+        pool: GitProcessPool | None = None,
+    ) -> None:
+        """Change how commands are run, e.g. once settings have been loaded.
+
+        Must be called before `start`. Commands queued before then are run with
+        the new configuration.
+        """
+        assert not self.started, "Can't configure the runner once it's started"
         self.git_dir = git_dir
-        self.task: asyncio.Task[None] | None = None
-        self.commands: asyncio.Queue[GitCommand] = asyncio.Queue()
+        self.workers = max(1, workers)
+        self.pool = GitProcessPool(max_processes) if pool is None else pool
+        self.persistent_processes = persistent_processes
+        self._cat_file = CatFileProcess(self._git, env=_GIT_ENVIRONMENT)
+        self._cat_file_check = CatFileProcess(
+            self._git, check_only=True, env=_GIT_ENVIRONMENT
+        )
+
+    @property
+    def started(self) -> bool:
+        return bool(self.tasks)
+
+    @property
+    def queued_count(self) -> int:
+        """The number of commands waiting to be run."""
+        return len(self._pending)
+
+    @property
+    def running_count(self) -> int:
+        """The number of commands being run."""
+        return len(self._running)
+
+    @property
+    def _git(self) -> list[str]:
+        """The command used to run git, up to (but not including) the command name."""
+        if self.git_dir:
+            return ["git", *_GIT_OPTIONS, "-C", self.git_dir]
+        return ["git", *_GIT_OPTIONS]
 
     async def start(self) -> None:
-        self.task = asyncio.create_task(self._run_loop())
+        self.set_workers(self.workers)
+
+    def set_workers(self, workers: int) -> None:
+        """Change how many commands can be run concurrently, even once started.
+
+        Surplus workers stop once they've run the next command they pick up.
+        """
+        self.workers = max(1, workers)
+        self.tasks = [task for task in self.tasks if not task.done()]
+        self.tasks += [
+            asyncio.create_task(self._run_loop())
+            for _ in range(self.workers - len(self.tasks))
+        ]
+
+    async def close(self) -> None:
+        """Stop the workers and any long-running git processes."""
+        for task in self.tasks:
+            task.cancel()
+        await self._cat_file.close()
+        await self._cat_file_check.close()
+
+    def submit(
+        self, command: GitCommand, supersede: bool = False, post_result: bool = True
+    ) -> asyncio.Future[GitCommandResult]:
+        """Queue a command, merging it with an identical one if already queued.
+
+        Args:
+            command: The command to run.
+            supersede: If an identical command is already running, cancel it.
+                Its output may predate whatever prompted this request, so anyone
+                waiting on it will receive the result of this command instead.
+            post_result: Whether to post the result to the app as a message. If
+                False, the result is only available through the returned future.
+
+        Returns:
+            A future which resolves to the result of the command.
+        """
+        if (cached := self._get_cached_result(command, post_result)) is not None:
+            return cached
+
+        key = command.key
+        if (pending := self._pending.get(key)) is not None:
+            pending.post_result = pending.post_result or post_result
+            if command.priority < pending.command.priority:
+                # Move the merged request up the queue. The old entry goes stale.
+                pending.command = command
+                pending.sequence = next(self._sequence)
+                self.commands.put_nowait((command.priority, pending.sequence, key))
+            return pending.future
+
+        future: asyncio.Future[GitCommandResult]
+        if supersede and (running := self._running.pop(key, None)) is not None:
+            log.debug(f"Superseding running command: {command.command}")
+            running.task.cancel()
+            future = running.future
+            post_result = post_result or running.post_result
+        else:
+            future = asyncio.get_running_loop().create_future()
+
+        sequence = next(self._sequence)
+        self._pending[key] = _PendingCommand(
+            command, future, sequence, post_result, time.perf_counter()
+        )
+        self.commands.put_nowait((command.priority, sequence, key))
+        return future
+
+    def _get_cached_result(
+        self, command: GitCommand, post_result: bool
+    ) -> asyncio.Future[GitCommandResult] | None:
+        """Deliver the result of a command from the cache, if it's cached."""
+        future = asyncio.get_running_loop().create_future()
+        if not self._deliver_cached_result(command, post_result, future):
+            return None
+        return future
+
+    def _deliver_cached_result(
+        self,
+        command: GitCommand,
+        post_result: bool,
+        future: asyncio.Future[GitCommandResult],
+    ) -> bool:
+        """Resolve `future` with the cached result of a command, if it's cached."""
+        if self.cache is None or not self.cache.is_cacheable(command):
+            return False
+        if (cached := self.cache.get(command)) is None:
+            return False
+
+        log.debug(f"Cache hit: {command.command}")
+        timing = CommandTiming.start(command, time.perf_counter())
+        timing.cached = True
+        timing.stdout_bytes = len(cached.stdout)
+        timing.stderr_bytes = len(cached.stderr)
+        timing.returncode = cached.returncode
+        self.timings.record(timing)
+        result = GitCommandResult(
+            command=command,
+            stdout=b"" if command.streaming else cached.stdout,
+            stderr=cached.stderr,
+            returncode=cached.returncode,
+            timing=timing,
+        )
+        if post_result:
+            if command.streaming:
+                self._post_output(command, 0, cached.stdout, timing=timing)
+            self.target.post_message(result)
+        if not future.done():
+            future.set_result(result)
+        return True
+
+    def cancel(self, command: GitCommand) -> None:
+        """Abandon a prefetch, whether it's waiting in the queue or running.
+
+        Only commands submitted at `PREFETCH` priority without posting their
+        result are cancelled. If the command was merged with a request someone
+        is waiting for, it's left alone.
+        """
+        key = command.key
+        if (pending := self._pending.get(key)) is not None:
+            if _is_prefetch(pending.command, pending.post_result):
+                # The queue entry goes stale, and is skipped when it comes up.
+                del self._pending[key]
+                pending.future.cancel()
+        elif (running := self._running.get(key)) is not None:
+            if _is_prefetch(running.command, running.post_result):
+                del self._running[key]
+                running.task.cancel()
+                running.future.cancel()
+
+    def enqueue(self, command: GitCommand, supersede: bool = False) -> None:
+        """Queue a command to be run according to its priority."""
+        self.submit(command, supersede=supersede)
 
     async def _run_loop(self) -> None:
         while True:
-            command = await self.commands.get()
-            print(command)
-            stdout, stderr, returncode = await self._run_command(command)
-
-            # Send the result back to the app.
-            self.mb.post_message(
-                GitCommandResult(
-                    command=command,
-                    stdout=stdout,
-                    stderr=stderr,
-                    returncode=returncode,
-                )
+            if len(self.tasks) > self.workers:
+                self.tasks.remove(asyncio.current_task())  # type: ignore[arg-type]
+                return
+            _priority, sequence, key = await self.commands.get()
+            pending = self._pending.get(key)
+            if pending is None or pending.sequence != sequence:
+                # This entry was re-queued with a different priority.
+                self.commands.task_done()
+                continue
+
+            waited = False
+            if (previous := self._running.get(key)) is not None:
+                # Identical commands never run side by side. Their streamed
+                # output would be interleaved.
+                await asyncio.wait([previous.task])
+                waited = True
+            if self._pending.get(key) is not pending:
+                self.commands.task_done()
+                continue
+
+            del self._pending[key]
+            command = pending.command
+            if waited and self._deliver_cached_result(
+                command, pending.post_result, pending.future
+            ):
+                # e.g. a prefetch of this command finished while this waited.
+                self.commands.task_done()
+                continue
+            timing = CommandTiming.start(command, pending.submitted)
+            timing.queue = (time.perf_counter() - pending.submitted) * 1000
+            cache = self.cache
+            fingerprint = None
+            if cache is not None and cache.is_cacheable(command):
+                fingerprint = cache.fingerprint(command)
+
+            on_output = None
+            streamed: _OutputCopy | None = None
+            if command.streaming and pending.post_result:
+                on_output = partial(self._post_output, command, timing=timing)
+                if cache is not None and fingerprint is not None:
+                    on_output = streamed = _OutputCopy(on_output, cache.max_entry_bytes)
+            task = asyncio.create_task(self._execute(command, timing, on_output))
+            running = _RunningCommand(
+                command, task, pending.future, pending.post_result
+            )
+            self._running[key] = running
+            await asyncio.wait([task])
+            if self._running.get(key) is running:
+                del self._running[key]
+
+            if task.cancelled():
+                # Superseded by a newer command, which now owns the future.
+                self.commands.task_done()
+                continue
+
+            try:
+                stdout, stderr, returncode = task.result()
+            except OSError as error:
+                log.error(f"Failed to run {command.command}: {error}")
+                stdout, stderr, returncode = b"", str(error).encode(), None
+
+            if on_output is None:
+                # Streamed output was counted as it was read.
+                timing.stdout_bytes = len(stdout)
+            timing.stderr_bytes = len(stderr)
+            timing.returncode = returncode
+            self.timings.record(timing)
+            result = GitCommandResult(
+                command=command,
+                stdout=stdout,
+                stderr=stderr,
+                returncode=returncode,
+                timing=timing,
             )
 
+            if cache is not None and fingerprint is not None and returncode == 0:
+                cached_stdout = stdout if streamed is None else streamed.stdout
+                if cached_stdout is not None:
+                    cache.put(command, fingerprint, cached_stdout, stderr, returncode)
+
+            # Send the result back to the app, and to anyone awaiting it.
+            if running.post_result:
+                self.target.post_message(result)
+            if not running.future.done():
+                running.future.set_result(result)
+
             self.commands.task_done()
 
+    async def _execute(
+        self,
+        command: GitCommand,
+        timing: CommandTiming,
+        on_output: Callable[[int, bytes], None] | None = None,
+    ) -> tuple[bytes, bytes, int | None]:
+        """Run a command, through a long-running process if one can serve it."""
+        if self.persistent_processes:
+            started = time.perf_counter()
+            try:
+                match command:
+                    case GitRequestResolveRevision(revision=revision):
+                        timing.persistent = True
+                        cat_file_object = await self._cat_file_check.lookup(revision)
+                        if cat_file_object is None:
+                            return b"", b"", 1
+                        return f"{cat_file_object.oid}\n".encode(), b"", 0
+                    case GitRequestObject(revision=revision):
+                        timing.persistent = True
+                        cat_file_object = await self._cat_file.lookup(revision)
+                        if cat_file_object is None:
+                            error = f"fatal: Not a valid object name {revision}\n"
+                            return b"", error.encode(), 128
+                        return cat_file_object.content or b"", b"", 0
+            except (OSError, ValueError) as error:
+                log.warning(f"Falling back to one-shot git for {command}: {error}")
+                timing.persistent = False
+            finally:
+                if timing.persistent:
+                    timing.run = (time.perf_counter() - started) * 1000
+
+        return await self._run_command(command, timing, on_output)
+
+    def _post_output(
+        self,
+        command: GitCommand,
+        index: int,
+        chunk: bytes,
+        timing: CommandTiming | None = None,
+    ) -> None:
+        self.target.post_message(
+            GitCommandOutput(command=command, stdout=chunk, index=index, timing=timing)
+        )
+
     async def _run_command(
-        self, command: GitCommand
+        self,
+        command: GitCommand,
+        timing: CommandTiming,
+        on_output: Callable[[int, bytes], None] | None = None,
     ) -> tuple[bytes, bytes, int | None]:
+        """Run a command, returning its stdout, stderr and return code.
+
+        Args:
+            command: The command to run.
+            timing: Where to record how long starting and running it took.
+            on_output: If given, stdout is streamed to this callback in chunks of
+                whole lines rather than being returned (the returned stdout will
+                be empty). It's called with the index of each chunk and the chunk.
+        """
         # Build the command, injecting -C option if git_dir is set
-        cmd_parts = command.command.copy()
-        if self.git_dir:
-            # Insert -C option after 'git' but before the command name
-            cmd_parts = ["git", "-C", self.git_dir] + cmd_parts[1:]
-
-        run_command = shlex.join(cmd_parts)
-        log.debug(f"Running command: {run_command}")
-        process = await asyncio.create_subprocess_shell(
-            run_command,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
-        )
-        stdout, stderr = await process.communicate()
+        cmd_parts = self._git + command.command[1:]
+
+        log.debug(f"Running command: {cmd_parts}")
+        waiting = time.perf_counter()
+        async with self.pool.slot(command.priority):
+            spawning = time.perf_counter()
+            timing.queue += (spawning - waiting) * 1000
+            process = await asyncio.create_subprocess_exec(
+                *cmd_parts,
+                stdin=None if command.stdin is None else asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                env=_GIT_ENVIRONMENT,
+            )
+            running = time.perf_counter()
+            timing.spawn = (running - spawning) * 1000
+            try:
+                if on_output is None:
+                    stdout, stderr = await process.communicate(command.stdin)
+                else:
+                    stdout = b""
+                    stderr = await self._stream_output(
+                        process, command, timing, on_output
+                    )
+            except asyncio.CancelledError:
+                process.kill()
+                await process.wait()
+                raise
+            timing.run = (time.perf_counter() - running) * 1000
         return stdout, stderr, process.returncode
 
+    async def _stream_output(
+        self,
+        process: asyncio.subprocess.Process,
+        command: GitCommand,
+        timing: CommandTiming,
+        on_output: Callable[[int, bytes], None],
+    ) -> bytes:
+        """Pass a process's stdout to `on_output` in chunks, returning its stderr.
+
+        Chunks always end on a line boundary (bar the last), so each can be
+        decoded and split into lines on its own. The first chunk is always sent,
+        even if there's no output, to tell the receiver a new stream started.
+        """
+        assert process.stdout is not None and process.stderr is not None
+        stderr_task = asyncio.create_task(process.stderr.read())
+        try:
+            if process.stdin is not None:
+                process.stdin.write(command.stdin or b"")
+                await process.stdin.drain()
+                process.stdin.close()
+
+            index = 0
+            remainder = b""
+            while chunk := await process.stdout.read(self.CHUNK_SIZE):
+                timing.stdout_bytes += len(chunk)
+                chunk = remainder + chunk
+                if not (end := chunk.rfind(b"\n") + 1):
+                    remainder = chunk
+                    continue
+                remainder = chunk[end:]
+                on_output(index, chunk[:end])
+                index += 1
+            if remainder or index == 0:
+                on_output(index, remainder)
+
+            stderr = await stderr_task
+            await process.wait()
+        finally:
+            stderr_task.cancel()
+        return stderr
+
     def enqueue_request_file_status(self) -> None:
-        """Request the status of the files in the repository."""
-        self.commands.put_nowait(GitRequestFileStatus())
+        """Request the status of the files in the repository, and of the branch."""
+        self.enqueue(GitRequestFileStatus())
 
     def enqueue_request_branch_name(self) -> None:
         """Request the name of the current branch."""
-        self.commands.put_nowait(GitRequestCurrentBranchName())
+        self.enqueue(GitRequestCurrentBranchName())
 
     def enqueue_request_file_diff(self, file_path: str) -> None:
-        """Request the diff of a file."""
-        self.commands.put_nowait(GitRequestFileDiff(file_path))
+        """Request the diff of a file, relative to the top of the working tree."""
+        self.enqueue(GitRequestFileDiff(file_path))
 
     def enqueue_request_all_file_diffs(self) -> None:
         """Request the diff of all files in the repository."""
-        self.commands.put_nowait(GitRequestAllFileDiffs())
+        self.enqueue(GitRequestAllFileDiffs())
 
-    def enqueue_recent_branches(self) -> None:
-        """Request the recent branches."""
-        self.commands.put_nowait(GitRequestRecentBranches(requires_escape=False))
+    def enqueue_request_refs(self, kind: RefKind) -> None:
+        """Request the first page of the branches, remote branches or tags."""
+        self.enqueue(GitRequestRefs(kind))
 
     def enqueue_request_commits(self, branch_name: str) -> None:
         """Request the commits for a branch."""
-        self.commands.put_nowait(GitRequestCommits(branch_name))
+        self.enqueue(GitRequestCommits(branch_name))
+
+
+def _is_prefetch(command: GitCommand, post_result: bool) -> bool:
+    return command.priority == GitPriority.PREFETCH and not post_result
+
+
+_OID = re.compile(r"[0-9a-f]{40}([0-9a-f]{24})?")
+
+
+def _revision_depends_on(revision: str) -> frozenset[GitState]:
+    """The state which the meaning of a revision (e.g. `HEAD`, `main`) depends on."""
+    if _OID.fullmatch(revision):
+        return frozenset()
+    if revision == "HEAD":
+        return frozenset({GitState.HEAD})
+    return frozenset({GitState.REFS})
+
+
+def _pathspec_arg(path: str) -> str:
+    """A path as an argument, matched literally from the top of the working tree.
+
+    Arguments are encoded with the filesystem encoding, so the path is
+    converted to that from git's UTF-8 (with undecodable bytes escaped, as
+    they were when the path was decoded) to reach git unchanged.
+    """
+    return os.fsdecode(
+        f":(top,literal){path}".encode("utf-8", errors="surrogateescape")
+    )
+
+
+def _pathspecs(paths: Iterable[str]) -> bytes:
+    """Paths for `--pathspec-from-file=- --pathspec-file-nul`, matched literally."""
+    return b"".join(
+        f":(top,literal){path}\0".encode("utf-8", errors="surrogateescape")
+        for path in paths
+    )
 
 
 class GitRequestFileStatus(GitCommand):
-    def __init__(self) -> None:
-        super().__init__("status", ["--porcelain=v2"])
+    """The status of each file, along with the current branch, how far it is ahead
+    of and behind its upstream, and the number of stash entries.
+
+    Parse the output with `moonbunny.porcelain.parse_status`.
+    """
+
+    # The upstream and the stash are refs too.
+    depends_on = frozenset({GitState.REFS, GitState.INDEX, GitState.WORKTREE})
+
+    def __init__(self, priority: GitPriority = GitPriority.INTERACTIVE) -> None:
+        super().__init__(
+            "status",
+            ["--porcelain=v2", "-z", "--branch", "--show-stash"],
+            priority=priority,
+        )
 
 
 class GitRequestCurrentBranchName(GitCommand):
+    depends_on = frozenset({GitState.HEAD})
+
     def __init__(self) -> None:
-        super().__init__("rev-parse", ["--symbolic-full-name", "--abbrev-ref", "HEAD"])
+        super().__init__(
+            "rev-parse",
+            ["--symbolic-full-name", "--abbrev-ref", "HEAD"],
+            priority=GitPriority.INTERACTIVE,
+        )
 
 
 class GitRequestFileDiff(GitCommand):
+    depends_on = frozenset({GitState.INDEX, GitState.WORKTREE})
+
     def __init__(self, file_path: str) -> None:
-        super().__init__("diff", ["--", file_path])
+        self.file_path = file_path
+        """The path of the file, relative to the top of the working tree."""
+        super().__init__("diff", ["--", _pathspec_arg(file_path)])
 
 
 class GitRequestAllFileDiffs(GitCommand):
+    depends_on = frozenset({GitState.INDEX, GitState.WORKTREE})
+
     def __init__(self) -> None:
-        super().__init__("diff")
+        super().__init__("diff", priority=GitPriority.BULK, streaming=True)
 
 
-class GitRequestCommits(GitCommand):
-    def __init__(self, branch_name: str) -> None:
+class GitRequestShowCommit(GitCommand):
+    """A commit's metadata, the files it changed (`--stat`) and its patch."""
+
+    @property
+    def depends_on(self) -> frozenset[GitState]:  # type: ignore[override]
+        return _revision_depends_on(self.revision)
+
+    def __init__(
+        self,
+        revision: str,
+        priority: GitPriority = GitPriority.NORMAL,
+        streaming: bool = False,
+    ) -> None:
+        self.revision = revision
         super().__init__(
-            "log",
-            ["--pretty=format:%h|%aN|%s", "-n", "200", branch_name],
-            requires_escape=False,
+            "show",
+            [
+                "--stat",
+                "--patch",
+                "--format=fuller",
+                # Merges are shown as a regular diff, rather than a combined one.
+                "--diff-merges=first-parent",
+                "--end-of-options",
+                revision,
+            ],
+            priority=priority,
+            streaming=streaming,
         )
 
 
-class GitRequestRecentBranches(GitCommand):
-    def __init__(self, requires_escape: bool = True) -> None:
+class GitRequestCommits(GitCommand):
+    """Request a page of the commit history of a branch.
+
+    Parse the output with `moonbunny.porcelain.parse_log`.
+    """
+
+    PAGE_SIZE = 200
+
+    @property
+    def depends_on(self) -> frozenset[GitState]:  # type: ignore[override]
+        return _revision_depends_on(self.branch_name)
+
+    def __init__(self, branch_name: str, skip: int = 0, count: int = PAGE_SIZE) -> None:
+        self.branch_name = branch_name
+        self.skip = skip
+        """The number of commits before this page."""
+        self.count = count
         super().__init__(
-            "branch",
+            "log",
             [
-                "--list",
-                "--sort",
-                "-committerdate",
-                "--format",
-                "%(committerdate:relative)|%(refname:short)",
+                "--format=%h%x00%aN%x00%s",
+                "--skip",
+                str(skip),
+                "-n",
+                str(count),
+                branch_name,
             ],
-            requires_escape=requires_escape,
+            priority=GitPriority.BULK,
+            streaming=True,
+        )
+
+
+class GitRequestRefs(GitCommand):
+    """Request the branches, remote branches or tags, most recently committed to first.
+
+    Parse the output with `moonbunny.porcelain.parse_refs`.
+
+    With a `count`, only that many are listed, along with how far each branch is
+    ahead of and behind its upstream. Without one every ref is listed, but
+    ahead and behind aren't worked out, as that means walking the history of
+    every branch.
+    """
+
+    PAGE_SIZE = 200
+
+    depends_on = frozenset({GitState.REFS})
+
+    def __init__(self, kind: RefKind, count: int | None = PAGE_SIZE) -> None:
+        self.kind = kind
+        self.count = count
+        """The most refs listed, or `None` for every ref."""
+        fields = "%(refname)%00%(creatordate:unix)%00%(upstream:short)"
+        args = ["--sort=-creatordate"]
+        if count is not None:
+            fields += "%00%(upstream:track,nobracket)"
+            args.append(f"--count={count}")
+        super().__init__(
+            "for-each-ref",
+            [*args, f"--format={fields}", kind.value],
+            priority=GitPriority.NORMAL if count is not None else GitPriority.BULK,
+        )
+
+
+class GitRequestResolveRevision(GitCommand):
+    """Resolve a revision (e.g. `HEAD` or a branch name) to an object id.
+
+    Served by a long-running `git cat-file --batch-check` where possible.
+    """
+
+    @property
+    def depends_on(self) -> frozenset[GitState]:  # type: ignore[override]
+        return _revision_depends_on(self.revision)
+
+    def __init__(self, revision: str) -> None:
+        self.revision = revision
+        super().__init__(
+            "rev-parse",
+            ["--verify", "--quiet", "--end-of-options", revision],
+            priority=GitPriority.INTERACTIVE,
+        )
+
+
+class GitRequestObject(GitCommand):
+    """Request the raw content of a commit, tag or blob.
+
+    Served by a long-running `git cat-file --batch` where possible.
+    """
+
+    @property
+    def depends_on(self) -> frozenset[GitState]:  # type: ignore[override]
+        return _revision_depends_on(self.revision)
+
+    def __init__(self, revision: str) -> None:
+        self.revision = revision
+        super().__init__("cat-file", ["-p", revision])
+
+
+class GitRequestRepositoryPaths(GitCommand):
+    def __init__(self) -> None:
+        super().__init__(
+            "rev-parse",
+            ["--show-toplevel", "--absolute-git-dir"],
+            priority=GitPriority.INTERACTIVE,
+        )
+
+
+class GitRequestIgnoredPaths(GitCommand):
+    """Find which of the given paths are ignored by .gitignore and friends."""
+
+    def __init__(self, paths: Iterable[str]) -> None:
+        super().__init__(
+            "check-ignore",
+            ["-z", "--stdin"],
+            stdin=b"".join(
+                f"{path}\0".encode("utf-8", errors="surrogateescape") for path in paths
+            ),
+        )
+
+
+class GitRequestStage(GitCommand):
+    """Stage the changes to files, including deletions. Writes the index."""
+
+    def __init__(self, paths: Iterable[str]) -> None:
+        super().__init__(
+            "add",
+            ["--all", "--pathspec-from-file=-", "--pathspec-file-nul"],
+            priority=GitPriority.INTERACTIVE,
+            stdin=_pathspecs(paths),
+        )
+
+
+class GitRequestUnstage(GitCommand):
+    """Unstage the changes to files. Writes the index."""
+
+    def __init__(self, paths: Iterable[str]) -> None:
+        super().__init__(
+            "restore",
+            ["--staged", "--pathspec-from-file=-", "--pathspec-file-nul"],
+            priority=GitPriority.INTERACTIVE,
+            stdin=_pathspecs(paths),
+        )
+
+
+class GitRequestApplyToIndex(GitCommand):
+    """Stage part of a file's changes, given as a patch. Writes the index."""
+
+    def __init__(self, patch: str) -> None:
+        super().__init__(
+            "apply",
+            ["--cached", "--whitespace=nowarn", "-"],
+            priority=GitPriority.INTERACTIVE,
+            stdin=patch.encode("utf-8", errors="surrogateescape"),
+        )
+
+
+class GitRequestCommit(GitCommand):
+    """Commit what's staged. Writes the index, and moves HEAD."""
+
+    def __init__(self, message: str) -> None:
+        super().__init__(
+            "commit",
+            ["--file=-", "--cleanup=strip"],
+            priority=GitPriority.INTERACTIVE,
+            stdin=message.encode("utf-8"),
         )
@@ -0,0 +1,118 @@
+import asyncio
+from typing import Mapping, NamedTuple
+
+from textual import log
+
+
+class CatFileObject(NamedTuple):
+    """An object looked up through `git cat-file --batch` or `--batch-check`."""
+
+    oid: str
+    type: str
+    size: int
+    content: bytes | None
+    """The raw content of the object, or `None` if only its header was requested."""
+
+
+class CatFileProcess:
+    """A long-running `git cat-file --batch` (or `--batch-check`) process.
+
+    Objects are looked up by writing a revision to the process's stdin and
+    reading the answer back from its stdout, which saves spawning a git process
+    (and git reading its config, the index and so on) for every lookup.
+
+    The process is started on first use, and restarted if it dies.
+    """
+
+    def __init__(
+        self,
+        git: list[str],
+        check_only: bool = False,
+        env: Mapping[str, str] | None = None,
+    ) -> None:
+        """
+        Args:
+            git: The command to run git with, e.g. `["git", "-C", "path/to/repo"]`.
+            check_only: Use `--batch-check`, which only returns object headers.
+            env: The environment to run git in.
+        """
+        self.argv = [*git, "cat-file", "--batch-check" if check_only else "--batch"]
+        self.check_only = check_only
+        self.env = env
+        self._process: asyncio.subprocess.Process | None = None
+        self._lock = asyncio.Lock()
+        """Only one lookup can be in progress on the pipe at a time."""
+
+    async def lookup(self, revision: str) -> CatFileObject | None:
+        """Look up an object.
+
+        Args:
+            revision: Anything `git rev-parse` understands, e.g. `HEAD`, an oid or
+                `HEAD:path/to/file`.
+
+        Returns:
+            The object, or `None` if it doesn't exist.
+
+        Raises:
+            ValueError: If the revision can't be sent over the pipe.
+            OSError: If communicating with the git process failed.
+        """
+        if not revision or "\n" in revision:
+            raise ValueError(f"Can't look up revision {revision!r}")
+
+        async with self._lock:
+            process = await self._ensure_process()
+            assert process.stdin is not None and process.stdout is not None
+            try:
+                process.stdin.write(f"{revision}\n".encode("utf-8"))
+                await process.stdin.drain()
+                header = await process.stdout.readline()
+                if not header:
+                    raise ConnectionResetError("git cat-file exited unexpectedly")
+
+                fields = header.decode("utf-8").split()
+                if len(fields) != 3:
+                    # "<revision> missing" or "<revision> ambiguous"
+                    return None
+
+                oid, object_type, size = fields
+                content = None
+                if not self.check_only:
+                    content = await process.stdout.readexactly(int(size) + 1)
+                    content = content[:-1]
+                return CatFileObject(oid, object_type, int(size), content)
+            except BaseException:
+                # Whatever happened, the pipe may now be part-way through a
+                # response. Start afresh next time rather than reading garbage.
+                await self._kill()
+                raise
+
+    async def _ensure_process(self) -> asyncio.subprocess.Process:
+        if self._process is None or self._process.returncode is not None:
+            log.debug(f"Starting {self.argv}")
+            self._process = await asyncio.create_subprocess_exec(
+                *self.argv,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL,
+                env=self.env,
+            )
+        return self._process
+
+    async def _kill(self) -> None:
+        if (process := self._process) is not None:
+            self._process = None
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+
+    async def close(self) -> None:
+        """Stop the process, if it's running."""
+        if (process := self._process) is not None and process.stdin is not None:
+            self._process = None
+            process.stdin.close()
+            try:
+                await asyncio.wait_for(process.wait(), timeout=1)
+            except TimeoutError:
+                process.kill()
+                await process.wait()
@@ -0,0 +1,341 @@
+import asyncio
+from functools import cache, partial
+from hashlib import blake2b
+import json
+import os
+import sys
+from typing import Callable, Sequence
+
+from textual import log
+from textual.cache import LRUCache
+from textual.content import Content, Span
+
+from moonbunny.word_diff import change_spans, pair_changed_lines
+
+type HighlightedLine = tuple[str, tuple[tuple[int, int, str], ...]]
+"""The text of a line of code and its highlighting spans (start, end, style).
+
+Plain tuples rather than `Content`, as they're much cheaper to send between
+processes. `to_content` turns them into `Content` when a line is rendered.
+"""
+
+type HunkHighlights = tuple[HighlightedLine | None, ...]
+"""The highlighted code of each line of a hunk, or `None` for lines with nothing to highlight."""
+
+type HunkKey = tuple[str, bytes]
+
+
+@cache
+def language_for_path(path: str) -> str | None:
+    """The Pygments language of a file, going by its name alone."""
+    # Lazy import because Pygments' lexer mapping is slow to load.
+    from pygments.lexers import get_lexer_for_filename
+    from pygments.util import ClassNotFound
+
+    if path.endswith(".tcss"):
+        return "scss"
+    try:
+        lexer = get_lexer_for_filename(path)
+    except ClassNotFound:
+        return None
+    language = lexer.aliases[0] if lexer.aliases else lexer.name
+    # Plain text has nothing to highlight.
+    return None if language == "text" else language
+
+
+def to_content(line: HighlightedLine) -> Content:
+    text, spans = line
+    return Content(text, spans=[Span(start, end, style) for start, end, style in spans])
+
+
+def _highlight_lines(lines: list[str], language: str) -> list[HighlightedLine] | None:
+    if not lines:
+        return []
+    from textual.highlight import highlight
+
+    highlighted = highlight("\n".join(lines), language=language).split(
+        "\n", allow_blank=True
+    )
+    # Characters such as form feeds count as line breaks to the highlighter.
+    if len(highlighted) != len(lines):
+        return None
+    return [
+        (
+            content.plain,
+            tuple((span.start, span.end, str(span.style)) for span in content.spans),
+        )
+        for content in highlighted
+    ]
+
+
+_CHANGED_WORDS_STYLES = {"-": "on $error 35%", "+": "on $success 35%"}
+
+
+def highlight_hunk(path: str, lines: Sequence[str]) -> HunkHighlights:
+    """Highlight the lines of a hunk (those after its `@@` line).
+
+    Two kinds of highlighting are combined:
+
+    - Syntax highlighting. The old and new versions of the code are highlighted
+      separately, so each is lexed as it appears in the file (a removed line
+      opening a string doesn't turn the added lines after it into a string).
+    - The words which changed between a removed line and the added line which
+      replaced it (see `moonbunny.word_diff`).
+
+    Returns:
+        The highlighted code of each line, without its `+`/`-` prefix. Empty if
+        there's nothing to highlight.
+    """
+    code = [line[1:].rstrip("\r\n").expandtabs() for line in lines]
+    syntax = _highlight_syntax(path, lines, code)
+
+    changes: dict[int, list[tuple[int, int, str]]] = {}
+    for removed, added in pair_changed_lines(lines):
+        if (spans := change_spans(code[removed], code[added])) is None:
+            continue
+        for index, line_spans in zip((removed, added), spans):
+            style = _CHANGED_WORDS_STYLES[lines[index][:1]]
+            changes[index] = [(start, end, style) for start, end in line_spans]
+
+    if syntax is None and not changes:
+        return ()
+    highlights: list[HighlightedLine | None] = []
+    for index, line_code in enumerate(code):
+        highlighted = None if syntax is None else syntax[index]
+        if index in changes:
+            spans = () if highlighted is None else highlighted[1]
+            highlighted = (line_code, (*spans, *changes[index]))
+        highlights.append(highlighted)
+    return tuple(highlights)
+
+
+def _highlight_syntax(
+    path: str, lines: Sequence[str], code: list[str]
+) -> list[HighlightedLine | None] | None:
+    """Syntax highlight the code of each line, or `None` if the language isn't known."""
+    language = language_for_path(path)
+    if language is None:
+        return None
+
+    old_code: list[str] = []
+    new_code: list[str] = []
+    for line, line_code in zip(lines, code):
+        match line[:1]:
+            case " ":
+                old_code.append(line_code)
+                new_code.append(line_code)
+            case "-":
+                old_code.append(line_code)
+            case "+":
+                new_code.append(line_code)
+
+    old_lines = _highlight_lines(old_code, language)
+    new_lines = _highlight_lines(new_code, language)
+    if old_lines is None or new_lines is None:
+        return None
+
+    highlights: list[HighlightedLine | None] = []
+    old_index = new_index = 0
+    for line in lines:
+        match line[:1]:
+            case " ":
+                highlights.append(new_lines[new_index])
+                old_index += 1
+                new_index += 1
+            case "-":
+                highlights.append(old_lines[old_index])
+                old_index += 1
+            case "+":
+                highlights.append(new_lines[new_index])
+                new_index += 1
+            case _:
+                # e.g. "\ No newline at end of file"
+                highlights.append(None)
+    return highlights
+
+
+class _HighlightProcess:
+    """A `python -m moonbunny.highlight` process, started on first use."""
+
+    def __init__(self) -> None:
+        self._process: asyncio.subprocess.Process | None = None
+
+    async def highlight(self, path: str, lines: list[str]) -> HunkHighlights:
+        process = await self._ensure_process()
+        assert process.stdin is not None and process.stdout is not None
+        try:
+            request = json.dumps({"path": path, "lines": lines})
+            process.stdin.write(f"{request}\n".encode("utf-8"))
+            await process.stdin.drain()
+            response = await process.stdout.readline()
+            if not response:
+                raise ConnectionResetError("Highlighter exited unexpectedly")
+        except BaseException:
+            # The pipe may be part-way through a response, so start afresh.
+            await self.kill()
+            raise
+        return tuple(
+            None if line is None else (line[0], tuple(map(tuple, line[1])))
+            for line in json.loads(response)
+        )
+
+    async def _ensure_process(self) -> asyncio.subprocess.Process:
+        if self._process is None or self._process.returncode is not None:
+            self._process = await asyncio.create_subprocess_exec(
+                sys.executable,
+                "-m",
+                "moonbunny.highlight",
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL,
+                limit=_MAX_RESPONSE_BYTES,
+            )
+        return self._process
+
+    async def kill(self) -> None:
+        if (process := self._process) is not None:
+            self._process = None
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+
+
+def _default_workers() -> int:
+    # Leave a CPU for the UI, but don't hog a big machine.
+    return max(1, min(2, (os.cpu_count() or 1) - 1))
+
+
+class DiffHighlighter:
+    """Highlights diff hunks in a pool of long-running background processes.
+
+    Highlighting is CPU bound pure Python, so in a thread it would compete with
+    rendering for the GIL. Separate processes (`python -m moonbunny.highlight`)
+    leave the UI unaffected. Each hunk is sent whole to an idle process over its
+    stdin, and the highlights are read back from its stdout.
+
+    Results are remembered by file path and a hash of the hunk's content, so a
+    hunk is only highlighted once no matter how often the diff is refreshed,
+    or how often the file is changed elsewhere.
+    """
+
+    def __init__(
+        self,
+        on_ready: Callable[[], object],
+        workers: int | None = None,
+        max_hunks: int = 1024,
+    ) -> None:
+        """
+        Args:
+            on_ready: Called when a hunk has been highlighted.
+            workers: The number of background processes, by default based on the
+                number of CPUs.
+            max_hunks: The number of highlighted hunks to remember.
+        """
+        self._on_ready = on_ready
+        self._results: LRUCache[HunkKey, HunkHighlights] = LRUCache(max_hunks)
+        self._pending: dict[HunkKey, asyncio.Task[HunkHighlights]] = {}
+        self._started: set[HunkKey] = set()
+        """Pending hunks which a process is highlighting."""
+        self._workers = [
+            _HighlightProcess() for _ in range(workers or _default_workers())
+        ]
+        self._idle: asyncio.Queue[_HighlightProcess] = asyncio.Queue()
+        """Processes which aren't highlighting. Only one hunk can be in progress
+        on a process's pipe at a time."""
+        for worker in self._workers:
+            self._idle.put_nowait(worker)
+
+    def request(
+        self, hunks: Sequence[tuple[str, Sequence[str]]]
+    ) -> list[HunkHighlights | None]:
+        """Get the highlights of hunks, starting on those which aren't ready.
+
+        Highlighting of hunks requested before but not this time (e.g. because
+        they've been scrolled out of view) is abandoned if it hasn't started.
+        If it has, it's left to finish, as stopping it part-way would mean
+        restarting the process, and the result is remembered all the same.
+
+        Args:
+            hunks: The path of the file and the lines of each hunk.
+
+        Returns:
+            The highlights of each hunk, or `None` for those not ready yet.
+        """
+        keys = [
+            (
+                path,
+                blake2b(
+                    "".join(lines).encode("utf-8", errors="surrogatepass"),
+                    digest_size=16,
+                ).digest(),
+            )
+            for path, lines in hunks
+        ]
+
+        wanted = set(keys)
+        for key, task in list(self._pending.items()):
+            if key not in wanted and key not in self._started:
+                del self._pending[key]
+                task.cancel()
+
+        highlights: list[HunkHighlights | None] = []
+        for key, (path, lines) in zip(keys, hunks):
+            if (result := self._results.get(key)) is not None:
+                highlights.append(result)
+                continue
+            if key not in self._pending:
+                task = asyncio.create_task(self._highlight(key, path, list(lines)))
+                self._pending[key] = task
+                task.add_done_callback(partial(self._highlighted, key))
+            highlights.append(None)
+        return highlights
+
+    async def _highlight(
+        self, key: HunkKey, path: str, lines: list[str]
+    ) -> HunkHighlights:
+        worker = await self._idle.get()
+        self._started.add(key)
+        try:
+            return await worker.highlight(path, lines)
+        finally:
+            self._started.discard(key)
+            self._idle.put_nowait(worker)
+
+    def _highlighted(self, key: HunkKey, task: asyncio.Task[HunkHighlights]) -> None:
+        if self._pending.get(key) is task:
+            del self._pending[key]
+        if task.cancelled():
+            return
+        if (error := task.exception()) is not None:
+            log.warning(f"Couldn't highlight a hunk of {key[0]}: {error!r}")
+            self._results[key] = ()
+        else:
+            self._results[key] = task.result()
+        self._on_ready()
+
+    async def close(self) -> None:
+        """Abandon any highlighting in progress, and stop the background processes."""
+        for task in self._pending.values():
+            task.cancel()
+        self._pending.clear()
+        for worker in self._workers:
+            await worker.kill()
+
+
+_MAX_RESPONSE_BYTES = 64 * 1024 * 1024
+
+
+def _serve() -> None:
+    """Highlight hunks sent as JSON lines on stdin, answering on stdout."""
+    if hasattr(os, "nice"):
+        # Rendering the UI matters more, if they end up sharing a CPU.
+        os.nice(10)
+    for line in sys.stdin:
+        request = json.loads(line)
+        highlights = highlight_hunk(request["path"], request["lines"])
+        sys.stdout.write(json.dumps(highlights) + "\n")
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    _serve()
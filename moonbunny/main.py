@@ -1,30 +1,61 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Any
+import sqlite3
+import time
+from typing import TYPE_CHECKING, Any, Callable, Iterable, cast
+
 from textual import getters, on, log, work
 from textual.app import App, ComposeResult
 from textual.binding import Binding
-from textual.containers import Horizontal, Vertical, VerticalScroll
+from textual.containers import Horizontal, Vertical
 from textual.screen import Screen
-from textual.widgets import Footer, Label
+from textual.timer import Timer
+from textual.widgets import Footer, Label, OptionList
 
+from moonbunny.cache import GitResultCache
+from moonbunny.commit_message import CommitMessageScreen
+from moonbunny.diagnostics import DiagnosticsScreen
 from moonbunny.git import (
     GitCommandResult,
+    GitProcessPool,
     GitRequestAllFileDiffs,
     GitRequestCommits,
     GitRequestCurrentBranchName,
+    GitRequestFileDiff,
     GitRequestFileStatus,
-    GitRequestRecentBranches,
+    GitRequestIgnoredPaths,
+    GitRequestRefs,
+    GitRequestRepositoryPaths,
+    GitRequestResolveRevision,
+    GitRequestShowCommit,
     GitTaskRunner,
-    format_relative_time,
 )
-from moonbunny.messages import GitCommand
-from moonbunny.models import FileStatus
-from moonbunny.settings import Settings
+from moonbunny.messages import GitCommand, GitCommandOutput, GitPriority
+from moonbunny.models import RefKind
+from moonbunny.porcelain import parse_log, parse_refs, parse_status
+from moonbunny.prefetch import Prefetcher
+from moonbunny.profiling import StartupProfile
+from moonbunny.repositories import RepositoriesScreen
+from moonbunny.staging import IndexWrite, IndexWriter
+from moonbunny.store import HistoryStore
+from moonbunny.watcher import (
+    ChangeKind,
+    RepositoryPaths,
+    RepositoryWatchFilter,
+    classify_changes,
+)
 from moonbunny.widgets.branches_panel import BranchesPanel
+from moonbunny.widgets.commit_panel import CommitPanel
 from moonbunny.widgets.commits_panel import CommitsPanel
 from moonbunny.widgets.diff_panel import DiffPanel
 from moonbunny.widgets.files_panel import FilesPanel
 from moonbunny.widgets.status_bar import StatusBar
+from moonbunny.workspace import Workspace, find_repositories
+
+if TYPE_CHECKING:
+    from moonbunny.settings import Settings
 
 
 class Home(Screen[None]):
@@ -44,17 +75,54 @@ class Home(Screen[None]):
             action="app.focus('commits-panel-option-list')",
             description="focus commits",
         ),
+        Binding(
+            key="d",
+            action="app.focus('diff-panel')",
+            description="focus diff",
+        ),
+        Binding(key="C", action="commit", description="commit"),
+        Binding(key="escape", action="show_diff", description="show diff"),
     ]
 
+    MAX_INCREMENTAL_DIFF_FILES = 32
+    """Above this many changed files, re-diffing everything is cheaper."""
+
+    PREFETCH_DELAY = 0.1
+    """How long the highlight must rest on a commit before prefetching starts."""
+
+    PREFETCH_RADIUS = 2
+    """The number of commits either side of the highlighted one to prefetch."""
+
     files_panel = getters.query_one("#sidebar #files-panel", FilesPanel)
     status_bar = getters.child_by_id("status-bar", StatusBar)
     diff_panel = getters.query_one("#diff-panel", DiffPanel)
+    commit_panel = getters.query_one("#commit-panel", CommitPanel)
+    body_header = getters.query_one("#body-header", Label)
     branches_panel = getters.query_one("#sidebar #branches-panel", BranchesPanel)
     commits_panel = getters.query_one("#sidebar #commits-panel", CommitsPanel)
 
-    def __init__(self, git: GitTaskRunner, *args: Any, **kwargs: Any) -> None:
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
         super().__init__(*args, **kwargs)
-        self.git = git
+        # Configured by the app once the settings have been loaded.
+        self.git = GitTaskRunner(self)
+        self.prefetcher = Prefetcher(self.git)
+        self.index_writer = IndexWriter(self.git, self._staging_written)
+        self._prefetch_timer: Timer | None = None
+        self.history: HistoryStore | None = None
+        """Commits and branches saved from earlier sessions, if the store could be opened."""
+        self._history_writer = ThreadPoolExecutor(1, thread_name_prefix="history")
+        """Writes to the history store, off the UI thread but in order."""
+        self._unsaved_history: list[Callable[[HistoryStore], int]] | None = []
+        """Writes made before the history store was opened, or `None` once it is."""
+        self._startup_requests: list[asyncio.Future[GitCommandResult]] = []
+        """The requests made on mount which fill the panels, bar the diff."""
+        self._all_diffs_requested: asyncio.Future[GitCommandResult] | None = None
+        self._diff_begun = asyncio.Event()
+        """Set once the first chunk of the diff of every file has been shown."""
+
+    @property
+    def moonbunny(self) -> "Moonbunny":
+        return cast("Moonbunny", self.app)
 
     def compose(self) -> ComposeResult:
         yield StatusBar(id="status-bar")
@@ -67,16 +135,431 @@ class Home(Screen[None]):
 
             with Vertical(id="body"):
                 yield Label("Diff", id="body-header")
-                with VerticalScroll(id="body-panel-scroll"):
-                    yield DiffPanel(id="diff-panel")
+                yield DiffPanel(id="diff-panel")
+                yield CommitPanel(id="commit-panel")
         yield Footer(show_command_palette=False)
 
     def on_mount(self) -> None:
-        self.git.enqueue_request_file_status()
-        self.git.enqueue_request_branch_name()
-        self.git.enqueue_request_all_file_diffs()
-        self.git.enqueue_recent_branches()
-        self.git.enqueue_request_commits("HEAD")
+        # The status includes the branch name, so needn't be requested separately.
+        git = self.git
+        status_requested = git.submit(GitRequestFileStatus())
+        self._all_diffs_requested = git.submit(GitRequestAllFileDiffs())
+        self._startup_requests = [
+            status_requested,
+            git.submit(GitRequestRefs(RefKind.BRANCH)),
+            git.submit(GitRequestCommits("HEAD")),
+        ]
+        self.watch(self.commit_panel, "notice", self._update_body_header, init=False)
+        if self.git.started:
+            # In a workspace, whose runners are started before their screens.
+            self.watch_git_files()
+
+    async def wait_for_startup(self) -> None:
+        """Wait until git has answered the requests which fill the panels.
+
+        The diff of every file can take a while in a large repository, so only
+        its first chunk is waited for. Later pages of refs and commits aren't
+        waited for either.
+        """
+        if self._all_diffs_requested is None:
+            # Not mounted yet, so nothing has been requested.
+            return
+        diff_begun = asyncio.create_task(self._diff_begun.wait())
+        await asyncio.wait(self._startup_requests)
+        # Results are posted to this screen before they're returned, so they've
+        # been shown once a callback posted after them has run.
+        shown = asyncio.get_running_loop().create_future()
+        self.call_later(shown.set_result, None)
+        await shown
+        await asyncio.wait(
+            [self._all_diffs_requested, diff_begun],
+            return_when=asyncio.FIRST_COMPLETED,
+        )
+        diff_begun.cancel()
+
+    def on_unmount(self) -> None:
+        self._history_writer.shutdown()
+        if self.history is not None:
+            self.history.close()
+
+    @on(OptionList.OptionHighlighted, "#files-panel KeyedOptionList")
+    def show_file_diff(self, event: OptionList.OptionHighlighted) -> None:
+        # Only follow the highlight when the user moves it, not when the files
+        # panel restores it after a refresh.
+        if event.option_list.has_focus and event.option.id is not None:
+            self.action_show_diff()
+            self.diff_panel.scroll_to_file(event.option.id)
+
+    @on(OptionList.OptionSelected, "#commits-panel KeyedOptionList")
+    def select_commit(self, event: OptionList.OptionSelected) -> None:
+        if event.option.id is not None:
+            self.show_commit(event.option.id)
+
+    @work(exclusive=True, group="show-commit")
+    async def show_commit(self, commit_id: str) -> None:
+        """Show a commit in place of the diff, from the cache if it's there."""
+        commit_panel = self.commit_panel
+        self.diff_panel.display = False
+        commit_panel.display = True
+        commit_panel.commit_id = commit_id
+        self._update_body_header()
+
+        # Resolving the full oid is cheap, through the long-running cat-file.
+        result = await self.git.submit(
+            GitRequestResolveRevision(commit_id), post_result=False
+        )
+        oid = result.stdout.decode("utf-8").strip()
+        if oid and commit_panel.show_cached(commit_id, oid):
+            return
+        commit_panel.begin_commit(commit_id)
+        # The same command as is prefetched, so a prefetched result is reused.
+        self.git.enqueue(
+            GitRequestShowCommit(
+                commit_id, priority=GitPriority.INTERACTIVE, streaming=True
+            )
+        )
+
+    @on(CommitPanel.ExpandRequested)
+    def expand_commit(self, event: CommitPanel.ExpandRequested) -> None:
+        self.commit_panel.begin_commit(event.commit_id, expanded=True)
+        self.git.enqueue(
+            GitRequestShowCommit(
+                event.commit_id, priority=GitPriority.INTERACTIVE, streaming=True
+            )
+        )
+
+    def action_show_diff(self) -> None:
+        """Show the diff of the working tree, rather than a commit."""
+        self.commit_panel.display = False
+        self.diff_panel.display = True
+        self._update_body_header()
+
+    def _update_body_header(self, *_: Any) -> None:
+        commit_panel = self.commit_panel
+        if not commit_panel.display:
+            self.body_header.update("Diff")
+            return
+        header = f"Commit {commit_panel.commit_id}"
+        if commit_panel.notice:
+            header = f"{header} · {commit_panel.notice}"
+        self.body_header.update(header)
+
+    @on(FilesPanel.StagingRequested)
+    def stage_files(self, event: FilesPanel.StagingRequested) -> None:
+        self.index_writer.set_staged(event.paths, event.staged)
+
+    def _staging_written(self, write: IndexWrite) -> None:
+        for error in write.errors:
+            self.notify(error, title="Couldn't stage", severity="error")
+        self._settle_staging(write.paths)
+
+    @work(group="settle-staging")
+    async def _settle_staging(self, paths: frozenset[str]) -> None:
+        """Replace the guessed statuses of staged or unstaged files with git's."""
+        # Without waiting for the watcher to see the index change.
+        self.refresh_changes([ChangeKind.INDEX])
+        result = await self.git.submit(GitRequestFileStatus(), post_result=False)
+        self._show_status(result, paths)
+
+    @on(DiffPanel.HunkStagingRequested)
+    def stage_hunk(self, event: DiffPanel.HunkStagingRequested) -> None:
+        self._stage_hunk(event.patch)
+
+    @work(group="stage-hunk")
+    async def _stage_hunk(self, patch: str) -> None:
+        for error in await self.index_writer.apply_patch(patch):
+            self.notify(error, title="Couldn't stage the hunk", severity="error")
+        self.refresh_changes([ChangeKind.INDEX])
+
+    @work(exclusive=True, group="commit")
+    async def action_commit(self) -> None:
+        message = await self.app.push_screen_wait(CommitMessageScreen())
+        if not message:
+            return
+        if errors := await self.index_writer.commit(message):
+            for error in errors:
+                self.notify(error, title="Couldn't commit", severity="error")
+            return
+        self.notify(message.splitlines()[0], title="Committed")
+        # Committing moves the branch, but leaves the index as it was.
+        self.refresh_changes([ChangeKind.REFS])
+
+    @on(OptionList.OptionHighlighted, "#commits-panel KeyedOptionList")
+    def prefetch_commits(self, event: OptionList.OptionHighlighted) -> None:
+        # Wait for the highlight to settle, rather than prefetching for every
+        # commit passed over while the arrow key is held.
+        if self._prefetch_timer is not None:
+            self._prefetch_timer.stop()
+        if event.option_list.has_focus:
+            self._prefetch_timer = self.set_timer(
+                self.PREFETCH_DELAY, self._prefetch_commits
+            )
+        else:
+            self.prefetcher.cancel()
+
+    def _prefetch_commits(self) -> None:
+        """Prefetch the highlighted commit and its neighbours, nearest first."""
+        option_list = self.commits_panel.active_list
+        if (highlighted := option_list.highlighted) is None:
+            return
+        radius = self.PREFETCH_RADIUS
+        indexes = range(
+            max(0, highlighted - radius),
+            min(option_list.option_count, highlighted + radius + 1),
+        )
+        self.prefetcher.prefetch(
+            GitRequestShowCommit(option.id, priority=GitPriority.PREFETCH)
+            for index in sorted(indexes, key=lambda index: abs(index - highlighted))
+            if (option := option_list.get_option_at_index(index)).id is not None
+        )
+
+    def refresh_changes(
+        self, kinds: Iterable[ChangeKind], changed_files: Iterable[str] = ()
+    ) -> None:
+        """Re-run only the git commands affected by the given kinds of change.
+
+        Args:
+            kinds: The kinds of change which have happened.
+            changed_files: Working tree files which changed, relative to the top
+                of the working tree. If only a few files changed, only they are
+                re-diffed.
+        """
+        kinds = set(kinds)
+        changed_files = set(changed_files)
+        commands: dict[type[GitCommand], GitCommand] = {}
+        for kind in kinds:
+            match kind:
+                case ChangeKind.REFS:
+                    # `git diff` compares the working tree with the index, so
+                    # moving HEAD alone doesn't change it.
+                    commands[GitRequestFileStatus] = GitRequestFileStatus()
+                    commands[GitRequestCommits] = GitRequestCommits("HEAD")
+                case ChangeKind.INDEX:
+                    commands[GitRequestFileStatus] = GitRequestFileStatus()
+                    commands[GitRequestAllFileDiffs] = GitRequestAllFileDiffs()
+                case ChangeKind.WORKTREE:
+                    commands[GitRequestFileStatus] = GitRequestFileStatus()
+                    if len(changed_files) > self.MAX_INCREMENTAL_DIFF_FILES:
+                        commands[GitRequestAllFileDiffs] = GitRequestAllFileDiffs()
+
+        for command in commands.values():
+            self.git.enqueue(command, supersede=True)
+        if ChangeKind.REFS in kinds:
+            for kind in self.branches_panel.loaded_kinds:
+                self.git.enqueue(GitRequestRefs(kind), supersede=True)
+
+        if ChangeKind.WORKTREE in kinds and GitRequestAllFileDiffs not in commands:
+            for file_path in changed_files:
+                self.git.enqueue(GitRequestFileDiff(file_path), supersede=True)
+
+    @on(GitCommand)
+    def handle_git_command(self, command: GitCommand) -> None:
+        self.git.enqueue(command)
+
+    @on(GitCommandResult)
+    def handle_git_command_result(self, result: GitCommandResult) -> None:
+        started = time.perf_counter()
+        try:
+            self._handle_git_command_result(result)
+        finally:
+            if result.timing is not None:
+                elapsed = (time.perf_counter() - started) * 1000
+                self.git.timings.record_handling(result.timing, elapsed, finished=True)
+
+    @on(GitCommandOutput)
+    def handle_git_command_output(self, output: GitCommandOutput) -> None:
+        """Handle a chunk of output from a streaming git command."""
+        started = time.perf_counter()
+        try:
+            self._handle_git_command_output(output)
+        finally:
+            if output.timing is not None:
+                elapsed = (time.perf_counter() - started) * 1000
+                self.git.timings.record_handling(output.timing, elapsed, finished=False)
+
+    def _handle_git_command_result(self, result: GitCommandResult) -> None:
+        log.debug(result.command.command_name)
+
+        # Depending on the original command, handle the result differently.
+        match result.command:
+            case GitRequestFileStatus():
+                self._show_status(result)
+            case GitRequestCurrentBranchName():
+                branch_name = result.stdout.decode("utf-8").strip()
+                self.status_bar.set_branch_name(branch_name)
+            case GitRequestAllFileDiffs():
+                # The output was streamed in by handle_git_command_output.
+                self.diff_panel.end_diff()
+                self.moonbunny.mark_startup("diff")
+            case GitRequestFileDiff(file_path=file_path):
+                output = result.stdout.decode("utf-8")
+                self.diff_panel.set_file_diff(file_path, output)
+            case GitRequestRefs(kind=kind, count=count):
+                try:
+                    refs = parse_refs(result.stdout)
+                except ValueError as error:
+                    log.warning(f"Couldn't parse refs: {error}")
+                    return
+                complete = count is None or len(refs) < count
+                self.branches_panel.set_refs(kind, refs, complete)
+                if not complete:
+                    self.git.enqueue(GitRequestRefs(kind, count=None))
+                if kind == RefKind.BRANCH:
+                    self.moonbunny.mark_startup("branches panel")
+                    if complete:
+                        self.save_history(lambda history: history.save_branches(refs))
+            case GitRequestCommits(branch_name=branch_name, skip=skip, count=count):
+                # The output was streamed in by handle_git_command_output.
+                commits_panel = self.commits_panel
+                commits_panel.page_loaded(branch_name, skip, count)
+                self.moonbunny.mark_startup("commits panel")
+                commits = commits_panel.commits
+                self.save_history(
+                    lambda history: history.save_commits(branch_name, commits)
+                )
+            case GitRequestShowCommit(revision=revision):
+                # The output was streamed in by handle_git_command_output.
+                error = None
+                if result.returncode != 0:
+                    error = result.stderr.decode("utf-8", errors="replace").strip()
+                self.commit_panel.end_commit(revision, error)
+            case _:
+                log.warning(f"Unknown git command: {result.command}")
+
+    def _show_status(
+        self, result: GitCommandResult, settled: Iterable[str] = ()
+    ) -> None:
+        """Show the result of a `GitRequestFileStatus`.
+
+        Args:
+            result: The result.
+            settled: Files staged or unstaged before the status was requested.
+        """
+        try:
+            status = parse_status(result.stdout)
+        except ValueError as error:
+            log.warning(f"Couldn't parse git status: {error}")
+            return
+        self.files_panel.set_files(status.entries, settled)
+        if status.branch is not None:
+            self.status_bar.set_branch_status(status.branch, status.stash)
+        self.moonbunny.mark_startup("files panel")
+        self.moonbunny.mark_startup("status bar")
+
+    def _handle_git_command_output(self, output: GitCommandOutput) -> None:
+        match output.command:
+            case GitRequestAllFileDiffs():
+                diff_panel = self.diff_panel
+                if output.index == 0:
+                    diff_panel.begin_diff()
+                diff_panel.append_diff(output.stdout.decode("utf-8", errors="replace"))
+                self._diff_begun.set()
+            case GitRequestCommits(branch_name=branch_name, skip=skip):
+                try:
+                    commits = parse_log(output.stdout)
+                except ValueError as error:
+                    log.warning(f"Couldn't parse git log: {error}")
+                    return
+                self.commits_panel.add_page_chunk(
+                    branch_name, skip, commits, first_chunk=output.index == 0
+                )
+            case GitRequestShowCommit(revision=revision):
+                text = output.stdout.decode("utf-8", errors="replace")
+                self.commit_panel.append_commit(
+                    revision, text, first_chunk=output.index == 0
+                )
+            case _:
+                log.warning(f"Unexpected output from git command: {output.command}")
+
+    @work(exclusive=True, group="git-watcher")
+    async def watch_git_files(self) -> None:
+        """Watch the repository, refreshing whatever each batch of changes affects."""
+
+        # Lazy import because it's slow and delays startup a decent amount.
+        from watchfiles import awatch  # type: ignore
+
+        result = await self.git.submit(GitRequestRepositoryPaths(), post_result=False)
+        if result.returncode != 0:
+            log.warning(f"Not watching for changes: {result.stderr!r}")
+            return
+
+        paths = RepositoryPaths.from_rev_parse(result.stdout)
+        self.status_bar.set_repo_name(paths.worktree.name)
+        await self.restore_history(paths)
+
+        settings = await self.moonbunny.load_settings()
+        # Cached results are only safe to reuse while changes are being watched.
+        if settings.git_cache_max_bytes > 0:
+            self.git.cache = GitResultCache(paths, settings.git_cache_max_bytes)
+
+        async for changes in awatch(  # type: ignore
+            *paths.watch_paths,
+            watch_filter=RepositoryWatchFilter(paths),
+            debounce=settings.watch_debounce_ms,
+        ):
+            batch = classify_changes((path for _, path in changes), paths)  # type: ignore
+            if self.git.cache is not None:
+                # Before anything's awaited, so no stale result can be reused.
+                # Changes to ignored paths may invalidate the working tree for
+                # nothing, but that only costs a cache miss.
+                self.git.cache.invalidate(batch)
+            if worktree_paths := batch.get(ChangeKind.WORKTREE):
+                # Drop anything covered by .gitignore, so e.g. installing
+                # dependencies or building doesn't trigger a refresh storm.
+                ignored = await self.git.submit(
+                    GitRequestIgnoredPaths(worktree_paths), post_result=False
+                )
+                worktree_paths.difference_update(
+                    ignored.stdout.decode("utf-8", errors="surrogateescape").split("\0")
+                )
+                if not worktree_paths:
+                    del batch[ChangeKind.WORKTREE]
+
+            log.debug(f"Refreshing after changes: {batch}")
+            changed_files = [
+                Path(path).relative_to(paths.worktree).as_posix()
+                for path in batch.get(ChangeKind.WORKTREE, ())
+            ]
+            self.refresh_changes(batch, changed_files)
+
+    async def restore_history(self, paths: RepositoryPaths) -> None:
+        """Fill the sidebar from the history store, while git catches up."""
+        try:
+            history = await asyncio.to_thread(
+                HistoryStore.for_repository, paths.git_dir
+            )
+            commits = await asyncio.to_thread(history.load_commits, "HEAD")
+            branches = await asyncio.to_thread(history.load_branches)
+        except (sqlite3.Error, OSError) as error:
+            log.warning(f"Not using the history store: {error}")
+            self._unsaved_history = None
+            return
+
+        self.history = history
+        self.commits_panel.restore_commits("HEAD", commits)
+        self.branches_panel.restore_branches(branches)
+        self.moonbunny.mark_startup("history restored")
+
+        # Git may have answered while the store was being opened.
+        unsaved_history, self._unsaved_history = self._unsaved_history or [], None
+        for save in unsaved_history:
+            self.save_history(save)
+
+    def save_history(self, save: Callable[[HistoryStore], int]) -> None:
+        """Write to the history store in the background."""
+        if self._unsaved_history is not None:
+            self._unsaved_history.append(save)
+            return
+        if (history := self.history) is None:
+            return
+
+        def write() -> None:
+            try:
+                save(history)
+            except sqlite3.Error as error:
+                log.warning(f"Couldn't write to the history store: {error}")
+
+        self._history_writer.submit(write)
 
     def action_git_status(self) -> None:
         self.git.enqueue_request_file_status()
@@ -93,116 +576,214 @@ class Moonbunny(App[None], inherit_bindings=False):
 
     Doesn't do any rendering - that's all done at the screen level.
 
-    The app's message pump is also used to handle interaction with git.
-
-    Send one of the messages prefixed with Git to this widget in order
-    to handle git commands. This App will receive those messages and
-    update the UI accordingly.
+    Each repository is shown by a `Home` screen, which runs its git commands
+    and handles the results. In workspace mode there's one per repository, each
+    the base of its own mode, so it's kept alive when switching away and
+    switching back is instant. All of them share one pool of git processes.
     """
 
     CSS_PATH = Path(__file__).parent / "moonbunny.scss"
     BINDINGS = [
         Binding(key="q", action="quit", description="Quit"),
+        Binding(key="w", action="show_repositories", description="repositories"),
+        Binding(key="ctrl+g", action="show_diagnostics", description="git timings"),
     ]
     ALLOW_SELECT = False
 
-    settings: Settings
-    git: GitTaskRunner
+    settings: "Settings"
+    """Loaded once the first frame has been displayed, as pydantic is slow to import.
+    Until then, use `load_settings`."""
+    home_screen: Home
+    """The screen of the repository being shown."""
+    workspace: Workspace | None = None
+    """The repositories open side by side, if in workspace mode."""
 
-    def __init__(self, *args: Any, **kwargs: Any) -> None:
+    STARTUP_PROFILE_TIMEOUT = 30
+    """With `--profile-startup`, give up on panels which haven't filled after this long."""
+
+    def __init__(
+        self,
+        *args: Any,
+        repositories: list[str] | None = None,
+        startup_profile: StartupProfile | None = None,
+        **kwargs: Any,
+    ) -> None:
+        """
+        Args:
+            repositories: Paths or glob patterns of repositories to open, in
+                place of the `workspace` setting. If more than one repository
+                matches, they're opened as a workspace.
+            startup_profile: If set, the app exits once every panel has been
+                filled from git.
+        """
         super().__init__(*args, **kwargs)
-        # Initialize settings first so we can pass git_dir to GitTaskRunner
         self.theme = "tokyo-night"
-        self.settings = Settings()
-        self.git = GitTaskRunner(self, git_dir=self.settings.git_dir)
+        self.repositories = repositories or []
+        self.startup_profile = startup_profile
+        self.home_screen = Home()
+        self._homes: dict[Path, Home] = {}
+        """The screen of each repository in the workspace."""
+        self._repository_modes: dict[Path, str] = {}
+        """The mode each repository in the workspace is shown in."""
+
+    @property
+    def git(self) -> GitTaskRunner:
+        """The runner of the repository being shown."""
+        return self.home_screen.git
 
     async def on_ready(self) -> None:
+        self.mark_startup("first frame")
+        if self.startup_profile is not None:
+            self.set_timer(self.STARTUP_PROFILE_TIMEOUT, self.exit)
+
+        # Git starts out with the default limits, which are changed once the
+        # settings are loaded, so it needn't wait for pydantic to be imported.
+        # That's only once it's known which repository to open, though.
+        pool = GitProcessPool()
+        repositories: list[Path] | None = None
+        if self.repositories:
+            repositories = await asyncio.to_thread(find_repositories, self.repositories)
+            if len(repositories) == 1:
+                await self._start_early(str(repositories[0]), pool)
+        elif not _settings_choose_repository():
+            await self._start_early(None, pool)
+
+        self._settings_loaded: asyncio.Task["Settings"] = asyncio.create_task(
+            self._load_settings()
+        )
+        self.settings = settings = await self._settings_loaded
+        self.mark_startup("settings")
+        pool.set_limits(settings.git_max_processes, settings.git_max_spawns_per_second)
+        if self.git.started:
+            self.git.set_workers(settings.git_workers)
+            self.git.persistent_processes = settings.git_persistent_processes
+            return
+
+        git_dir = settings.git_dir
+        if patterns := self.repositories or settings.workspace:
+            if repositories is None:
+                repositories = await asyncio.to_thread(find_repositories, patterns)
+            if len(repositories) > 1:
+                await self.open_workspace(repositories, pool)
+                return
+            if repositories:
+                git_dir = str(repositories[0])
+            else:
+                self.notify(
+                    f"No repositories match {', '.join(patterns)}", severity="error"
+                )
+
+        self._configure_runner(self.git, git_dir, pool)
+        await self.git.start()
+        self.home_screen.watch_git_files()
+
+    async def load_settings(self) -> "Settings":
+        """Wait for the settings to be loaded, if they haven't been already."""
+        return await self._settings_loaded
+
+    async def _load_settings(self) -> "Settings":
+        if self.git.started:
+            # Importing pydantic hogs the GIL, so would hold up handling the
+            # first results from git. It's left until they've arrived.
+            await self.home_screen.wait_for_startup()
+        return await asyncio.to_thread(_load_settings)
+
+    async def _start_early(self, git_dir: str | None, pool: GitProcessPool) -> None:
+        """Start running git for the default screen before the settings are loaded."""
+        self.git.configure(git_dir=git_dir, pool=pool)
         await self.git.start()
-        self.watch_git_files()
+        self.home_screen.watch_git_files()
+
+    async def open_workspace(
+        self, repositories: list[Path], pool: GitProcessPool
+    ) -> None:
+        """Open the repositories side by side, showing the first.
+
+        Each gets a screen of its own, in place of the default one.
+        """
+        for path in repositories:
+            home = self._homes[path] = Home()
+            mode = self._repository_modes[path] = f"repository:{path}"
+            self.install_screen(home, mode)
+            self.add_mode(mode, mode)
+            self._configure_runner(home.git, str(path), pool)
+            await home.git.start()
+        self.switch_repository(repositories[0])
+
+        self.workspace = Workspace(
+            {path: home.git for path, home in self._homes.items()},
+            self.settings.workspace_refresh_seconds,
+        )
+        self.run_worker(self.workspace.refresh_summaries(), group="workspace")
+        self.refresh_bindings()
+
+    def _configure_runner(
+        self, git: GitTaskRunner, git_dir: str | None, pool: GitProcessPool
+    ) -> None:
+        settings = self.settings
+        git.configure(
+            git_dir=git_dir,
+            workers=settings.git_workers,
+            persistent_processes=settings.git_persistent_processes,
+            pool=pool,
+        )
+
+    def mark_startup(self, stage: str) -> None:
+        """Record that a stage of startup was reached, if profiling startup."""
+        if (profile := self.startup_profile) is None:
+            return
+        profile.mark(stage)
+        if profile.complete:
+            self.exit()
+
+    async def on_unmount(self) -> None:
+        for home in self._homes.values() or [self.home_screen]:
+            await home.git.close()
 
     def get_default_screen(self) -> Screen[None]:
-        self.home_screen = Home(self.git)
         return self.home_screen
 
-    @on(GitCommand)
-    def handle_git_command(self, command: GitCommand) -> None:
-        self.git.commands.put_nowait(command)
+    def check_action(self, action: str, parameters: tuple[object, ...]) -> bool | None:
+        if action == "show_repositories":
+            return self.workspace is not None
+        return True
 
-    @on(GitCommandResult)
-    def handle_git_command_result(self, result: GitCommandResult) -> None:
-        log.debug(result.command.command_name)
+    @work(exclusive=True, group="show-repositories")
+    async def action_show_repositories(self) -> None:
+        if self.workspace is None or isinstance(self.screen, RepositoriesScreen):
+            return
+        current = next(
+            path for path, home in self._homes.items() if home is self.home_screen
+        )
+        path = await self.push_screen_wait(RepositoriesScreen(self.workspace, current))
+        if path is not None:
+            # The repositories screen has been popped by now.
+            self.switch_repository(path)
 
-        # Depending on the original command, handle the result differently.
-        match result.command:
-            case GitRequestFileStatus():
-                output = result.stdout.decode("utf-8")
-                log.debug(output)
-                lines = output.splitlines()
-                file_statuses: list[FileStatus] = []
-                for line in lines:
-                    if line.strip():
-                        parts = line.split(maxsplit=8)
-                        if len(parts) >= 9 and parts[0] == "1":
-                            # Porcelain v2 format: 1 <XY> <sub> <mH> <mI> <mW> <hH> <hI> <path>
-                            xy_status = parts[1]
-                            path = Path(parts[8])
-                            staged = xy_status[0] != "."  # X position - staged status
-                            unstaged = (
-                                xy_status[1] != "."
-                            )  # Y position - unstaged status
-                            status_char = xy_status
-                            file_statuses.append(
-                                FileStatus(path, staged, unstaged, status_char)
-                            )
-                        elif line.startswith("?"):
-                            # Untracked files: ? <path>
-                            path = Path(line[2:])  # Remove "? " prefix
-                            file_statuses.append(FileStatus(path, False, True, "?"))
-                self.home_screen.files_panel.set_files(file_statuses)
-            case GitRequestCurrentBranchName():
-                branch_name = result.stdout.decode("utf-8").strip()
-                self.home_screen.status_bar.set_branch_name(branch_name)
-            case GitRequestAllFileDiffs():
-                output = result.stdout.decode("utf-8")
-                self.home_screen.diff_panel.set_diff(output)
-            case GitRequestRecentBranches():
-                output = result.stdout.decode("utf-8")
-                lines = output.splitlines()
-                formatted_branches: list[str] = []
-                for line in lines:
-                    if "|" in line:
-                        time_part, branch_name = line.split("|", 1)
-                        formatted_time = format_relative_time(time_part.strip())
-                        formatted_branches.append(f"{formatted_time} {branch_name}")
-                    else:
-                        # Fallback for branches without time info
-                        formatted_branches.append(line)
-                self.home_screen.branches_panel.set_branches(formatted_branches)
-            case GitRequestCommits():
-                output = result.stdout.decode("utf-8")
-                lines = output.splitlines()
-                # Filter out empty lines and set commits
-                commits = [line for line in lines if line.strip()]
-                self.home_screen.commits_panel.set_commits(commits)
-            case _:
-                log.warning(f"Unknown git command: {result.command}")
+    def switch_repository(self, path: Path) -> None:
+        """Show another repository in the workspace, just as it was left."""
+        if (home := self._homes.get(path)) is not None:
+            self.home_screen = home
+            self.switch_mode(self._repository_modes[path])
 
-    @work(exclusive=True, group="git-watcher")
-    async def watch_git_files(self) -> None:
-        """Watching git files."""
+    def action_show_diagnostics(self) -> None:
+        if not isinstance(self.screen, DiagnosticsScreen):
+            self.push_screen(DiagnosticsScreen(self.git))
 
-        # Lazy import because it's slow and delays startup a decent amount.
-        from watchfiles import awatch  # type: ignore
 
-        async for changes in awatch(Path.cwd()):  # type: ignore
-            for change_type, file_path in changes:  # type: ignore
-                log.debug(f"Git file changed: {file_path}")
+def _settings_choose_repository() -> bool:
+    """Whether the settings may say which repository to open.
 
+    Checked without loading them, as loading them is slow.
+    """
+    if Path(".env").exists():
+        return True
+    names = {"MOONBUNNY_GIT_DIR", "MOONBUNNY_WORKSPACE"}
+    return any(value and name.upper() in names for name, value in os.environ.items())
 
-def main() -> None:
-    app = Moonbunny()
-    app.run()
 
+def _load_settings() -> "Settings":
+    # Lazy import because pydantic is slow to import, and would delay the first frame.
+    from moonbunny.settings import Settings
 
-if __name__ == "__main__":
-    main()
+    return Settings()
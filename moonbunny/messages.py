@@ -1,36 +1,114 @@
 from dataclasses import dataclass, field
-import shlex
+from enum import Enum, IntEnum
+from typing import TYPE_CHECKING, ClassVar
 
 from textual.message import Message
 
+if TYPE_CHECKING:
+    from moonbunny.timings import CommandTiming
+
+
+class GitPriority(IntEnum):
+    """How urgently a git command should be run. Lower values run first."""
+
+    INTERACTIVE = 0
+    """Cheap commands the user is looking at right now (branch name, file status)."""
+
+    NORMAL = 1
+    """Everything else."""
+
+    BULK = 2
+    """Potentially slow commands with large output (full diffs, commit history)."""
+
+    PREFETCH = 3
+    """Commands run ahead of time to warm the cache, in case they're wanted soon."""
+
+
+class GitState(Enum):
+    """The parts of a repository's state which the output of a command can depend on."""
+
+    HEAD = "head"
+    """What HEAD points to, and the commit it resolves to."""
+
+    REFS = "refs"
+    """Any branch, tag or remote ref (including HEAD)."""
+
+    INDEX = "index"
+
+    WORKTREE = "worktree"
+
 
 @dataclass
 class GitCommand(Message):
     """Request to run a git command."""
 
+    depends_on: ClassVar[frozenset[GitState] | None] = None
+    """The state the command's output depends on, so it can be cached.
+
+    If `None` the output is never cached. If empty, the output never changes
+    (e.g. an object looked up by its oid).
+    """
+
     command_name: str
     """The name of the git command to run e.g. 'status', 'add', 'commit', etc."""
 
     args: list[str] = field(default_factory=list)
+    """Arguments passed to the command as-is. They're never interpreted by a shell."""
+
+    priority: GitPriority = field(default=GitPriority.NORMAL)
+    """Commands with a lower priority value are run before those with a higher one."""
+
+    stdin: bytes | None = field(default=None)
+    """Data to write to the command's standard input, if any."""
 
-    requires_escape: bool = field(default=True)
-    """Whether the arguments need to be escaped.
+    streaming: bool = field(default=False)
+    """Whether output should be delivered in `GitCommandOutput` messages as it arrives.
 
-    If they contain anything from userland, they should be escaped.
-    (e.g. branch names, file paths, etc.)
+    The stdout of the final `GitCommandResult` will be empty.
     """
 
     def __post_init__(self) -> None:
-        if self.requires_escape:
-            self.args = [shlex.quote(arg) for arg in self.args]
+        super().__post_init__()
 
     @property
     def command(self) -> list[str]:
         return ["git", self.command_name] + self.args
 
+    @property
+    def key(self) -> tuple[str, tuple[str, ...], bytes | None]:
+        """Identifies equivalent commands, so duplicate requests can be merged."""
+        return self.command_name, tuple(self.args), self.stdin
+
     def __rich_repr__(self):
         yield "command_name", self.command_name
         yield "args", self.args
+        yield "priority", self.priority
+
+
+@dataclass
+class GitCommandOutput(Message):
+    """A chunk of the output of a streaming git command."""
+
+    command: GitCommand
+    """The command that is running."""
+
+    stdout: bytes
+    """The next chunk of stdout. Always ends on a line boundary, bar the last chunk."""
+
+    index: int
+    """The position of this chunk in the output.
+
+    The first chunk (index 0) is sent even if there's no output, so receivers
+    know to discard anything left over from a previous run of the command.
+    """
+
+    timing: "CommandTiming | None" = None
+    """Where to record the time spent handling the output."""
+
+    def __rich_repr__(self):
+        yield "command", self.command
+        yield "index", self.index
+        yield "stdout", self.stdout
 
 
 @dataclass
@@ -49,6 +127,10 @@ class GitCommandResult(Message):
     returncode: int | None
     """The return code of the command."""
 
+    timing: "CommandTiming | None" = None
+    """Where the time went running the command, and where to record the time
+    spent handling the result."""
+
     def __rich_repr__(self):
         yield "command", self.command
         yield "stdout", self.stdout
@@ -1,11 +1,170 @@
-from pathlib import Path
+from enum import StrEnum
 from typing import NamedTuple
 
 
+class EntryKind(StrEnum):
+    """The type of a `git status --porcelain=v2` record, by its leading character."""
+
+    CHANGED = "1"
+    RENAMED = "2"
+    """Renamed or copied."""
+    UNMERGED = "u"
+    UNTRACKED = "?"
+    IGNORED = "!"
+
+
 class FileStatus(NamedTuple):
-    """Represents a file's git status information."""
+    """Represents a file's git status, as listed by `git status --porcelain=v2`."""
+
+    kind: EntryKind
+    xy: str
+    """The staged (X) and unstaged (Y) status codes, e.g. `M.` or `.D`. `??` for
+    untracked files and `!!` for ignored files."""
+    path: str
+    """The path of the file, relative to the top of the working tree."""
+    original_path: str | None = None
+    """The path a renamed or copied file had before."""
+    submodule: str = "N..."
+    """The submodule state, e.g. `S.M.`, or `N...` if the file isn't a submodule."""
+    score: str | None = None
+    """How similar a renamed or copied file is to the original, e.g. `R100`."""
+
+    @property
+    def name(self) -> str:
+        return self.path.rpartition("/")[2]
+
+    @property
+    def staged(self) -> bool:
+        return self.xy[0] not in ".?!"
+
+    @property
+    def unstaged(self) -> bool:
+        return self.xy[1] != "."
+
+    def index_paths(self, staged: bool) -> list[str]:
+        """The paths to pass to git to stage (or unstage) the file's changes.
+
+        A rename removes the original path as well as adding the new one, so
+        both are staged or unstaged together. Git refuses paths which aren't
+        in the index or working tree, so the original is only included while
+        the rename is on the side being moved.
+        """
+        rename = self.xy[1 if staged else 0] == "R"
+        if rename and self.original_path is not None:
+            return [self.path, self.original_path]
+        return [self.path]
+
+    def as_staged(self) -> "list[FileStatus]":
+        """The statuses the file will have once its changes are staged.
+
+        This is a guess, shown until git is asked again, so merge conflicts are
+        only roughly right. Empty if the file won't be listed.
+        """
+        if self.kind == EntryKind.UNTRACKED:
+            return [FileStatus(EntryKind.CHANGED, "A.", self.path)]
+        staged, unstaged = self.xy
+        if unstaged == ".":
+            return [self]
+        if staged == "A" and unstaged == "D":
+            # Added and then deleted, so there's nothing left to commit.
+            return []
+        if self.kind == EntryKind.UNMERGED:
+            return [self._replace(kind=EntryKind.CHANGED, xy="M.")]
+        xy = f"{unstaged if staged == '.' or unstaged == 'D' else staged}."
+        return [self._replace(xy=xy)]
+
+    def as_unstaged(self) -> "list[FileStatus]":
+        """The statuses the file will have once its staged changes are unstaged.
+
+        Like `as_staged`, this is a guess. Empty if the file won't be listed.
+        """
+        if not self.staged or self.kind == EntryKind.UNMERGED:
+            return [self]
+        staged, unstaged = self.xy
+        if staged in "ARC":
+            files: list[FileStatus] = []
+            if unstaged != "D":
+                # The file isn't in HEAD (under this name), so becomes untracked.
+                files.append(FileStatus(EntryKind.UNTRACKED, "??", self.path))
+            if staged == "R" and self.original_path is not None:
+                # The original is back in the index, but not the working tree.
+                files.append(FileStatus(EntryKind.CHANGED, ".D", self.original_path))
+            return files
+        return [self._replace(xy=f".{staged if unstaged == '.' else unstaged}")]
+
+
+class BranchStatus(NamedTuple):
+    """The `# branch.*` headers output by `git status --porcelain=v2 --branch`."""
+
+    oid: str | None = None
+    """The commit HEAD points at, or `None` before the first commit."""
+    head: str | None = None
+    """The name of the current branch, or `None` if HEAD is detached."""
+    upstream: str | None = None
+    ahead: int | None = None
+    """Commits on the branch which aren't on its upstream (if it has one)."""
+    behind: int | None = None
+    """Commits on the upstream which aren't on the branch (if it has one)."""
+
+    @property
+    def description(self) -> str:
+        """The name of the branch, or what HEAD is detached at."""
+        if self.head is not None:
+            return self.head
+        if self.oid is not None:
+            return f"detached at {self.oid[:7]}"
+        return "detached"
+
+    @property
+    def tracking(self) -> str:
+        """How the branch compares to its upstream, or "" if it has none."""
+        if self.upstream is None:
+            return ""
+        if self.ahead is None or self.behind is None:
+            # The upstream is configured, but the ref doesn't exist.
+            return f"{self.upstream} gone"
+        if self.ahead or self.behind:
+            return f"↑{self.ahead} ↓{self.behind}"
+        return "up to date"
+
+
+class Commit(NamedTuple):
+    """A commit, as listed by `git log` in `GitRequestCommits`'s format."""
+
+    hash: str
+    """The abbreviated hash of the commit."""
+    author: str
+    subject: str
+
+
+class RefKind(StrEnum):
+    """The kinds of ref listed in the branches panel, by the prefix of their names."""
+
+    BRANCH = "refs/heads/"
+    REMOTE = "refs/remotes/"
+    TAG = "refs/tags/"
+
+
+class Branch(NamedTuple):
+    """A branch, remote branch or tag, as listed by `git for-each-ref`."""
+
+    ref: str
+    """The full name of the ref, e.g. `refs/heads/main`."""
+    committer_date: int
+    """When the commit at the tip was made (or an annotated tag was), in seconds
+    since the epoch."""
+    upstream: str | None = None
+    """The short name of the branch's upstream, if it has one."""
+    ahead: int | None = None
+    """Commits on the branch which aren't on its upstream, if that's known."""
+    behind: int | None = None
+    """Commits on the upstream which aren't on the branch, if that's known."""
+
+    @property
+    def kind(self) -> RefKind:
+        return RefKind(self.ref[: self.ref.index("/", 5) + 1])
 
-    path: Path
-    staged: bool
-    unstaged: bool
-    status_char: str  # The git status character (M, A, D, etc.)
+    @property
+    def name(self) -> str:
+        """The name of the ref without its prefix, e.g. `main` or `origin/main`."""
+        return self.ref.split("/", 2)[2]
@@ -0,0 +1,172 @@
+from typing import NamedTuple
+
+from moonbunny.models import Branch, BranchStatus, Commit, EntryKind, FileStatus
+
+
+class Status(NamedTuple):
+    """The parsed output of `git status --porcelain=v2 -z`."""
+
+    entries: list[FileStatus]
+    branch: BranchStatus | None = None
+    """The branch headers, if `--branch` was passed."""
+    stash: int = 0
+    """The number of stash entries, if `--show-stash` was passed."""
+
+
+def _decode(path: bytes) -> str:
+    # Paths are bytes to git. Undecodable bytes survive a round trip back to git.
+    return path.decode("utf-8", errors="surrogateescape")
+
+
+def parse_status(output: bytes) -> Status:
+    """Parse the output of `git status --porcelain=v2 -z`, in a single pass.
+
+    Every record type is supported, along with the headers added by `--branch`
+    and `--show-stash`. Records are NUL terminated and paths aren't quoted, so
+    only the paths and status codes are decoded, and any path is handled.
+    Unknown record types are skipped, so newer versions of git can add them.
+
+    Raises:
+        ValueError: If a record is malformed.
+    """
+    fields = output.split(b"\0")
+    field_count = len(fields)
+    entries: list[FileStatus] = []
+    append = entries.append
+    headers: dict[bytes, bytes] = {}
+
+    index = 0
+    while index < field_count:
+        field = fields[index]
+        index += 1
+        if not field:
+            continue
+        match field[0]:
+            case 0x31:  # "1 <XY> <sub> <mH> <mI> <mW> <hH> <hI> <path>"
+                parts = field.split(b" ", 8)
+                if len(parts) != 9:
+                    raise ValueError(f"Malformed status record {field!r}")
+                append(
+                    FileStatus(
+                        EntryKind.CHANGED,
+                        parts[1].decode("ascii"),
+                        _decode(parts[8]),
+                        None,
+                        parts[2].decode("ascii"),
+                    )
+                )
+            case 0x32:  # "2 <XY> <sub> <mH> <mI> <mW> <hH> <hI> <score> <path>\0<orig>"
+                parts = field.split(b" ", 9)
+                if len(parts) != 10 or index >= field_count:
+                    raise ValueError(f"Malformed status record {field!r}")
+                original_path = fields[index]
+                index += 1
+                append(
+                    FileStatus(
+                        EntryKind.RENAMED,
+                        parts[1].decode("ascii"),
+                        _decode(parts[9]),
+                        _decode(original_path),
+                        parts[2].decode("ascii"),
+                        parts[8].decode("ascii"),
+                    )
+                )
+            case 0x75:  # "u <XY> <sub> <m1> <m2> <m3> <mW> <h1> <h2> <h3> <path>"
+                parts = field.split(b" ", 10)
+                if len(parts) != 11:
+                    raise ValueError(f"Malformed status record {field!r}")
+                append(
+                    FileStatus(
+                        EntryKind.UNMERGED,
+                        parts[1].decode("ascii"),
+                        _decode(parts[10]),
+                        None,
+                        parts[2].decode("ascii"),
+                    )
+                )
+            case 0x3F:  # "? <path>"
+                append(FileStatus(EntryKind.UNTRACKED, "??", _decode(field[2:])))
+            case 0x21:  # "! <path>"
+                append(FileStatus(EntryKind.IGNORED, "!!", _decode(field[2:])))
+            case 0x23:  # "# <header> <value>"
+                header, _, value = field[2:].partition(b" ")
+                headers[header] = value
+
+    branch = None
+    if any(header.startswith(b"branch.") for header in headers):
+        branch = _parse_branch_headers(headers)
+    stash = int(headers.get(b"stash", b"0"))
+    return Status(entries, branch, stash)
+
+
+def _parse_branch_headers(headers: dict[bytes, bytes]) -> BranchStatus:
+    oid = headers.get(b"branch.oid")
+    head = headers.get(b"branch.head")
+    upstream = headers.get(b"branch.upstream")
+    ahead = behind = None
+    if (ab := headers.get(b"branch.ab")) is not None:
+        # "+<ahead> -<behind>"
+        ahead_field, _, behind_field = ab.partition(b" ")
+        ahead = int(ahead_field.lstrip(b"+"))
+        behind = int(behind_field.lstrip(b"-"))
+    return BranchStatus(
+        oid=None if oid in (None, b"(initial)") else oid.decode("ascii"),
+        head=None if head in (None, b"(detached)") else _decode(head),
+        upstream=None if upstream is None else _decode(upstream),
+        ahead=ahead,
+        behind=behind,
+    )
+
+
+def parse_refs(output: bytes) -> list[Branch]:
+    """Parse the output of `git for-each-ref` in `GitRequestRefs`'s format.
+
+    Each line is a ref's fields separated by NULs: its name, date, upstream
+    and (optionally) `%(upstream:track,nobracket)`. Ahead and behind are left
+    as `None` when the upstream is gone, or when they weren't asked for.
+
+    Raises:
+        ValueError: If a line is malformed.
+    """
+    branches: list[Branch] = []
+    append = branches.append
+    for line in output.split(b"\n"):
+        if not line:
+            continue
+        fields = line.split(b"\0")
+        if len(fields) not in (3, 4):
+            raise ValueError(f"Malformed ref {line!r}")
+        upstream = _decode(fields[2]) if fields[2] else None
+        ahead = behind = None
+        if upstream is not None and len(fields) == 4 and fields[3] != b"gone":
+            # "", "ahead <n>", "behind <n>" or "ahead <n>, behind <n>"
+            ahead = behind = 0
+            for count in fields[3].split(b", ") if fields[3] else ():
+                direction, _, number = count.partition(b" ")
+                if direction == b"ahead":
+                    ahead = int(number)
+                else:
+                    behind = int(number)
+        append(Branch(_decode(fields[0]), int(fields[1] or 0), upstream, ahead, behind))
+    return branches
+
+
+def parse_log(output: bytes) -> list[Commit]:
+    """Parse the output of `git log` in `GitRequestCommits`'s format.
+
+    Each line is a commit's hash, author and subject separated by NULs, so a
+    subject can contain anything but a newline (which git never puts in one).
+
+    Raises:
+        ValueError: If a line is malformed.
+    """
+    commits: list[Commit] = []
+    append = commits.append
+    for line in output.decode("utf-8", errors="replace").split("\n"):
+        if not line:
+            continue
+        fields = line.split("\0")
+        if len(fields) != 3:
+            raise ValueError(f"Malformed commit {line!r}")
+        append(Commit(*fields))
+    return commits
@@ -0,0 +1,60 @@
+import asyncio
+from functools import partial
+from typing import Iterable
+
+from moonbunny.git import GitTaskRunner
+from moonbunny.messages import GitCommand, GitCommandResult
+
+
+class Prefetcher:
+    """Runs git commands ahead of time, so their results are cached when wanted.
+
+    For example, the commits either side of the highlighted one, so moving the
+    highlight with the arrow keys finds what it needs already in the cache.
+
+    Commands are run one at a time at `PREFETCH` priority, so at most one worker
+    is ever busy prefetching and anything the user asks for jumps the queue.
+    Commands which are no longer wanted are cancelled.
+    """
+
+    def __init__(self, git: GitTaskRunner) -> None:
+        self.git = git
+        self._queue: list[GitCommand] = []
+        """Commands waiting to be prefetched, most wanted first."""
+        self._current: GitCommand | None = None
+        """The command being prefetched."""
+
+    def prefetch(self, commands: Iterable[GitCommand]) -> None:
+        """Prefetch the given commands, most wanted first, abandoning any others.
+
+        Does nothing if the git runner has no cache to keep the results in.
+        """
+        commands = list(commands) if self.git.cache is not None else []
+        keys = {command.key for command in commands}
+        if self._current is not None and self._current.key not in keys:
+            self.git.cancel(self._current)
+            self._current = None
+        current_key = None if self._current is None else self._current.key
+        self._queue = [command for command in commands if command.key != current_key]
+        self._next()
+
+    def cancel(self) -> None:
+        """Abandon all prefetching."""
+        self.prefetch([])
+
+    def _next(self) -> None:
+        while self._current is None and self._queue:
+            command = self._queue.pop(0)
+            future = self.git.submit(command, post_result=False)
+            if future.done():
+                # Already cached.
+                continue
+            self._current = command
+            future.add_done_callback(partial(self._prefetched, command))
+
+    def _prefetched(
+        self, command: GitCommand, future: asyncio.Future[GitCommandResult]
+    ) -> None:
+        if self._current is command:
+            self._current = None
+            self._next()
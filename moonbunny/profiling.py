@@ -0,0 +1,45 @@
+import time
+
+
+class StartupProfile:
+    """Records how long each stage of startup took, for `--profile-startup`.
+
+    Times are measured from when the `moonbunny` command started (before
+    moonbunny itself was imported), so they're what the user experiences, less
+    the time taken to start Python.
+    """
+
+    PANELS = ("status bar", "files panel", "branches panel", "commits panel", "diff")
+    """Startup is complete once each of these has been filled from git."""
+
+    def __init__(self, started: float) -> None:
+        """
+        Args:
+            started: When the command started, from `time.perf_counter`.
+        """
+        self.started = started
+        self.marks: dict[str, float] = {}
+        """The time each stage was reached, in milliseconds since starting."""
+
+    def mark(self, stage: str) -> None:
+        """Record that a stage has been reached, if it hasn't been already."""
+        if stage not in self.marks:
+            self.marks[stage] = (time.perf_counter() - self.started) * 1000
+
+    @property
+    def complete(self) -> bool:
+        return all(panel in self.marks for panel in self.PANELS)
+
+    def report(self) -> str:
+        """The time each stage was reached, one per line, in the order reached.
+
+        Panels which were never filled are listed with `-` in place of a time.
+        """
+        lines = [
+            f"{stage:<24} {elapsed:>8.1f} ms"
+            for stage, elapsed in sorted(self.marks.items(), key=lambda mark: mark[1])
+        ]
+        lines.extend(
+            f"{panel:<24} {'-':>8}" for panel in self.PANELS if panel not in self.marks
+        )
+        return "\n".join(lines)
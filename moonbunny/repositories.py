@@ -0,0 +1,77 @@
+from pathlib import Path
+
+from textual import on
+from textual.app import ComposeResult
+from textual.binding import Binding
+from textual.content import Content
+from textual.screen import ModalScreen
+from textual.widgets import Footer, OptionList
+
+from moonbunny.widgets.keyed_option_list import KeyedOptionList
+from moonbunny.workspace import RepositorySummary, Workspace
+
+
+def _make_prompt(summary: RepositorySummary) -> Content:
+    name = Content(f"{summary.path.name:<24} ")
+    if summary.error is not None:
+        return name + Content.styled(summary.error, "$text-error")
+    if summary.refreshed_at is None or summary.branch is None:
+        return name + Content.styled("…", "$text-muted")
+
+    parts = [(summary.branch.description, "$text-accent")]
+    if tracking := summary.branch.tracking:
+        parts.append((tracking, "$text-secondary"))
+    if summary.changed:
+        parts.append((f"{summary.changed} changed", "$text-warning"))
+    else:
+        parts.append(("clean", "$text-success"))
+    if summary.stash:
+        parts.append((f"{summary.stash} stashed", "$text-secondary"))
+    return name + Content("  ").join(
+        Content.styled(text, style) for text, style in parts
+    )
+
+
+class RepositoriesScreen(ModalScreen[Path]):
+    """Lists the repositories in the workspace, to switch between them.
+
+    Each shows its branch, how it compares to its upstream, and how many files
+    have changes, as of the workspace's last background refresh. Dismisses
+    with the path of the chosen repository.
+    """
+
+    BINDINGS = [Binding("escape", "dismiss", "back")]
+
+    REFRESH_INTERVAL = 1.0
+    """How often the list is updated from the workspace's summaries, in seconds."""
+
+    def __init__(self, workspace: Workspace, current: Path) -> None:
+        super().__init__()
+        self.workspace = workspace
+        self.current = current
+
+    def compose(self) -> ComposeResult:
+        option_list = KeyedOptionList(id="repositories-option-list", markup=False)
+        option_list.border_title = "Repositories"
+        yield option_list
+        yield Footer(show_command_palette=False)
+
+    def on_mount(self) -> None:
+        self.refresh_list()
+        option_list = self.query_one(KeyedOptionList)
+        option_list.highlighted = list(self.workspace.runners).index(self.current)
+        self.set_interval(self.REFRESH_INTERVAL, self.refresh_list)
+        # The summary of the open repository is likely cached, so this is cheap.
+        self.run_worker(self.workspace.refresh_summary(self.current))
+
+    def refresh_list(self) -> None:
+        summaries = self.workspace.summaries
+        self.query_one(KeyedOptionList).reconcile(
+            [(str(path), summaries[path]) for path in self.workspace.runners],
+            _make_prompt,
+        )
+
+    @on(OptionList.OptionSelected)
+    def switch_repository(self, event: OptionList.OptionSelected) -> None:
+        if event.option.id is not None:
+            self.dismiss(Path(event.option.id))
@@ -0,0 +1,384 @@
+from bisect import bisect_right
+from collections.abc import Iterable, Iterator, Sequence
+from itertools import accumulate
+import re
+import threading
+from typing import NamedTuple
+
+type Span = tuple[int, int]
+"""The start and end (exclusive) of a match within an entry's text."""
+
+
+class SearchMatch(NamedTuple):
+    key: str
+    spans: tuple[Span, ...]
+    """The parts of the entry's text which matched, in order."""
+
+
+class _Chunk(NamedTuple):
+    """A run of consecutive entries, searched as a single string.
+
+    It holds only strings and tuples of them, so the garbage collector stops
+    tracking it once it has seen it, and a large index adds nothing to the
+    collector's pauses.
+    """
+
+    text: str
+    """The lowercased text of each entry, each preceded by a newline."""
+    keys: tuple[str, ...]
+    starts: tuple[int, ...]
+    """Where each entry's text starts within `text`."""
+
+    def entry(self, position: int) -> tuple[int, int, int]:
+        """The index, start and end of the entry containing a position in `text`."""
+        starts = self.starts
+        index = bisect_right(starts, position) - 1
+        if index + 1 < len(starts):
+            return index, starts[index], starts[index + 1] - 1
+        return index, starts[index], len(self.text)
+
+
+class _Found(NamedTuple):
+    """An entry which matched a search."""
+
+    rank: int
+    position: tuple[int, int]
+    """The chunk the entry is in and its index in the chunk, to keep the order."""
+    key: str
+    text: str
+    spans: tuple[Span, ...]
+
+
+class _Search(NamedTuple):
+    """The last search, kept to narrow down the next as the query is typed."""
+
+    query: str
+    fuzzy: bool
+    found: list[_Found]
+    complete: bool
+    """Whether `found` holds every match, rather than stopping at the limit."""
+
+
+def _grams(text: str) -> set[str]:
+    """The 1, 2 and 3 character substrings of some text."""
+    positions = range(len(text))
+    # Slices running off the end give the last characters and pairs.
+    grams = {text[index : index + 3] for index in positions}
+    grams.update({text[index : index + 2] for index in positions})
+    grams.update(text)
+    return grams
+
+
+def _match(text: str, terms: list[str]) -> tuple[int, tuple[Span, ...]] | None:
+    """Rank an entry's text against the terms, if it contains all of them.
+
+    Texts starting with the first term rank 0, those where the first term
+    starts a word rank 1, and the rest rank 2.
+    """
+    spans: list[Span] = []
+    for term in terms:
+        if (offset := text.find(term)) == -1:
+            return None
+        spans.append((offset, offset + len(term)))
+    offset = spans[0][0]
+    if offset == 0:
+        rank = 0
+    elif not text[offset - 1].isalnum():
+        rank = 1
+    else:
+        rank = 2
+    spans.sort()
+    return rank, tuple(spans)
+
+
+def _fuzzy_pattern(characters: str) -> re.Pattern[str]:
+    # Each gap excludes the next character, so there's only one way to match
+    # from a given start, and no backtracking.
+    return re.compile(
+        re.escape(characters[0])
+        + "".join(
+            f"[^\n{re.escape(character)}]*{re.escape(character)}"
+            for character in characters[1:]
+        )
+    )
+
+
+def _fuzzy_spans(text: str, start: int, characters: str) -> tuple[Span, ...]:
+    """The position of each character matched fuzzily from `start`."""
+    spans: list[Span] = []
+    for character in characters:
+        start = text.index(character, start)
+        spans.append((start, start + 1))
+        start += 1
+    return tuple(spans)
+
+
+class SearchIndex:
+    """An n-gram index for filtering a list as the user types.
+
+    Each entry is a key and some text. Consecutive entries are grouped into
+    chunks, each searched as a single string (so the scanning happens in C),
+    and every 1, 2 and 3 character substring maps to a bitmask of the chunks
+    containing it, so only the chunks which could match a query are scanned.
+    Most queries match either lots of entries, when the search stops once it
+    has enough, or few, when the masks rule out most chunks. As a query is
+    typed, each search is narrowed down to the matches of the last one, once
+    there are few enough of them to be kept.
+
+    Chunks end after entries whose key hashes to a multiple of `CHUNK_SIZE`,
+    rather than at fixed positions, so adding or removing an entry only
+    changes the chunk it's in. When the entries are updated, only the chunks
+    whose contents changed are indexed again.
+
+    `update` and `extend` can be called from another thread. While one is in
+    progress, `search` returns `None` rather than waiting.
+    """
+
+    CHUNK_SIZE = 128
+    """The average number of entries in a chunk."""
+
+    MAX_CHUNK_SIZE = 4 * CHUNK_SIZE
+
+    MAX_RESULTS = 100
+    """The most matches returned by a search, plenty to fill a panel."""
+
+    def __init__(self) -> None:
+        self._chunks: dict[int, _Chunk] = {}
+        """The chunks, in order, keyed on their slot (their bit in the masks)."""
+        self._slots: dict[tuple[str, tuple[str, ...]], int] = {}
+        """The slot of each chunk, keyed on its text and keys."""
+        self._free: list[int] = []
+        """Slots of removed chunks, to be reused."""
+        self._next_slot = 0
+        self._postings: dict[str, int] = {}
+        """A mask of the chunks containing each n-gram."""
+        self._count = 0
+        self._last: _Search | None = None
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def update(self, entries: Sequence[tuple[str, str]]) -> None:
+        """Make the index hold exactly these entries (key and text), in this order.
+
+        Only chunks which are new, or whose entries changed, are (re)indexed.
+        """
+        with self.lock:
+            self._last = None
+            old_slots = self._slots
+            chunks: dict[int, _Chunk] = {}
+            slots: dict[tuple[str, tuple[str, ...]], int] = {}
+            for chunk in self._partition(entries):
+                identity = (chunk.text, chunk.keys)
+                if (slot := old_slots.pop(identity, None)) is not None:
+                    chunk = self._chunks[slot]
+                else:
+                    slot = self._index(chunk)
+                chunks[slot] = chunk
+                slots[identity] = slot
+            for slot in old_slots.values():
+                self._unindex(slot, self._chunks[slot])
+            self._chunks = chunks
+            self._slots = slots
+            self._count = len(entries)
+
+    def extend(self, entries: Iterable[tuple[str, str]]) -> None:
+        """Add entries to the end, e.g. as they stream in. Their keys must be new."""
+        with self.lock:
+            self._last = None
+            entries = list(entries)
+            self._count += len(entries)
+            if self._chunks:
+                # The last chunk may have been cut short by the end of the entries.
+                slot, last = self._chunks.popitem()
+                del self._slots[last.text, last.keys]
+                self._unindex(slot, last)
+                entries[:0] = zip(last.keys, last.text.split("\n")[1:])
+            for chunk in self._partition(entries):
+                slot = self._index(chunk)
+                self._chunks[slot] = chunk
+                self._slots[chunk.text, chunk.keys] = slot
+
+    def _partition(self, entries: Sequence[tuple[str, str]]) -> Iterator[_Chunk]:
+        keys = [key for key, _ in entries]
+        texts = [text for _, text in entries]
+        if sum(text.count("\n") for text in texts):
+            texts = [text.replace("\n", " ") for text in texts]
+        size = self.CHUNK_SIZE
+        ends = [index + 1 for index, key in enumerate(keys) if hash(key) % size == 0]
+        start = 0
+        for end in [*ends, len(keys)]:
+            while start < end:
+                stop = min(end, start + self.MAX_CHUNK_SIZE)
+                yield self._make_chunk(keys[start:stop], texts[start:stop])
+                start = stop
+
+    @staticmethod
+    def _make_chunk(keys: list[str], texts: list[str]) -> _Chunk:
+        # Lowercasing can change the length of some text, so it's done first.
+        text = ("\n" + "\n".join(texts)).lower()
+        lengths = map(len, text.split("\n")[1:-1])
+        starts = accumulate(
+            lengths, lambda start, length: start + length + 1, initial=1
+        )
+        return _Chunk(text, tuple(keys), tuple(starts))
+
+    def _index(self, chunk: _Chunk) -> int:
+        """Add a chunk's n-grams to the index, returning its slot."""
+        if self._free:
+            slot = self._free.pop()
+        else:
+            slot = self._next_slot
+            self._next_slot += 1
+        bit = 1 << slot
+        postings = self._postings
+        for gram in _grams(chunk.text):
+            postings[gram] = postings.get(gram, 0) | bit
+        return slot
+
+    def _unindex(self, slot: int, chunk: _Chunk) -> None:
+        mask = ~(1 << slot)
+        postings = self._postings
+        for gram in _grams(chunk.text):
+            if remaining := postings[gram] & mask:
+                postings[gram] = remaining
+            else:
+                del postings[gram]
+        self._free.append(slot)
+
+    def search(self, query: str) -> list[SearchMatch] | None:
+        """Find the entries matching a query, best first.
+
+        Each whitespace separated term of the query must appear in an entry,
+        ignoring case. Entries starting with the first term rank highest, then
+        those where it starts a word, then the rest, and otherwise entries
+        keep their order. If nothing matches, the terms are matched fuzzily
+        instead: their characters must appear in order, but not necessarily
+        next to each other.
+
+        Returns:
+            The matches (none for a blank query), or `None` if the index is
+            being updated.
+        """
+        if not self.lock.acquire(blocking=False):
+            return None
+        try:
+            query = query.lower()
+            if not (terms := query.split()):
+                return []
+            last = self._last
+            if last is not None and not (
+                last.complete and query.startswith(last.query)
+            ):
+                last = None
+
+            # Anything matching the query also matches what it was typed from.
+            # An exact match of the query is also a fuzzy match of the last.
+            search = None
+            if last is None:
+                search = self._search_exact(query, terms)
+            elif not last.fuzzy:
+                search = self._narrow_exact(query, terms, last.found)
+            if search is None or not search.found:
+                characters = "".join(terms)
+                if last is not None and last.fuzzy:
+                    search = self._narrow_fuzzy(query, characters, last.found)
+                else:
+                    search = self._search_fuzzy(query, characters)
+            self._last = search
+            found = sorted(search.found)[: self.MAX_RESULTS]
+            return [SearchMatch(found.key, found.spans) for found in found]
+        finally:
+            self.lock.release()
+
+    def _candidates(self, grams: Iterable[str]) -> Iterator[tuple[int, _Chunk]]:
+        """The chunks containing all of the given n-grams, numbered, in order."""
+        mask = -1
+        postings = self._postings
+        for gram in grams:
+            if not (mask := mask & postings.get(gram, 0)):
+                return
+        for number, (slot, chunk) in enumerate(self._chunks.items()):
+            if mask >> slot & 1:
+                yield number, chunk
+
+    def _search_exact(self, query: str, terms: list[str]) -> _Search:
+        found: dict[str, _Found] = {}
+        grams = set().union(*map(_grams, terms))
+        # Prefix matches are found directly, as each entry follows a newline.
+        prefix = "\n" + terms[0]
+        complete = self._collect(grams | _grams(prefix[:3]), prefix, terms, found)
+        if complete:
+            # Then the rest, found by the longest (and likely rarest) term.
+            longest = max(terms, key=len)
+            complete = self._collect(grams, longest, terms, found)
+        return _Search(query, False, list(found.values()), complete)
+
+    def _collect(
+        self, grams: set[str], needle: str, terms: list[str], found: dict[str, _Found]
+    ) -> bool:
+        """Add entries containing `needle` and every term to `found`, up to the limit.
+
+        Returns:
+            Whether every such entry was found, before reaching the limit.
+        """
+        limit = self.MAX_RESULTS
+        for number, chunk in self._candidates(grams):
+            text = chunk.text
+            starts = chunk.starts
+            last_index = len(starts) - 1
+            position = text.find(needle)
+            while position != -1:
+                # One past the position is in the same entry, even for "\n" + term.
+                index = bisect_right(starts, position + 1) - 1
+                end = starts[index + 1] - 1 if index < last_index else len(text)
+                entry = text[starts[index] : end]
+                position = text.find(needle, end)
+                if (key := chunk.keys[index]) not in found and (
+                    match := _match(entry, terms)
+                ) is not None:
+                    found[key] = _Found(match[0], (number, index), key, entry, match[1])
+                    if len(found) == limit:
+                        return False
+        return True
+
+    def _narrow_exact(
+        self, query: str, terms: list[str], last: list[_Found]
+    ) -> _Search:
+        found: list[_Found] = []
+        for entry in last:
+            if (match := _match(entry.text, terms)) is not None:
+                rank, spans = match
+                found.append(entry._replace(rank=rank, spans=spans))
+        return _Search(query, False, found, True)
+
+    def _search_fuzzy(self, query: str, characters: str) -> _Search:
+        pattern = _fuzzy_pattern(characters)
+        found: list[_Found] = []
+        keys: set[str] = set()
+        for number, chunk in self._candidates(set(characters)):
+            text = chunk.text
+            for match in pattern.finditer(text):
+                index, start, end = chunk.entry(match.start())
+                if (key := chunk.keys[index]) in keys:
+                    continue
+                keys.add(key)
+                entry = text[start:end]
+                spans = _fuzzy_spans(entry, match.start() - start, characters)
+                # The more tightly packed the characters, the better.
+                rank = match.end() - match.start()
+                found.append(_Found(rank, (number, index), key, entry, spans))
+                if len(found) == self.MAX_RESULTS:
+                    return _Search(query, True, found, False)
+        return _Search(query, True, found, True)
+
+    def _narrow_fuzzy(self, query: str, characters: str, last: list[_Found]) -> _Search:
+        pattern = _fuzzy_pattern(characters)
+        found: list[_Found] = []
+        for entry in last:
+            if (match := pattern.search(entry.text)) is not None:
+                spans = _fuzzy_spans(entry.text, match.start(), characters)
+                rank = match.end() - match.start()
+                found.append(entry._replace(rank=rank, spans=spans))
+        return _Search(query, True, found, True)
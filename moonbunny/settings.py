@@ -14,3 +14,35 @@ class Settings(BaseSettings):
     git_dir: str | None = None
     """Optional git directory path. If set, git commands will run in this directory.
     Set via MOONBUNNY_GIT_DIR environment variable."""
+
+    git_workers: int = 4
+    """How many git commands may run concurrently.
+    Set via MOONBUNNY_GIT_WORKERS environment variable."""
+
+    git_max_processes: int = 4
+    """Upper bound on the number of git processes in flight at any one time.
+    Set via MOONBUNNY_GIT_MAX_PROCESSES environment variable."""
+
+    watch_debounce_ms: int = 200
+    """Maximum time to group file system changes over before refreshing.
+    Set via MOONBUNNY_WATCH_DEBOUNCE_MS environment variable."""
+
+    git_persistent_processes: bool = True
+    """Serve object lookups from long-running git processes rather than spawning
+    git for each. Set via MOONBUNNY_GIT_PERSISTENT_PROCESSES environment variable."""
+
+    git_cache_max_bytes: int = 32 * 1024 * 1024
+    """Memory to use for caching the output of git commands. 0 disables the cache.
+    Set via MOONBUNNY_GIT_CACHE_MAX_BYTES environment variable."""
+
+    git_max_spawns_per_second: float = 50
+    """Upper bound on the rate git processes are started at, on average. 0 removes
+    the limit. Set via MOONBUNNY_GIT_MAX_SPAWNS_PER_SECOND environment variable."""
+
+    workspace: list[str] = []
+    """Repositories to open side by side, as paths or glob patterns. Set via
+    MOONBUNNY_WORKSPACE environment variable, as a JSON list."""
+
+    workspace_refresh_seconds: int = 60
+    """How often the summary of each repository in the workspace is refreshed.
+    Set via MOONBUNNY_WORKSPACE_REFRESH_SECONDS environment variable."""
@@ -0,0 +1,142 @@
+import asyncio
+from typing import Callable, Iterable, NamedTuple
+
+from moonbunny.git import (
+    GitRequestApplyToIndex,
+    GitRequestCommit,
+    GitRequestStage,
+    GitRequestUnstage,
+    GitTaskRunner,
+)
+from moonbunny.messages import GitCommand, GitCommandResult
+from moonbunny.watcher import ChangeKind
+
+
+class IndexWrite(NamedTuple):
+    """What a batch of writes to the index did."""
+
+    paths: frozenset[str]
+    """The files whose staged state the batch changed, or tried to."""
+    errors: list[str]
+    """Why any of the commands in the batch failed."""
+
+
+def _error(result: GitCommandResult) -> str:
+    output = result.stderr or result.stdout
+    return output.decode("utf-8", errors="replace").strip() or (
+        f"git {result.command.command_name} failed"
+    )
+
+
+class IndexWriter:
+    """Makes every change to the index, one change at a time.
+
+    Staging and unstaging are batched. Files staged or unstaged in quick
+    succession (or while an earlier batch is being written) are written by
+    one `git add` and one `git restore --staged`, rather than a process each.
+    If a file is both staged and unstaged within a batch, the last wins.
+
+    Only one command which writes the index runs at a time, so they never
+    contend for `index.lock` with each other. Commands which only read the
+    index never take the lock, as `GIT_OPTIONAL_LOCKS=0` is set for every
+    command, so refreshing when the watcher sees the index change can't get
+    in the way either. If something outside moonbunny holds the lock, the
+    write is retried a few times before giving up.
+    """
+
+    BATCH_DELAY = 0.05
+    """How long to wait for more files to be staged or unstaged before writing."""
+
+    LOCK_RETRIES = 5
+    """How many times a write is retried while another process holds the lock."""
+
+    LOCK_RETRY_DELAY = 0.1
+    """How long to wait before the first retry, in seconds. Doubled each time."""
+
+    def __init__(
+        self, git: GitTaskRunner, on_batch_written: Callable[[IndexWrite], None]
+    ) -> None:
+        """
+        Args:
+            git: Runs the commands.
+            on_batch_written: Called after each batch of staging and unstaging.
+        """
+        self.git = git
+        self.on_batch_written = on_batch_written
+        self._lock = asyncio.Lock()
+        """Held while a command which writes the index is running."""
+        self._staged: dict[str, bool] = {}
+        """Whether each file in the next batch should be staged or unstaged."""
+        self._batch: asyncio.Task[None] | None = None
+        """Writes the next batch, once it's been gathered."""
+
+    def set_staged(self, paths: Iterable[str], staged: bool) -> None:
+        """Stage or unstage the changes to files, as part of the next batch.
+
+        Args:
+            paths: The paths of the files, relative to the top of the working tree.
+            staged: Whether to stage the changes, rather than unstage them.
+        """
+        self._staged.update(dict.fromkeys(paths, staged))
+        if self._batch is None:
+            self._batch = asyncio.create_task(self._write_batch())
+
+    async def apply_patch(self, patch: str) -> list[str]:
+        """Stage the changes in a patch, e.g. a single hunk of a file's diff.
+
+        Returns:
+            Why the patch couldn't be applied, if it couldn't.
+        """
+        async with self._lock:
+            return await self._run_all([GitRequestApplyToIndex(patch)])
+
+    async def commit(self, message: str) -> list[str]:
+        """Commit whatever is staged, once any batch being written is done.
+
+        Returns:
+            Why the commit couldn't be made, if it couldn't.
+        """
+        async with self._lock:
+            return await self._run_all([GitRequestCommit(message)])
+
+    async def _write_batch(self) -> None:
+        await asyncio.sleep(self.BATCH_DELAY)
+        async with self._lock:
+            # Anything staged from here on goes in the next batch.
+            self._batch = None
+            staged, self._staged = self._staged, {}
+            commands: list[GitCommand] = []
+            if paths := [path for path, stage in staged.items() if stage]:
+                commands.append(GitRequestStage(paths))
+            if paths := [path for path, stage in staged.items() if not stage]:
+                commands.append(GitRequestUnstage(paths))
+            errors = await self._run_all(commands)
+        self.on_batch_written(IndexWrite(frozenset(staged), errors))
+
+    async def _run_all(self, commands: list[GitCommand]) -> list[str]:
+        """Run commands which write the index in turn, while holding `_lock`.
+
+        Returns:
+            Why any of the commands failed.
+        """
+        errors: list[str] = []
+        for command in commands:
+            result = await self._run(command)
+            if result.returncode != 0:
+                errors.append(_error(result))
+        return errors
+
+    async def _run(self, command: GitCommand) -> GitCommandResult:
+        """Run a command which writes the index, while holding `_lock`."""
+        result = await self.git.submit(command, post_result=False)
+        delay = self.LOCK_RETRY_DELAY
+        for _ in range(self.LOCK_RETRIES):
+            if result.returncode == 0 or b"index.lock" not in result.stderr:
+                break
+            await asyncio.sleep(delay)
+            delay *= 2
+            result = await self.git.submit(command, post_result=False)
+        if self.git.cache is not None:
+            # Don't wait for the watcher, or a stale status could be reused.
+            self.git.cache.invalidate([ChangeKind.INDEX])
+        return result
@@ -0,0 +1,158 @@
+from hashlib import sha1
+from pathlib import Path
+import sqlite3
+import threading
+from typing import Iterable
+
+from moonbunny.models import Branch, Commit
+from moonbunny.xdg import repository_data_directory
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS commits (
+    branch TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    hash TEXT NOT NULL,
+    author TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    PRIMARY KEY (branch, position)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS branches (
+    ref TEXT PRIMARY KEY,
+    committer_date INTEGER NOT NULL,
+    upstream TEXT,
+    position INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+class HistoryStore:
+    """An on-disk cache of the commits and branches of a repository.
+
+    Filling the sidebar from here on startup means it's populated before git
+    has answered. When git does answer, only the rows which differ are written.
+
+    Each repository gets its own SQLite database in the data directory. The
+    store is safe to use from multiple threads, so it can be kept off the UI
+    thread with `asyncio.to_thread`.
+    """
+
+    SCHEMA_VERSION = 2
+    """Bump this when the schema changes. Older databases are discarded."""
+
+    MAX_COMMITS = 1000
+    """The number of commits stored per branch."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection as connection:
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.execute("PRAGMA synchronous = NORMAL")
+            (version,) = connection.execute("PRAGMA user_version").fetchone()
+            if version != self.SCHEMA_VERSION:
+                connection.execute("DROP TABLE IF EXISTS commits")
+                connection.execute("DROP TABLE IF EXISTS branches")
+                connection.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+            connection.executescript(_SCHEMA)
+
+    @classmethod
+    def for_repository(cls, git_dir: Path) -> "HistoryStore":
+        """Open (possibly creating) the store for the repository at `git_dir`."""
+        digest = sha1(str(git_dir.resolve()).encode("utf-8")).hexdigest()
+        return cls(repository_data_directory() / f"{digest}.sqlite3")
+
+    def load_commits(self, branch: str) -> list[Commit]:
+        """Get the stored commits of a branch, newest first."""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT hash, author, subject FROM commits"
+                " WHERE branch = ? ORDER BY position",
+                (branch,),
+            ).fetchall()
+        return [Commit(*row) for row in rows]
+
+    def save_commits(self, branch: str, commits: Iterable[Commit]) -> int:
+        """Store the commits of a branch, newest first.
+
+        Returns:
+            The number of rows written. Only rows which changed are written.
+        """
+        commits = list(commits)[: self.MAX_COMMITS]
+        stored = self.load_commits(branch)
+        if stored == commits:
+            return 0
+
+        # History is usually only added to at the top or rewritten near the top,
+        # but the positions of everything below shift in either case. Rows are
+        # only kept if they are unchanged *and* in the same position.
+        first_difference = next(
+            (
+                index
+                for index, (old, new) in enumerate(zip(stored, commits))
+                if old != new
+            ),
+            min(len(stored), len(commits)),
+        )
+        changed = commits[first_difference:]
+        with self._lock, self._connection as connection:
+            connection.execute(
+                "DELETE FROM commits WHERE branch = ? AND position >= ?",
+                (branch, first_difference),
+            )
+            connection.executemany(
+                "INSERT INTO commits VALUES (?, ?, ?, ?, ?)",
+                (
+                    (branch, position, *commit)
+                    for position, commit in enumerate(changed, first_difference)
+                ),
+            )
+        return len(changed)
+
+    def load_branches(self) -> list[Branch]:
+        """Get the stored local branches, in the order they were listed.
+
+        How far each is ahead of and behind its upstream isn't stored, as it
+        changes whenever the upstream does.
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT ref, committer_date, upstream FROM branches ORDER BY position"
+            ).fetchall()
+        return [Branch(*row) for row in rows]
+
+    def save_branches(self, branches: Iterable[Branch]) -> int:
+        """Store the local branches, replacing those stored before.
+
+        Returns:
+            The number of rows written. Only rows which changed are written.
+        """
+        rows = {
+            branch.ref: ((branch.ref, branch.committer_date, branch.upstream), position)
+            for position, branch in enumerate(branches)
+        }
+        with self._lock, self._connection as connection:
+            stored = {
+                ref: ((ref, committer_date, upstream), position)
+                for ref, committer_date, upstream, position in connection.execute(
+                    "SELECT ref, committer_date, upstream, position FROM branches"
+                )
+            }
+            deleted = stored.keys() - rows.keys()
+            changed = [
+                (*row, position)
+                for ref, (row, position) in rows.items()
+                if stored.get(ref) != (row, position)
+            ]
+            connection.executemany(
+                "DELETE FROM branches WHERE ref = ?", ((ref,) for ref in deleted)
+            )
+            connection.executemany(
+                "INSERT OR REPLACE INTO branches VALUES (?, ?, ?, ?)", changed
+            )
+        return len(deleted) + len(changed)
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,174 @@
+from collections import deque
+from dataclasses import asdict, dataclass
+from datetime import datetime
+import json
+from pathlib import Path
+import time
+
+from moonbunny.messages import GitCommand
+
+STAGES = ("queue", "spawn", "run", "handle")
+"""The stages of a command's life, in order, as named in `CommandStats.stages`."""
+
+
+@dataclass
+class CommandTiming:
+    """Where the time went for a single run (or cache hit) of a git command.
+
+    Times are in milliseconds. `handle` is filled in by the app as it handles
+    the command's output and result, after the rest has been recorded.
+    """
+
+    command_type: str
+    """The name of the request class, e.g. `GitRequestFileStatus`."""
+    command: list[str]
+    priority: int
+    submitted_at: float
+    """When the command was first requested, as a Unix timestamp."""
+    queue: float = 0.0
+    """Time spent waiting for a worker, and then for a free process slot."""
+    spawn: float = 0.0
+    """Time taken to start the git process."""
+    run: float = 0.0
+    """Time from the process starting until it exited and its output was read."""
+    handle: float = 0.0
+    """Time the app spent parsing and displaying the output and result."""
+    stdout_bytes: int = 0
+    stderr_bytes: int = 0
+    returncode: int | None = None
+    cached: bool = False
+    """Whether the result came from the cache, in which case nothing was run."""
+    persistent: bool = False
+    """Whether the command was served by a long-running git process."""
+
+    @classmethod
+    def start(cls, command: GitCommand, submitted: float) -> "CommandTiming":
+        """Begin timing a command which was requested at `submitted`.
+
+        Args:
+            command: The command.
+            submitted: When it was first requested, from `time.perf_counter`.
+        """
+        return cls(
+            type(command).__name__,
+            command.command,
+            int(command.priority),
+            time.time() - (time.perf_counter() - submitted),
+        )
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self))
+
+
+class Histogram:
+    """Counts durations in buckets which grow roughly exponentially."""
+
+    BOUNDS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+    """The upper bound of each bucket in milliseconds. The last bucket is unbounded."""
+
+    def __init__(self) -> None:
+        self.buckets = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, milliseconds: float) -> None:
+        index = 0
+        while index < len(self.BOUNDS) and milliseconds > self.BOUNDS[index]:
+            index += 1
+        self.buckets[index] += 1
+        self.count += 1
+        self.total += milliseconds
+        self.max = max(self.max, milliseconds)
+
+    def percentile(self, percent: float) -> float:
+        """An upper estimate of the given percentile, from the bucket it falls in."""
+        if not self.count:
+            return 0.0
+        rank = percent / 100 * self.count
+        seen = 0
+        for bound, count in zip(self.BOUNDS, self.buckets):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+
+class CommandStats:
+    """Everything recorded about one type of command, aggregated."""
+
+    def __init__(self) -> None:
+        self.runs = 0
+        """How many times the command was run. Cache hits aren't included."""
+        self.cache_hits = 0
+        self.failures = 0
+        """Runs which exited with a non-zero status or couldn't be started."""
+        self.stdout_bytes = 0
+        self.stages = {stage: Histogram() for stage in STAGES}
+
+
+class GitTimings:
+    """Collects the timings of git commands, keeping the most recent as they are.
+
+    The timings of each type of command are aggregated into a histogram per
+    stage, so the slowest commands (and the slowest stage of them) stand out.
+    """
+
+    RECENT = 1000
+    """The number of individual timings kept, for display and export."""
+
+    def __init__(self) -> None:
+        self.stats: dict[str, CommandStats] = {}
+        self.recent: deque[CommandTiming] = deque(maxlen=self.RECENT)
+
+    def record(self, timing: CommandTiming) -> None:
+        """Record a command which has finished running, or was served from the cache."""
+        self.recent.append(timing)
+        stats = self.stats.setdefault(timing.command_type, CommandStats())
+        if timing.cached:
+            stats.cache_hits += 1
+            return
+        stats.runs += 1
+        if timing.returncode != 0:
+            stats.failures += 1
+        stats.stdout_bytes += timing.stdout_bytes
+        stats.stages["queue"].add(timing.queue)
+        stats.stages["spawn"].add(timing.spawn)
+        stats.stages["run"].add(timing.run)
+
+    def record_handling(
+        self, timing: CommandTiming, milliseconds: float, finished: bool
+    ) -> None:
+        """Add time the app spent handling a command's output or result.
+
+        Args:
+            timing: The command's timing.
+            milliseconds: How long the app spent.
+            finished: Whether the app is done with the command. Time spent on
+                streamed output is added up until then.
+        """
+        timing.handle += milliseconds
+        if finished:
+            self.stats[timing.command_type].stages["handle"].add(timing.handle)
+
+    def recent_count(self, seconds: float) -> dict[str, int]:
+        """How many of each type of command were requested in the last `seconds`."""
+        since = time.time() - seconds
+        counts: dict[str, int] = {}
+        for timing in self.recent:
+            if timing.submitted_at >= since:
+                counts[timing.command_type] = counts.get(timing.command_type, 0) + 1
+        return counts
+
+    def export(self, directory: Path) -> Path:
+        """Write the recent timings to a new file in `directory`, one JSON object per line.
+
+        Returns:
+            The path of the file.
+        """
+        directory.mkdir(exist_ok=True, parents=True)
+        path = directory / f"git-timings-{datetime.now():%Y%m%d-%H%M%S}.jsonl"
+        with path.open("w", encoding="utf-8") as file:
+            for timing in self.recent:
+                file.write(timing.to_json() + "\n")
+        return path
@@ -0,0 +1,93 @@
+from enum import Enum
+from pathlib import Path
+from typing import Any, Iterable, NamedTuple
+
+
+class ChangeKind(Enum):
+    """The kinds of file system change which affect what moonbunny displays."""
+
+    REFS = "refs"
+    """HEAD, a branch or a tag moved (e.g. checkout, commit, fetch)."""
+
+    INDEX = "index"
+    """The index was written (e.g. add, restore --staged)."""
+
+    WORKTREE = "worktree"
+    """A file in the working tree was edited, created or deleted."""
+
+
+class RepositoryPaths(NamedTuple):
+    """The locations on disk that make up a repository."""
+
+    worktree: Path
+    """The top level of the working tree."""
+
+    git_dir: Path
+    """The git directory (usually `<worktree>/.git`, but not for worktrees)."""
+
+    @classmethod
+    def from_rev_parse(cls, output: bytes) -> "RepositoryPaths":
+        """Parse the output of `git rev-parse --show-toplevel --absolute-git-dir`."""
+        worktree, git_dir = output.decode("utf-8").splitlines()[:2]
+        return cls(Path(worktree), Path(git_dir))
+
+    @property
+    def watch_paths(self) -> list[Path]:
+        """The directories which need to be watched to see every change."""
+        if self.git_dir.is_relative_to(self.worktree):
+            return [self.worktree]
+        return [self.worktree, self.git_dir]
+
+
+# Files inside the git directory we care about. Everything else in there
+# (objects, logs, lock files, hooks...) is noise as far as the UI is concerned.
+_GIT_DIR_REFS_FILES = {"HEAD", "packed-refs"}
+_GIT_DIR_INDEX_FILES = {"index"}
+
+
+def classify_path(path: str, paths: RepositoryPaths) -> ChangeKind | None:
+    """Work out what kind of change a modification to a path represents.
+
+    Returns:
+        The kind of change, or `None` if the path can be ignored.
+    """
+    if path.endswith(".lock"):
+        return None
+
+    file_path = Path(path)
+    if file_path.is_relative_to(paths.git_dir):
+        relative = file_path.relative_to(paths.git_dir).as_posix()
+        if relative in _GIT_DIR_REFS_FILES or relative.startswith("refs/"):
+            return ChangeKind.REFS
+        if relative in _GIT_DIR_INDEX_FILES:
+            return ChangeKind.INDEX
+        return None
+
+    if file_path.is_relative_to(paths.worktree):
+        return ChangeKind.WORKTREE
+    return None
+
+
+def classify_changes(
+    changed_paths: Iterable[str], paths: RepositoryPaths
+) -> dict[ChangeKind, set[str]]:
+    """Sort a batch of changed paths by the kind of change they represent."""
+    batch: dict[ChangeKind, set[str]] = {}
+    for path in changed_paths:
+        if (kind := classify_path(path, paths)) is not None:
+            batch.setdefault(kind, set()).add(path)
+    return batch
+
+
+class RepositoryWatchFilter:
+    """A `watchfiles` filter which drops changes that can't affect the UI.
+
+    Cheap, path-based filtering only. Changes in the working tree which are
+    ignored by `.gitignore` are filtered out later, in batches, by git itself.
+    """
+
+    def __init__(self, paths: RepositoryPaths) -> None:
+        self.paths = paths
+
+    def __call__(self, change: Any, path: str) -> bool:
+        return classify_path(path, self.paths) is not None
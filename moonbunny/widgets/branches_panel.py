@@ -1,48 +1,186 @@
-from textual import getters
+import time
+from typing import Any, NamedTuple
+
+from textual import getters, on
 from textual.app import ComposeResult
-from textual.containers import Vertical
 from textual.content import Content
 from textual.widgets import OptionList
-from textual.widgets.option_list import Option
+
+from moonbunny.git import GitRequestRefs, format_relative_time
+from moonbunny.models import Branch, RefKind
+from moonbunny.widgets.filterable_panel import FilterablePanel
+from moonbunny.widgets.keyed_option_list import KeyedOptionList
+
+
+class _BranchItem(NamedTuple):
+    """A ref, and how long ago it was committed to as it's shown."""
+
+    branch: Branch
+    age: str
+    """The ref's age when listed, so the option is remade once that changes."""
+
+
+class _Section(NamedTuple):
+    """The heading of a section of refs which is only loaded when expanded."""
+
+    kind: RefKind
+    expanded: bool
+    total: int | None
+    """The number of refs in the section, or `None` if they haven't been loaded."""
+
+    @property
+    def title(self) -> str:
+        return _SECTION_TITLES[self.kind]
+
+
+_SECTION_TITLES = {RefKind.REMOTE: "remote branches", RefKind.TAG: "tags"}
+"""The sections below the local branches, in order."""
+
+_SECTION_ID_PREFIX = "section:"
+"""Starts the option ID of a section heading. Ref option IDs start with `refs/`."""
+
+
+def _make_branch_prompt(item: _BranchItem) -> Content:
+    branch = item.branch
+    parts: list[Content | str | tuple[str, str]] = [
+        (f"{item.age:>3}", "$text-accent on $accent-muted 30%"),
+        " ",
+        branch.name,
+    ]
+    if branch.ahead or branch.behind:
+        parts.append((f" ↑{branch.ahead} ↓{branch.behind}", "$text-secondary"))
+    return Content.assemble(*parts)
+
+
+def _make_prompt(item: _BranchItem | _Section) -> Content:
+    if isinstance(item, _BranchItem):
+        return _make_branch_prompt(item)
+    # The title ends the prompt, so matches in it can be highlighted.
+    total = "…" if item.total is None else str(item.total)
+    return Content.assemble(
+        ("▾ " if item.expanded else "▸ ", "$text-primary"),
+        (f"{total} " if item.expanded or item.total is not None else "", "$text-muted"),
+        (item.title, "$text-primary bold"),
+    )
 
 
-class BranchesPanel(Vertical):
-    option_list = getters.child_by_id("branches-panel-option-list", OptionList)
+def _search_text(item: _BranchItem | _Section) -> str:
+    return item.branch.name if isinstance(item, _BranchItem) else item.title
+
+
+class BranchesPanel(FilterablePanel[_BranchItem | _Section]):
+    """A panel listing the local branches, then remote branches and tags.
+
+    Refs are listed most recently committed to first. Local branches are
+    loaded straight away, a page first and then the rest, while remote
+    branches and tags are only loaded once their section is expanded.
+    """
+
+    AGE_REFRESH_INTERVAL = 60.0
+    """How often the ages of refs are updated, in seconds."""
+
+    option_list = getters.child_by_id("branches-panel-option-list", KeyedOptionList)
+
+    make_prompt = staticmethod(_make_prompt)
+    search_text = staticmethod(_search_text)
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._refs: dict[RefKind, list[Branch]] = {}
+        """The refs of each kind received so far, most recently committed to first."""
+        self._expanded: set[RefKind] = set()
 
     def compose(self) -> ComposeResult:
         self.add_class("panel")
         self.border_title = "[u]B[/u]ranches"
-        yield OptionList(id="branches-panel-option-list", markup=False, compact=True)
-
-    def set_branches(self, branches: list[str]) -> None:
-        option_list = self.option_list
-        option_list.clear_options()
-
-        options: list[Option] = []
-        for branch_entry in branches:
-            # Check if the branch entry has the time format "Xm branch-name" or "Xh branch-name" etc.
-            parts = branch_entry.split(" ", 1)
-            if (
-                len(parts) == 2
-                and any(
-                    parts[0].endswith(suffix)
-                    for suffix in ["m", "h", "d", "w", "mo", "y"]
-                )
-                or parts[0] == "now"
-            ):
-                # Extract just the branch name for the ID
-                branch_name = parts[1]
-                # Display the full format with time
-                display_text = Content.assemble(
-                    (f"{parts[0]:>3}", "$text-accent on $accent-muted 30%"),
-                    " ",
-                    branch_name,
+        yield from super().compose()
+        yield KeyedOptionList(
+            id="branches-panel-option-list", markup=False, compact=True
+        )
+
+    def on_mount(self) -> None:
+        self.set_interval(self.AGE_REFRESH_INTERVAL, self._show_refs)
+
+    @property
+    def loaded_kinds(self) -> list[RefKind]:
+        """The kinds of ref which have been requested, so are kept up to date."""
+        return [
+            RefKind.BRANCH,
+            *(kind for kind in _SECTION_TITLES if kind in self._expanded),
+        ]
+
+    def set_refs(self, kind: RefKind, refs: list[Branch], complete: bool) -> None:
+        """Show the refs of a kind, most recently committed to first.
+
+        Args:
+            kind: The kind of the refs.
+            refs: The refs, or the first page of them.
+            complete: Whether every ref of the kind is listed. If not, refs from
+                further down an earlier listing stay shown until every ref has
+                been received.
+        """
+        if kind == RefKind.REMOTE:
+            # A remote's default branch is listed under its own name too.
+            refs = [ref for ref in refs if not ref.ref.endswith("/HEAD")]
+        previous = {ref.ref: ref for ref in self._refs.get(kind, ())}
+        if complete:
+            # Ahead and behind are only worked out for the first page, so are
+            # kept from it for branches which haven't changed since.
+            refs = [
+                previous[ref.ref]
+                if ref.ahead is None
+                and (old := previous.get(ref.ref)) is not None
+                and old._replace(ahead=None, behind=None) == ref
+                else ref
+                for ref in refs
+            ]
+        else:
+            listed = {ref.ref for ref in refs}
+            refs = refs + [
+                ref
+                for ref in self._refs.get(kind, ())[len(refs) :]
+                if ref.ref not in listed
+            ]
+        self._refs[kind] = refs
+        self._show_refs()
+
+    def restore_branches(self, branches: list[Branch]) -> None:
+        """Show branches saved from an earlier session, unless git has answered."""
+        if RefKind.BRANCH not in self._refs:
+            self.set_refs(RefKind.BRANCH, branches, complete=False)
+
+    def _show_refs(self) -> None:
+        now = time.time()
+
+        def branch_items(refs: list[Branch]) -> list[tuple[str, _BranchItem]]:
+            return [
+                (
+                    ref.ref,
+                    _BranchItem(ref, format_relative_time(ref.committer_date, now)),
                 )
-            else:
-                # Fallback: use the entire entry as both display and ID
-                branch_name = branch_entry
-                display_text = branch_entry
+                for ref in refs
+            ]
 
-            options.append(Option(display_text, id=branch_name))
+        items: list[tuple[str, _BranchItem | _Section]] = []
+        items.extend(branch_items(self._refs.get(RefKind.BRANCH, [])))
+        for kind in _SECTION_TITLES:
+            refs = self._refs.get(kind)
+            expanded = kind in self._expanded
+            section = _Section(kind, expanded, None if refs is None else len(refs))
+            items.append((f"{_SECTION_ID_PREFIX}{kind.value}", section))
+            if expanded and refs is not None:
+                items.extend(branch_items(refs))
+        self.set_items(items)
 
-        option_list.add_options(options)
+    @on(OptionList.OptionSelected)
+    def _toggle_section(self, event: OptionList.OptionSelected) -> None:
+        option_id = event.option.id
+        if option_id is None or not option_id.startswith(_SECTION_ID_PREFIX):
+            return
+        event.stop()
+        kind = RefKind(option_id.removeprefix(_SECTION_ID_PREFIX))
+        self._expanded ^= {kind}
+        if kind in self._expanded:
+            # Refs which aren't shown aren't kept up to date.
+            self.post_message(GitRequestRefs(kind))
+        self._show_refs()
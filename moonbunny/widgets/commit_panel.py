@@ -0,0 +1,217 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, NamedTuple
+
+from textual.binding import Binding
+from textual.message import Message
+from textual.reactive import reactive
+
+from moonbunny.diff import FileDiff, parse_diff
+from moonbunny.widgets.diff_panel import DiffPanel
+
+
+class CommitDetails(NamedTuple):
+    """A commit, as shown by `git show`, split into a section per file."""
+
+    oid: str
+    files: list[FileDiff]
+    """The commit's metadata, message and stat, then the patch of each file."""
+    size: int
+    """The length of the output of `git show` in `files`, in characters."""
+    complete: bool
+    """Whether `files` holds all of the output, rather than stopping short
+    after `CommitPanel.MAX_SHOWN_SIZE` characters."""
+    hidden: int
+    """The number of files left out of `files` if it's incomplete."""
+
+
+class CommitPanel(DiffPanel):
+    """A panel for displaying a commit: its metadata, message, stat and patch.
+
+    The output of `git show` is shown as it streams in. Only the first
+    `MAX_SHOWN_SIZE` characters of it are shown (or even kept) until the rest
+    is asked for, so an enormous commit doesn't bog everything down.
+
+    Commits never change, so once parsed they're cached by their full oid, and
+    showing one again costs nothing.
+    """
+
+    BINDINGS = [Binding("e", "expand", "show all")]
+
+    @dataclass
+    class ExpandRequested(Message):
+        """Sent when every file of a commit is wanted, but not all were kept."""
+
+        commit_id: str
+        """The revision of the commit, as it was requested."""
+
+    MAX_SHOWN_SIZE = 1024 * 1024
+    """Files after this many characters of output are hidden until expanded."""
+
+    MAX_CACHED_SIZE = 16 * 1024 * 1024
+    """How many characters of output to keep cached, across every commit."""
+
+    notice: reactive[str] = reactive("")
+    """What's going on with the commit, e.g. that some files are hidden."""
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.commit_id: str | None = None
+        """The revision of the commit being shown, as it was requested."""
+        self._commits: OrderedDict[str, CommitDetails] = OrderedDict()
+        """Parsed commits, least recently shown first."""
+        self._cached_size = 0
+        self._details: CommitDetails | None = None
+        self._chunks: list[str] = []
+        """The output received so far, while the commit streams in, up to
+        `MAX_SHOWN_SIZE` unless expanded."""
+        self._streamed_size = 0
+        self._truncated = False
+        """Whether output has been dropped after `MAX_SHOWN_SIZE` characters."""
+        self._hidden = 0
+        """The number of files in the output which was dropped."""
+        self._expanded = False
+
+    def show_cached(self, commit_id: str, oid: str) -> bool:
+        """Show a commit straight away if it's cached, returning whether it was."""
+        if (details := self._commits.get(oid)) is None:
+            return False
+        self._commits.move_to_end(oid)
+        self._reset(commit_id)
+        self._show_details(details)
+        return True
+
+    def begin_commit(self, commit_id: str, expanded: bool = False) -> None:
+        """Start showing a commit which will be streamed in.
+
+        Args:
+            commit_id: The revision of the commit.
+            expanded: Whether to show (and keep) every file, however large.
+        """
+        self._reset(commit_id)
+        self._expanded = expanded
+        self.notice = "loading…"
+        self.begin_diff()
+
+    def append_commit(self, commit_id: str, text: str, first_chunk: bool) -> None:
+        """Add the next chunk of the output of `git show`."""
+        if commit_id != self.commit_id or self._details is not None:
+            return
+        if first_chunk:
+            self._chunks = []
+            self._streamed_size = 0
+            self._truncated = False
+            self._hidden = 0
+            self.begin_diff()
+        dropped = ""
+        if not self._expanded:
+            room = self.MAX_SHOWN_SIZE - self._streamed_size
+            if len(text) > room:
+                # Keep whole lines, up to the end of the one the limit falls in.
+                cut = (text.find("\n", room - 1) + 1 or len(text)) if room > 0 else 0
+                text, dropped = text[:cut], text[cut:]
+        if text:
+            self._chunks.append(text)
+            self._streamed_size += len(text)
+            self.append_diff(text)
+        if dropped:
+            # Chunks end on line boundaries, so only count the files in them.
+            self._truncated = True
+            self._hidden += dropped.count("\ndiff --git ")
+            self._hidden += dropped.startswith("diff --git ")
+
+    def end_commit(self, commit_id: str, error: str | None = None) -> None:
+        """Finish the commit which was being streamed in.
+
+        Args:
+            commit_id: The revision of the commit.
+            error: What git had to say if it failed.
+        """
+        if commit_id != self.commit_id or self._details is not None:
+            return
+        text = "".join(self._chunks)
+        self._chunks = []
+        if error is not None:
+            self.set_files([])
+            self.notice = error
+            return
+
+        # The output starts "commit <oid>".
+        first_line, _, _ = text.partition("\n")
+        oid = first_line.removeprefix("commit ").split(" ", 1)[0] or commit_id
+        files = parse_diff(text)
+        hidden = self._hidden
+        if self._truncated and files and files[-1].path:
+            # The last file kept may have been cut short.
+            hidden += 1
+            text_size = len(text) - len(files.pop().text)
+        else:
+            text_size = len(text)
+        details = CommitDetails(oid, files, text_size, not self._truncated, hidden)
+        self._cache(details)
+        self._show_details(details)
+
+    def _cache(self, details: CommitDetails) -> None:
+        """Cache a commit, unless it'd take up too much of the cache."""
+        commits = self._commits
+        if details.size > self.MAX_CACHED_SIZE // 4:
+            return
+        if (previous := commits.pop(details.oid, None)) is not None:
+            self._cached_size -= previous.size
+        commits[details.oid] = details
+        self._cached_size += details.size
+        while self._cached_size > self.MAX_CACHED_SIZE:
+            _oid, evicted = commits.popitem(last=False)
+            self._cached_size -= evicted.size
+
+    def check_action(self, action: str, parameters: tuple[object, ...]) -> bool | None:
+        if action == "stage_hunk":
+            # The hunks are from a commit, not the working tree.
+            return False
+        return True
+
+    def action_expand(self) -> None:
+        """Show every file of the commit, however large."""
+        details = self._details
+        if details is None or self._expanded or self.commit_id is None:
+            return
+        if not details.complete:
+            # The rest wasn't kept, so the commit has to be loaded again.
+            self.post_message(self.ExpandRequested(self.commit_id))
+            return
+        self._expanded = True
+        self._show_details(details)
+
+    def _reset(self, commit_id: str) -> None:
+        self.commit_id = commit_id
+        self._details = None
+        self._chunks = []
+        self._streamed_size = 0
+        self._truncated = False
+        self._hidden = 0
+        self._expanded = False
+        self.scroll_to(0, 0, animate=False)
+
+    def _show_details(self, details: CommitDetails) -> None:
+        self._details = details
+        files = details.files
+        if not self._expanded and details.size > self.MAX_SHOWN_SIZE:
+            shown: list[FileDiff] = []
+            size = 0
+            for file_diff in files:
+                size += len(file_diff.text)
+                # The commit message (with an empty path) is always shown.
+                if size > self.MAX_SHOWN_SIZE and file_diff.path:
+                    break
+                shown.append(file_diff)
+            files = shown
+
+        self.set_files(files)
+        hidden = len(details.files) - len(files) + details.hidden
+        if hidden:
+            files_hidden = f"{hidden} more file{'s' if hidden > 1 else ''}"
+            self.notice = f"{files_hidden} not shown (e to show all)"
+        elif not details.complete:
+            self.notice = "cut short (e to show all)"
+        else:
+            self.notice = ""
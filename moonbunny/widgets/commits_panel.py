@@ -1,9 +1,15 @@
-from textual import getters
+from typing import Any
+
+from textual import getters, on
 from textual.app import ComposeResult
-from textual.containers import Vertical
 from textual.content import Content
 from textual.widgets import OptionList
-from textual.widgets.option_list import Option
+from textual.widgets.option_list import OptionDoesNotExist
+
+from moonbunny.git import GitRequestCommits
+from moonbunny.models import Commit
+from moonbunny.widgets.filterable_panel import FilterablePanel
+from moonbunny.widgets.keyed_option_list import KeyedOptionList
 
 
 def _get_initials(author_name: str) -> str:
@@ -29,64 +35,217 @@ def _get_author_colour(author_name: str) -> str:
     return colours[author_hash]
 
 
-class CommitsPanel(Vertical):
-    """A panel for displaying commits."""
+def _make_prompt(commit: Commit) -> Content:
+    return Content.assemble(
+        (f"{_get_initials(commit.author):>2}", _get_author_colour(commit.author)),
+        " ",
+        commit.subject,
+    )
+
+
+def _search_text(commit: Commit) -> str:
+    # The hash and author aren't shown in full, but commits can be found by them.
+    return f"{commit.hash} {commit.author} {commit.subject}"
+
+
+def _make_items(commits: list[Commit]) -> list[tuple[str, Commit]]:
+    return [(commit.hash, commit) for commit in commits]
+
+
+class CommitsPanel(FilterablePanel[Commit]):
+    """A panel for displaying commits.
+
+    History is loaded a page at a time, with the next page requested as the
+    user scrolls or moves the highlight close to the end of the list. Only
+    the commits loaded so far are searched when filtering, and no more are
+    loaded while the list is filtered.
+    """
 
-    option_list = getters.child_by_id("commits-panel-option-list", OptionList)
+    LOAD_MORE_THRESHOLD = 50
+    """Load the next page when within this many commits of the end of the list."""
+
+    option_list = getters.child_by_id("commits-panel-option-list", KeyedOptionList)
+
+    make_prompt = staticmethod(_make_prompt)
+    search_text = staticmethod(_search_text)
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._branch_name = "HEAD"
+        self._pages: dict[int, list[Commit]] = {}
+        """The commits received so far for each page, keyed on the page's skip."""
+        self._previous_pages: dict[int, list[Commit]] = {}
+        """The pages from before the first page was last reloaded."""
+        self._previous_highlighted_id: str | None = None
+        self._shown: list[Commit] = []
+        """The commits currently in the list, which may be from an earlier load."""
+        self._loading: int | None = None
+        """The skip of the page currently being loaded, if any."""
+        self._end_of_history = False
 
     def compose(self) -> ComposeResult:
         self.add_class("panel")
         self.border_title = "[u]C[/u]ommits"
-        yield OptionList(id="commits-panel-option-list", markup=False, compact=True)
+        yield from super().compose()
+        yield KeyedOptionList(
+            id="commits-panel-option-list", markup=False, compact=True
+        )
+
+    def on_mount(self) -> None:
+        self.watch(self.option_list, "scroll_y", self._load_more_if_needed, init=False)
+
+    def set_commits(self, commits: list[Commit]) -> None:
+        """Set the commits to display.
+
+        Only commits which changed are updated, and the highlighted commit stays
+        highlighted if it's still present.
+        """
+        self.set_items(_make_items(commits))
+        self._shown = list(commits)
+
+    def append_commits(self, commits: list[Commit]) -> None:
+        """Add commits to the end of the list, e.g. as they stream in."""
+        self.extend_items(_make_items(commits))
+        self._shown.extend(commits)
+
+    @property
+    def commits(self) -> list[Commit]:
+        """The commits loaded from git so far, newest first."""
+        return [commit for _, page in sorted(self._pages.items()) for commit in page]
+
+    def restore_commits(self, branch_name: str, commits: list[Commit]) -> None:
+        """Show commits saved from an earlier session, until git has been asked.
 
-    def set_commits(self, commits: list[str]) -> None:
-        """Set the commits to display."""
+        Ignored if commits have already been received from git. When they are,
+        the list is only updated where it differs from the restored commits.
+        """
+        if self._pages or not commits:
+            return
+        self._branch_name = branch_name
+        page_size = GitRequestCommits.PAGE_SIZE
+        self._previous_pages = {
+            skip: commits[skip : skip + page_size]
+            for skip in range(0, len(commits), page_size)
+        }
+        self.set_commits(commits)
 
-        # Check the currently highlighted option ID, so that if it's still present after
-        # the list is updated, we can re-highlight it.
+    def _show(self, position: int, commits: list[Commit]) -> None:
+        """Show commits at a position in the list, if they aren't there already."""
+        shown = self._shown
+        if shown[position : position + len(commits)] == commits:
+            return
+        # If history changes between loading one page and the next (e.g. a
+        # commit is made), the next can overlap the commits already shown.
+        if position >= len(shown):
+            was_empty = not shown
+            items = self._items
+            self.append_commits(
+                [commit for commit in commits if commit.hash not in items]
+            )
+            if was_empty:
+                # Options added to an empty list aren't highlighted.
+                self._highlight(self._previous_highlighted_id)
+        else:
+            self.set_commits(list(dict.fromkeys(shown[:position] + commits)))
+
+    def add_page_chunk(
+        self, branch_name: str, skip: int, commits: list[Commit], first_chunk: bool
+    ) -> None:
+        """Add commits from a page of history as they stream in.
+
+        Args:
+            branch_name: The branch the history is of.
+            skip: The number of commits before the page.
+            commits: The commits in this chunk of the page.
+            first_chunk: Whether this is the start of the page.
+        """
+        if skip == 0 and first_chunk:
+            # The first page is only (re)loaded when history may have changed.
+            # Later pages are kept in case it hasn't, and stay shown until the
+            # first page arrives and differs from what's shown.
+            self._branch_name = branch_name
+            self._previous_pages = self._pages or self._previous_pages
+            self._previous_highlighted_id = self._highlighted_id()
+            self._pages = {0: commits}
+            self._loading = 0
+            self._end_of_history = False
+            self._show(0, commits)
+        elif skip == self._loading and branch_name == self._branch_name:
+            page = self._pages.setdefault(skip, [])
+            position = skip + len(page)
+            page.extend(commits)
+            self._show(position, commits)
+
+    def page_loaded(self, branch_name: str, skip: int, count: int) -> None:
+        """Called when a page of history has been received in full."""
+        if skip != self._loading or branch_name != self._branch_name:
+            return
+
+        self._loading = None
+        page = self._pages.setdefault(skip, [])
+        self._end_of_history = len(page) < count
+
+        previous_pages = self._previous_pages
+        self._previous_pages = {}
+        if skip == 0 and previous_pages.get(0) == page:
+            # History hasn't changed, so the pages which were loaded before are
+            # still valid - show them again rather than fetching them again.
+            next_skip = len(page)
+            while (cached_page := previous_pages.get(next_skip)) is not None:
+                self._pages[next_skip] = cached_page
+                self._show(next_skip, cached_page)
+                next_skip += len(cached_page)
+                self._end_of_history = len(cached_page) < count
+                if not cached_page:
+                    break
+            self._highlight(self._previous_highlighted_id)
+
+        loaded = sum(len(page) for page in self._pages.values())
+        if len(self._shown) > loaded:
+            # Commits from an earlier load are shown past the end of what has
+            # been loaded now, but history has changed so they're stale.
+            self.set_commits(self._shown[:loaded])
+
+        self._load_more_if_needed()
+
+    @on(OptionList.OptionHighlighted)
+    def _on_commit_highlighted(self) -> None:
+        self._load_more_if_needed()
+
+    def _load_more_if_needed(self, *_: Any) -> None:
+        """Request the next page of history, if the end of the list is close."""
+        if (
+            self._loading is not None
+            or self._end_of_history
+            or not self._pages
+            or self.filtering
+        ):
+            return
+
+        option_list = self.option_list
+        last_visible = (
+            option_list.scroll_y + option_list.scrollable_content_region.height
+        )
+        nearest = max(last_visible, option_list.highlighted or 0)
+        if nearest < option_list.option_count - self.LOAD_MORE_THRESHOLD:
+            return
+
+        skip = sum(len(page) for page in self._pages.values())
+        self._loading = skip
+        self.post_message(GitRequestCommits(self._branch_name, skip=skip))
+
+    def _highlighted_id(self) -> str | None:
         option_list = self.option_list
-        highlighted_index = option_list.highlighted or 0
         if option_list.option_count == 0:
-            previous_highlighted_option_id = None
-        else:
-            previous_highlighted_option_id = option_list.options[highlighted_index].id
-
-        # Clear the list and add the new commits.
-        option_list.clear_options()
-
-        options: list[Option] = []
-        for commit in commits:
-            if commit.strip():  # Skip empty lines
-                # Parse commit format: "abc1234|Author Name|Commit message"
-                parts = commit.split("|")
-                if len(parts) >= 3:
-                    commit_hash, author_name, message = parts
-                    initials = _get_initials(author_name)
-                    author_colour = _get_author_colour(author_name)
-                    # Use styled content with hash, initials, and message
-                    options.append(
-                        Option(
-                            Content.assemble(
-                                (
-                                    f"{initials:>2}",
-                                    f"{author_colour}",
-                                ),
-                                " ",
-                                message,
-                            ),
-                            id=commit_hash,
-                        )
-                    )
-                else:
-                    # Fallback for malformed commits
-                    options.append(Option(commit, id=commit))
-
-        option_list.add_options(options)
-
-        # Re-highlight the previously highlighted option, if it's still present.
-        for index, option in enumerate(option_list.options):
-            if option.id == previous_highlighted_option_id:
-                option_list.highlighted = index
-                break
-        else:
-            option_list.highlighted = 0
+            return None
+        return option_list.options[option_list.highlighted or 0].id
+
+    def _highlight(self, option_id: str | None) -> None:
+        """Re-highlight the given option, if it's still present."""
+        option_list = self.option_list
+        try:
+            index = option_list.get_option_index(option_id) if option_id else 0
+        except OptionDoesNotExist:
+            index = 0
+        if index != option_list.highlighted:
+            option_list.highlighted = index
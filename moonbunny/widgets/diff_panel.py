@@ -1,29 +1,251 @@
+from dataclasses import dataclass
 from typing import Any
+
+from rich.segment import Segment
+from textual.binding import Binding
+from textual.cache import LRUCache
 from textual.content import Content
-from textual.widgets import Static
+from textual.geometry import Region, Size
+from textual.message import Message
+from textual.scroll_view import ScrollView
+from textual.strip import Strip
+from textual.visual import Visual
+
+from moonbunny.diff import DiffDocument, DiffStreamParser, FileDiff, parse_diff
+from moonbunny.highlight import DiffHighlighter, HunkHighlights, to_content
+
+
+def _line_style(line: str) -> str:
+    if line.startswith("+"):
+        return "$text-success on $success-muted"
+    elif line.startswith("-"):
+        return "$text-error on $error-muted"
+    elif line.startswith("@@"):
+        return "i $text-accent"
+    return "$foreground"
 
 
 # TODO: Stick file name to top as you scroll through the diff
-# TODO: Record y-offsets in the diff so we can jump to them when file
-#   is selected in files panel.
-class DiffPanel(Static):
-    """A panel for displaying diffs."""
+class DiffPanel(ScrollView):
+    """A panel for displaying diffs.
+
+    The diff is stored as a line buffer, and only the lines in view (plus a few
+    either side, to keep scrolling smooth) are ever styled and rendered. Memory
+    and frame time stay roughly constant no matter how large the diff is.
+
+    Hunks in view are highlighted in the background: their syntax, and the
+    words which changed within a line. Until a hunk's highlighting is ready,
+    its lines are coloured by their `+`/`-` prefix only.
+
+    The hunk at the top of the panel can be staged on its own. Moving to the
+    next or previous hunk brings it to the top.
+    """
+
+    BINDINGS = [
+        Binding("s", "stage_hunk", "stage hunk"),
+        Binding("right_square_bracket", "next_hunk", "next hunk"),
+        Binding("left_square_bracket", "previous_hunk", "previous hunk"),
+    ]
+
+    @dataclass
+    class HunkStagingRequested(Message):
+        """Sent when the user stages a hunk."""
+
+        path: str
+        """The path of the file, relative to the top of the working tree."""
+        patch: str
+        """The file's header and the hunk, for `git apply --cached`."""
+
+    OVERSCAN = 40
+    """Lines either side of the visible window to render ahead of time."""
+
+    MAX_HIGHLIGHT_LINES = 5000
+    """Hunks longer than this aren't highlighted."""
 
     def __init__(self, *args: Any, **kwargs: Any) -> None:
-        super().__init__(*args, **kwargs, markup=False)
+        super().__init__(*args, **kwargs)
+        self.document = DiffDocument()
+        self._stream: DiffStreamParser | None = None
+        self._strip_cache: LRUCache[tuple[tuple[str, str], int, bool], Strip]
+        self._strip_cache = LRUCache(2048)
+        """Rendered lines, keyed on the file's key, the line within its section, and
+        whether it was highlighted.
+
+        Keying on the section rather than the line number means lines don't need
+        re-rendering when a change to an earlier file moves them up or down.
+        """
+        self.highlighter = DiffHighlighter(on_ready=self.refresh)
+        self._hunk_highlights: LRUCache[tuple[tuple[str, str], int], HunkHighlights]
+        self._hunk_highlights = LRUCache(1024)
+        """The highlights of hunks, keyed on the file's key and the hunk's start."""
 
     def set_diff(self, diff: str) -> None:
-        diff_lines = diff.splitlines(keepends=True)
-        coloured_diff: list[tuple[str, str]] = []
-        for line in diff_lines:
-            if line.startswith("+"):
-                coloured_diff.append((line, "$text-success on $success-muted"))
-            elif line.startswith("-"):
-                coloured_diff.append((line, "$text-error on $error-muted"))
-            elif line.startswith("@@"):
-                coloured_diff.append((line, "i $text-accent"))
+        """Replace the whole diff."""
+        self.document.set_files(parse_diff(diff))
+        self._document_updated()
+
+    def set_files(self, file_diffs: list[FileDiff]) -> None:
+        """Replace the whole diff with one which has already been parsed."""
+        self._stream = None
+        self.document.set_files(file_diffs)
+        self._document_updated()
+
+    def begin_diff(self) -> None:
+        """Start replacing the whole diff with one which will be streamed in."""
+        self._stream = DiffStreamParser()
+
+    def append_diff(self, diff: str) -> None:
+        """Add the next chunk of a streamed diff. It must end on a line boundary."""
+        if self._stream is None:
+            self.begin_diff()
+        assert self._stream is not None
+        self._stream.feed(diff)
+        self.document.set_stream(self._stream)
+        self._document_updated()
+
+    def end_diff(self) -> None:
+        """Finish the diff which was being streamed in."""
+        if self._stream is not None:
+            self.document.set_files(self._stream.close())
+            self._stream = None
+            self._document_updated()
+
+    def set_file_diff(self, path: str, diff: str) -> None:
+        """Replace the diff of a single file, leaving the others as they are.
+
+        Args:
+            path: The path of the file, relative to the top of the working tree.
+            diff: The output of `git diff` for that file. Empty if it's unchanged.
+        """
+        self.document.set_file(path, parse_diff(diff))
+        self._document_updated()
+
+    def scroll_to_file(self, path: str) -> None:
+        """Scroll so the diff of the given file is at the top of the panel."""
+        if (offset := self.document.file_offset(path)) is not None:
+            self.scroll_to(y=offset, animate=False)
+
+    def action_stage_hunk(self) -> None:
+        document = self.document
+        if document.line_count == 0:
+            return
+        line_number = min(self.scroll_offset.y, document.line_count - 1)
+        if (hunk := document.get_hunk_patch(line_number)) is not None:
+            file_diff, patch = hunk
+            self.post_message(self.HunkStagingRequested(file_diff.path, patch))
+
+    def action_next_hunk(self) -> None:
+        self._scroll_to_hunk(1)
+
+    def action_previous_hunk(self) -> None:
+        self._scroll_to_hunk(-1)
+
+    def _scroll_to_hunk(self, step: int) -> None:
+        document = self.document
+        if document.line_count == 0:
+            return
+        if (line_number := document.find_hunk(self.scroll_offset.y, step)) is not None:
+            self.scroll_to(y=line_number, animate=False)
+
+    def _document_updated(self) -> None:
+        document = self.document
+        self.virtual_size = Size(document.width, document.line_count)
+        self.refresh()
+
+    async def on_unmount(self) -> None:
+        await self.highlighter.close()
+
+    def notify_style_update(self) -> None:
+        super().notify_style_update()
+        self._strip_cache.clear()
+
+    def render_lines(self, crop: Region) -> list[Strip]:
+        scroll_y = self.scroll_offset.y
+        start = max(0, scroll_y + crop.y - self.OVERSCAN)
+        end = min(self.document.line_count, scroll_y + crop.bottom + self.OVERSCAN)
+        self._highlight_hunks(start, end)
+        lines = super().render_lines(crop)
+        # Render lines just out of view, so they're ready when scrolled to.
+        for line_number in range(start, end):
+            self._render_diff_line(line_number)
+        return lines
+
+    def _highlight_hunks(self, start: int, end: int) -> None:
+        """Highlight the hunks overlapping the given lines, if not done already."""
+        document = self.document
+        hunk_highlights = self._hunk_highlights
+        hunks: dict[tuple[tuple[str, str], int], tuple[str, list[str]]] = {}
+        for line_number in range(start, end):
+            file_diff, line_index, _ = document.get_line(line_number)
+            hunk_start = document.get_hunk_start(file_diff, line_index)
+            if hunk_start is None:
+                continue
+            key = (file_diff.key, hunk_start)
+            if key in hunks or key in hunk_highlights:
+                continue
+            lines = document.get_hunk_lines(file_diff, hunk_start)
+            if len(lines) > self.MAX_HIGHLIGHT_LINES:
+                hunk_highlights[key] = ()
             else:
-                coloured_diff.append((line, "$foreground"))
+                hunks[key] = (file_diff.path, lines)
+
+        highlights = self.highlighter.request(list(hunks.values()))
+        for key, highlight in zip(hunks, highlights):
+            if highlight is not None:
+                hunk_highlights[key] = highlight
+
+    def render_line(self, y: int) -> Strip:
+        scroll_x, scroll_y = self.scroll_offset
+        width = self.scrollable_content_region.width
+        rich_style = self.rich_style
+        line_number = scroll_y + y
+        if line_number >= self.document.line_count:
+            return Strip.blank(width, rich_style)
+        strip = self._render_diff_line(line_number)
+        return strip.crop_extend(scroll_x, scroll_x + width, rich_style).apply_offsets(
+            scroll_x, line_number
+        )
+
+    def _render_diff_line(self, line_number: int) -> Strip:
+        """Render a line of the diff at full width (i.e. not cropped to the view)."""
+        document = self.document
+        file_diff, line_index, line = document.get_line(line_number)
+        highlighted = None
+        hunk_start = document.get_hunk_start(file_diff, line_index)
+        if hunk_start is not None and line_index > hunk_start:
+            if highlights := self._hunk_highlights.get((file_diff.key, hunk_start)):
+                highlighted = highlights[line_index - hunk_start - 1]
+
+        if document.is_partial(line_number):
+            # Only shown until the section is received, so not worth caching.
+            return self._style_line(file_diff, line)
+        cache_key = (file_diff.key, line_index, highlighted is not None)
+        if (strip := self._strip_cache.get(cache_key)) is None:
+            code = None if highlighted is None else to_content(highlighted)
+            strip = self._style_line(file_diff, line, code)
+            self._strip_cache[cache_key] = strip
+        return strip
+
+    def _style_line(
+        self, file_diff: FileDiff, line: str, code: Content | None = None
+    ) -> Strip:
+        """Style a line of the diff.
 
-        content = Content.assemble(*coloured_diff)
-        self.update(content)
+        Args:
+            file_diff: The file the line belongs to.
+            line: The line, including its `+`/`-` prefix.
+            code: The line's highlighted code (without prefix), if ready.
+        """
+        line = line.rstrip("\r\n")
+        line = line[:1] + line[1:].expandtabs()
+        if not line:
+            return Strip([Segment("")], 0)
+        if code is None:
+            content = Content.styled(line, _line_style(line))
+        else:
+            # Syntax highlighting takes precedence over the colour of the line.
+            content = (Content(line[:1]) + code).stylize_before(_line_style(line))
+        strips = Visual.to_strips(
+            self, content, content.cell_length, 1, self.visual_style
+        )
+        return strips[0]
@@ -1,78 +1,136 @@
+from dataclasses import dataclass
+from typing import Any, Iterable
+
 from textual import getters
 from textual.app import ComposeResult
-from textual.containers import Vertical
+from textual.binding import Binding
 from textual.content import Content
-from textual.widgets import OptionList
-from textual.widgets.option_list import Option
+from textual.message import Message
 
 from moonbunny.models import FileStatus
+from moonbunny.widgets.filterable_panel import FilterablePanel
+from moonbunny.widgets.keyed_option_list import KeyedOptionList
+
+
+def _make_prompt(file_status: FileStatus) -> Content | str:
+    # Create a display name that shows the status with proper styling
+    if file_status.staged and file_status.unstaged:
+        # Both staged and unstaged
+        return Content.assemble(
+            (" ✔️ ", "$text-success on $success-muted 30%"),
+            (" ✗ ", "$text-error on $error-muted 30%"),
+            " ",
+            file_status.name,
+        )
+    elif file_status.staged:
+        # Staged only
+        return Content.assemble(
+            (" ✔️ ", "$text-success on $success-muted 30%"),
+            " ",
+            file_status.name,
+        )
+    elif file_status.unstaged:
+        # Unstaged only
+        return Content.assemble(
+            (" ✗ ", "$text-error on $error-muted 30%"),
+            " ",
+            file_status.name,
+        )
+    else:
+        # No status indicators (shouldn't happen with current logic)
+        return file_status.name
+
+
+class FilesPanel(FilterablePanel[FileStatus]):
+    """A panel for displaying files. Files are filtered by their path.
+
+    Files are staged and unstaged from here. The list is updated straight
+    away with a guess at each file's new status, which is shown until the
+    index has been written and git has been asked for the statuses again.
+    """
+
+    BINDINGS = [
+        Binding("space", "toggle_staged", "stage/unstage"),
+        Binding("a", "stage_all", "stage all"),
+        Binding("u", "unstage_all", "unstage all"),
+    ]
 
+    @dataclass
+    class StagingRequested(Message):
+        """Sent when the user stages or unstages files."""
 
-class FilesPanel(Vertical):
-    """A panel for displaying files."""
+        paths: list[str]
+        """The paths of the files, relative to the top of the working tree."""
+        staged: bool
+        """Whether the files' changes should be staged, rather than unstaged."""
 
-    option_list = getters.child_by_id("files-panel-option-list", OptionList)
+    option_list = getters.child_by_id("files-panel-option-list", KeyedOptionList)
+
+    make_prompt = staticmethod(_make_prompt)
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._files: list[FileStatus] = []
+        """The files as git last listed them."""
+        self._guesses: dict[str, list[FileStatus]] = {}
+        """The statuses shown in place of git's for files being staged or unstaged,
+        keyed on the path git listed. Empty if the file is hidden."""
+
+    @staticmethod
+    def search_text(file_status: FileStatus) -> str:
+        return file_status.path
 
     def compose(self) -> ComposeResult:
         self.add_class("panel")
         self.border_title = "[u]F[/u]iles"
-        yield OptionList(id="files-panel-option-list", markup=False, compact=True)
+        yield from super().compose()
+        yield KeyedOptionList(id="files-panel-option-list", markup=False, compact=True)
+
+    def set_files(self, files: list[FileStatus], settled: Iterable[str] = ()) -> None:
+        """Set the files to display.
 
-    def set_files(self, files: list[FileStatus]) -> None:
-        """Set the files to display."""
+        Only files whose status changed are updated, and the highlighted file
+        stays highlighted if it's still present.
 
-        # Check the currently highlighted option ID, so that if it's still present after
-        # the list is updated, we can re-highlight it.
-        option_list = self.option_list
-        highlighted_index = option_list.highlighted or 0
-        if option_list.option_count == 0:
-            previous_highlighted_option_id = None
-        else:
-            previous_highlighted_option_id = option_list.options[highlighted_index].id
+        Args:
+            files: The status of each file, as listed by git.
+            settled: Files which were staged or unstaged before git listed
+                them, so whose guessed statuses can be dropped.
+        """
+        self._files = files
+        for path in settled:
+            self._guesses.pop(path, None)
+        self._show_files()
 
-        # Clear the list and add the new files.
-        option_list.clear_options()
+    def _show_files(self) -> None:
+        guesses = self._guesses
+        self.set_items(
+            (shown.path, shown)
+            for file_status in self._files
+            for shown in guesses.get(file_status.path, [file_status])
+        )
 
-        # Create options for each file status
-        options: list[Option] = []
+    def set_staged(self, files: Iterable[FileStatus], staged: bool) -> None:
+        """Stage or unstage files, showing their guessed new statuses meanwhile."""
+        paths: list[str] = []
         for file_status in files:
-            # Create a display name that shows the status with proper styling
-            option_id = str(file_status.path)
-
-            if file_status.staged and file_status.unstaged:
-                # Both staged and unstaged
-                display_content = Content.assemble(
-                    (" ✔️ ", "$text-success on $success-muted 30%"),
-                    (" ✗ ", "$text-error on $error-muted 30%"),
-                    " ",
-                    file_status.path.name,
-                )
-            elif file_status.staged:
-                # Staged only
-                display_content = Content.assemble(
-                    (" ✔️ ", "$text-success on $success-muted 30%"),
-                    " ",
-                    file_status.path.name,
-                )
-            elif file_status.unstaged:
-                # Unstaged only
-                display_content = Content.assemble(
-                    (" ✗ ", "$text-error on $error-muted 30%"),
-                    " ",
-                    file_status.path.name,
-                )
-            else:
-                # No status indicators (shouldn't happen with current logic)
-                display_content = file_status.path.name
-
-            options.append(Option(display_content, id=option_id))
-
-        option_list.add_options(options)
-
-        # Re-highlight the previously highlighted option, if it's still present.
-        for index, option in enumerate(option_list.options):
-            if option.id == previous_highlighted_option_id:
-                option_list.highlighted = index
-                break
-        else:
-            option_list.highlighted = 0
+            guess = file_status.as_staged() if staged else file_status.as_unstaged()
+            if guess != [file_status]:
+                self._guesses[file_status.path] = guess
+                paths.extend(file_status.index_paths(staged))
+        if paths:
+            self._show_files()
+            self.post_message(self.StagingRequested(paths, staged))
+
+    def action_toggle_staged(self) -> None:
+        option = self.active_list.highlighted_option
+        if option is None or (file_status := self._items.get(option.id or "")) is None:
+            return
+        # Anything left to stage is staged first, and then it's unstaged.
+        self.set_staged([file_status], file_status.unstaged)
+
+    def action_stage_all(self) -> None:
+        self.set_staged(self._items.values(), True)
+
+    def action_unstage_all(self) -> None:
+        self.set_staged(self._items.values(), False)
@@ -0,0 +1,214 @@
+import asyncio
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Hashable, Iterable, Sequence
+
+from textual import events, getters, on, work
+from textual.app import ComposeResult
+from textual.binding import Binding
+from textual.containers import Vertical
+from textual.content import Content
+from textual.widgets import Input
+
+from moonbunny.search import SearchIndex, Span
+from moonbunny.widgets.keyed_option_list import KeyedOptionList
+
+MATCH_STYLE = "bold $text-warning"
+"""The style of the parts of an item which matched the filter."""
+
+
+def highlight_matches(
+    prompt: Content | str, text: str, spans: Sequence[Span]
+) -> Content:
+    """Highlight the parts of an item's search text which matched.
+
+    The search text is expected to end the prompt, though only the end of it
+    may be shown, e.g. a file's name but not its directory. Matches in the
+    part which isn't shown are left out.
+    """
+    content = Content(prompt) if isinstance(prompt, str) else prompt
+    plain = content.plain
+    shown = 0
+    while (
+        shown < len(plain)
+        and shown < len(text)
+        and plain[-1 - shown] == text[-1 - shown]
+    ):
+        shown += 1
+    offset = len(plain) - len(text)
+    for start, end in spans:
+        start = max(start, len(text) - shown)
+        if start < end:
+            content = content.stylize(MATCH_STYLE, offset + start, offset + end)
+    return content
+
+
+class FilterablePanel[T: Hashable](Vertical):
+    """A panel listing items, which the user can filter by typing.
+
+    Pressing `/` shows an input above the list. As the user types, a second
+    list takes the place of the first, showing only the items matching the
+    query, best first, with the matching parts highlighted. The full list is
+    left as it is, so clearing the filter is instant however long it is.
+    Items are searched with a `SearchIndex`, which is updated on a background
+    thread whenever the panel's items change, so it's ready by the time the
+    user starts typing.
+
+    Subclasses show their items with `set_items` and `extend_items`, and
+    define how an item is shown and what text it's found by.
+    """
+
+    BINDINGS = [
+        Binding("slash", "filter", "filter"),
+        Binding("escape", "clear_filter", "clear filter"),
+        Binding("down", "focus_list", show=False),
+    ]
+
+    option_list: getters.child_by_id[KeyedOptionList]
+    """The list of every item, which subclasses get by its ID."""
+    filtered_list = getters.query_one(".panel-filtered-list", KeyedOptionList)
+    """The list of the items matching the filter, shown in place of the other."""
+    filter_input = getters.query_one(".panel-filter", Input)
+
+    make_prompt: Callable[[T], Content | str]
+    """Creates the prompt of an item's option."""
+    search_text: Callable[[T], str]
+    """The text an item is found by. Called on a background thread."""
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._items: dict[str, T] = {}
+        """The data of every item, keyed on its option's ID, in order."""
+        self._search_index = SearchIndex()
+        self._indexer = ThreadPoolExecutor(1, thread_name_prefix="search-index")
+        """Updates the search index off the UI thread, but in order."""
+
+    def compose(self) -> ComposeResult:
+        # Disabled while hidden, so it can't take the focus.
+        yield Input(
+            placeholder="filter", classes="panel-filter", compact=True, disabled=True
+        )
+        yield KeyedOptionList(classes="panel-filtered-list", markup=False, compact=True)
+
+    def on_unmount(self) -> None:
+        self._indexer.shutdown(wait=False, cancel_futures=True)
+
+    @property
+    def filtering(self) -> bool:
+        """Whether the list is filtered, rather than showing every item."""
+        return self.has_class("-filtered")
+
+    @property
+    def active_list(self) -> KeyedOptionList:
+        """The list being shown."""
+        return self.filtered_list if self.filtering else self.option_list
+
+    def set_items(self, items: Iterable[tuple[str, T]]) -> None:
+        """Set the items to show, as with `KeyedOptionList.reconcile`."""
+        items = list(items)
+        self._items = dict(items)
+        self.option_list.reconcile(items, self.make_prompt)
+        self._update_index(self._search_index.update, items)
+
+    def extend_items(self, items: Iterable[tuple[str, T]]) -> None:
+        """Add items to the end, as with `KeyedOptionList.extend`."""
+        items = list(items)
+        self._items.update(items)
+        self.option_list.extend(items, self.make_prompt)
+        self._update_index(self._search_index.extend, items)
+
+    def _update_index(
+        self,
+        update: Callable[[list[tuple[str, str]]], None],
+        items: list[tuple[str, T]],
+    ) -> None:
+        search_text = self.search_text
+
+        def index() -> None:
+            update([(option_id, search_text(data)) for option_id, data in items])
+
+        self._refilter_when_indexed(self._indexer.submit(index))
+
+    @work(group="search-index")
+    async def _refilter_when_indexed(self, indexed: Future[None]) -> None:
+        await asyncio.wrap_future(indexed)
+        if self.filtering:
+            self.refilter()
+
+    def refilter(self) -> None:
+        """Show the items matching the filter, or every item if there's no filter."""
+        query = self.filter_input.value
+        if not query.strip():
+            self._show_filtered(False)
+            return
+        matches = self._search_index.search(query)
+        if matches is None:
+            # The index is being updated, and the list is refiltered after.
+            return
+        items = self._items
+        self.filtered_list.reconcile(
+            [
+                (match.key, (items[match.key], match.spans))
+                for match in matches
+                if match.key in items
+            ],
+            self._make_match_prompt,
+        )
+        self._show_filtered(True)
+
+    def _show_filtered(self, filtered: bool) -> None:
+        """Show the filtered list in place of the full one, or the full one again."""
+        if filtered == self.filtering:
+            return
+        focused = self.filtered_list.has_focus
+        if not filtered and focused:
+            # Stay on the item the user moved to in the filtered list.
+            highlighted = self.filtered_list.highlighted_option
+            if highlighted is not None and highlighted.id in self._items:
+                option_list = self.option_list
+                option_list.highlighted = option_list.get_option_index(highlighted.id)
+        self.set_class(filtered, "-filtered")
+        if focused:
+            self.option_list.focus()
+
+    def _make_match_prompt(self, match: tuple[T, tuple[Span, ...]]) -> Content:
+        data, spans = match
+        return highlight_matches(self.make_prompt(data), self.search_text(data), spans)
+
+    @on(Input.Changed, ".panel-filter")
+    def _filter_changed(self, event: Input.Changed) -> None:
+        event.stop()
+        self.refilter()
+
+    @on(Input.Submitted, ".panel-filter")
+    def _filter_submitted(self, event: Input.Submitted) -> None:
+        event.stop()
+        self.active_list.focus()
+
+    @on(events.DescendantFocus)
+    def _focus_active_list(self, event: events.DescendantFocus) -> None:
+        # e.g. when the screen focuses the full list while it's hidden.
+        if event.widget is self.option_list and self.filtering:
+            self.filtered_list.focus()
+
+    def check_action(self, action: str, parameters: tuple[object, ...]) -> bool | None:
+        if action == "clear_filter":
+            # Otherwise escape is left to the screen.
+            return self.has_class("-filtering")
+        return True
+
+    def action_filter(self) -> None:
+        self.add_class("-filtering")
+        self.filter_input.disabled = False
+        self.filter_input.focus()
+
+    def action_clear_filter(self) -> None:
+        self._show_filtered(False)
+        self.remove_class("-filtering")
+        self.option_list.focus()
+        filter_input = self.filter_input
+        filter_input.disabled = True
+        with filter_input.prevent(Input.Changed):
+            filter_input.value = ""
+
+    def action_focus_list(self) -> None:
+        self.active_list.focus()
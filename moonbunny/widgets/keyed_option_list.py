@@ -0,0 +1,187 @@
+from typing import Any, Callable, Hashable, Iterable, Self, Sequence
+
+from textual.visual import VisualType
+from textual.widgets import OptionList
+from textual.widgets.option_list import DuplicateID, Option, OptionDoesNotExist
+
+_MISSING = object()
+
+
+class KeyedOptionList(OptionList):
+    """An `OptionList` which can be updated in place rather than rebuilt.
+
+    Each option is identified by its ID and the data it was made from. When
+    the list is updated with `reconcile`, options whose ID and data are
+    unchanged are kept (along with the visuals Textual has built for them),
+    and only the run of options from the first difference to the last is
+    replaced. The highlight and scroll position are left alone, aside from
+    following the highlighted option if it moves.
+
+    Everything goes through `OptionList`'s public API, apart from replacing
+    options part-way through the list, which it has no cheap way to do.
+    That's done by `_splice_options`, the one place `OptionList`'s internals
+    are touched.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        self._option_data: dict[str, Hashable] = {}
+        """The data each option was made from, keyed on the option's ID."""
+        super().__init__(*args, **kwargs)
+
+    def reconcile[T: Hashable](
+        self, items: Sequence[tuple[str, T]], make_prompt: Callable[[T], VisualType]
+    ) -> Self:
+        """Update the list to show the given items.
+
+        Args:
+            items: The ID and data of each option, in order.
+            make_prompt: Creates the prompt of an option from its data. Only
+                called for options which are new or whose data has changed.
+        """
+        options = self.options
+        data = self._option_data
+        new_data: dict[str, Hashable] = dict(items)
+        if len(new_data) != len(items):
+            raise DuplicateID("Options contain duplicated IDs; Ensure they are unique.")
+
+        def unchanged(option: Option, item: tuple[str, T]) -> bool:
+            option_id, value = item
+            return option.id == option_id and data.get(option_id, _MISSING) == value
+
+        # Find the run of options which differ, between a common prefix and suffix.
+        start = 0
+        common = min(len(options), len(items))
+        while start < common and unchanged(options[start], items[start]):
+            start += 1
+        old_stop = len(options)
+        new_stop = len(items)
+        while (
+            old_stop > start
+            and new_stop > start
+            and unchanged(options[old_stop - 1], items[new_stop - 1])
+        ):
+            old_stop -= 1
+            new_stop -= 1
+        if start == old_stop and start == new_stop:
+            return self
+
+        highlighted_option = self.highlighted_option
+        self._option_data = new_data
+        existing = {option.id: option for option in options[start:old_stop]}
+        replacements: list[Option] = []
+        for option_id, value in items[start:new_stop]:
+            option = existing.get(option_id)
+            if option is None or data.get(option_id, _MISSING) != value:
+                option = Option(make_prompt(value), id=option_id)
+            replacements.append(option)
+        self._splice_options(start, old_stop, replacements)
+        self._restore_highlight(highlighted_option)
+        return self
+
+    def extend[T: Hashable](
+        self, items: Iterable[tuple[str, T]], make_prompt: Callable[[T], VisualType]
+    ) -> Self:
+        """Add options to the end of the list, e.g. as they stream in."""
+        items = list(items)
+        self.add_options(
+            Option(make_prompt(value), id=option_id) for option_id, value in items
+        )
+        self._option_data.update(items)
+        return self
+
+    @property
+    def highlighted_option(self) -> Option | None:
+        """The highlighted option, or `None` if no option is highlighted.
+
+        Defined here as `OptionList` only has it in newer versions of Textual.
+        """
+        if self.highlighted is None:
+            return None
+        return self.get_option_at_index(self.highlighted)
+
+    def clear_options(self) -> Self:
+        self._option_data.clear()
+        return super().clear_options()
+
+    def _splice_options(
+        self, start: int, stop: int, replacements: list[Option]
+    ) -> None:
+        """Replace the options from `start` to `stop` (exclusive).
+
+        `OptionList` can only add options at the end, and removing or changing
+        any other option has it measure every option again. So this works on
+        the private state of `OptionList` (as of Textual 5 to 8) directly: the
+        `_options` list, the `_id_to_option` and `_option_to_index` dicts, and
+        the `_line_cache` of where each option is. Only the options from
+        `start` on are measured again.
+
+        If that state isn't there, the options from `start` on are removed
+        and added again through the public API instead, which is slower but
+        correct.
+        """
+        options = getattr(self, "_options", None)
+        id_to_option = getattr(self, "_id_to_option", None)
+        option_to_index = getattr(self, "_option_to_index", None)
+        line_cache = getattr(self, "_line_cache", None)
+        lines = getattr(line_cache, "lines", None)
+        heights = getattr(line_cache, "heights", None)
+        index_to_line = getattr(line_cache, "index_to_line", None)
+        clear_render_cache = getattr(
+            getattr(self, "_option_render_cache", None), "clear", None
+        )
+        update_lines = getattr(self, "_update_lines", None)
+        if not (
+            isinstance(options, list)
+            and isinstance(id_to_option, dict)
+            and isinstance(option_to_index, dict)
+            and isinstance(lines, list)
+            and isinstance(heights, dict)
+            and isinstance(index_to_line, dict)
+            and callable(clear_render_cache)
+            and callable(update_lines)
+        ):
+            tail = list(self.options[stop:])
+            for index in reversed(range(start, self.option_count)):
+                self.remove_option_at_index(index)
+            self.add_options(replacements + tail)
+            return
+
+        old_count = len(options)
+        for option in options[start:stop]:
+            del option_to_index[option]
+            if option.id is not None:
+                del id_to_option[option.id]
+        options[start:stop] = replacements
+        for index in range(start, len(options)):
+            option_to_index[options[index]] = index
+        for option in replacements:
+            if option.id is not None:
+                id_to_option[option.id] = option
+
+        # The options before `start` haven't moved, so where they are still
+        # holds. `_update_lines` measures the rest again, reusing the visual
+        # already built for each option which was kept.
+        del lines[index_to_line.get(start, len(lines)) :]
+        for index in range(start, old_count):
+            heights.pop(index, None)
+            index_to_line.pop(index, None)
+        # Rendered options include their index, so can't be reused once moved.
+        clear_render_cache()
+        self._mouse_hovering_over = None
+        if self.is_mounted:
+            self.refresh(layout=self.styles.auto_dimensions)
+            update_lines()
+
+    def _restore_highlight(self, option: Option | None) -> None:
+        """Highlight the given option again (by ID), or the first if it's gone."""
+        if not self.option_count:
+            self.highlighted = None
+            return
+        index = 0
+        if option is not None and option.id is not None:
+            try:
+                index = self.get_option_index(option.id)
+            except OptionDoesNotExist:
+                pass
+        if index != self.highlighted:
+            self.highlighted = index
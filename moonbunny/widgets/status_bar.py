@@ -2,16 +2,31 @@ from textual.app import ComposeResult
 from textual.containers import HorizontalGroup
 from textual.widgets import Label
 
+from moonbunny.models import BranchStatus
+
 
 class StatusBar(HorizontalGroup):
     def compose(self) -> ComposeResult:
         yield Label("", id="status", markup=False)
         with HorizontalGroup(id="repo-and-branch"):
+            yield Label("", id="stash-count", markup=False)
+            yield Label("", id="ahead-behind", markup=False)
             yield Label("", id="repo-name", markup=False)
             yield Label("", id="branch-name", markup=False)
 
     def set_branch_name(self, branch_name: str) -> None:
         self.query_one("#branch-name", Label).update(f"{branch_name}")
 
+    def set_branch_status(self, branch: BranchStatus, stash: int = 0) -> None:
+        """Show the current branch, how it compares to its upstream, and the stash."""
+        self.set_branch_name(branch.description)
+        self._set_label("#ahead-behind", branch.tracking)
+        self._set_label("#stash-count", f"{stash} stashed" if stash else "")
+
     def set_repo_name(self, repo_name: str) -> None:
         self.query_one("#repo-name", Label).update(f"{repo_name}")
+
+    def _set_label(self, selector: str, text: str) -> None:
+        label = self.query_one(selector, Label)
+        label.update(text)
+        label.display = bool(text)
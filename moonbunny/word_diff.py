@@ -0,0 +1,76 @@
+from difflib import SequenceMatcher
+from itertools import accumulate
+import re
+from typing import Iterator, Sequence
+
+type Spans = list[tuple[int, int]]
+"""The (start, end) offsets of the parts of a line which changed."""
+
+MAX_LINE_LENGTH = 500
+"""Lines longer than this (e.g. minified code) aren't compared word by word."""
+
+MIN_SIMILARITY = 0.5
+"""Lines less similar than this are styled as wholly removed and added."""
+
+_TOKEN = re.compile(r"\w+|\s+|[^\w\s]")
+
+
+def pair_changed_lines(lines: Sequence[str]) -> Iterator[tuple[int, int]]:
+    """Pair removed lines in a hunk with the added lines which replaced them.
+
+    In each block of `-` lines followed by `+` lines, the nth removed line is
+    paired with the nth added line.
+
+    Returns:
+        The indexes of each removed line and the added line it's paired with.
+    """
+    index = 0
+    line_count = len(lines)
+    while index < line_count:
+        if not lines[index].startswith("-"):
+            index += 1
+            continue
+        removed_start = index
+        while index < line_count and lines[index].startswith("-"):
+            index += 1
+        added_start = index
+        while index < line_count and lines[index].startswith("+"):
+            index += 1
+        pairs = min(added_start - removed_start, index - added_start)
+        for offset in range(pairs):
+            yield removed_start + offset, added_start + offset
+
+
+def change_spans(old: str, new: str) -> tuple[Spans, Spans] | None:
+    """Find the words which differ between a removed line and an added line.
+
+    Returns:
+        The spans of the changes in each line, or `None` if the lines are too
+        long or too different for the comparison to be useful.
+    """
+    if len(old) > MAX_LINE_LENGTH or len(new) > MAX_LINE_LENGTH or old == new:
+        return None
+
+    old_tokens = _TOKEN.findall(old)
+    new_tokens = _TOKEN.findall(new)
+    matcher = SequenceMatcher(None, old_tokens, new_tokens, autojunk=False)
+    # Each check is cheaper (and less precise) than the next.
+    if (
+        matcher.real_quick_ratio() < MIN_SIMILARITY
+        or matcher.quick_ratio() < MIN_SIMILARITY
+        or matcher.ratio() < MIN_SIMILARITY
+    ):
+        return None
+
+    old_offsets = [0, *accumulate(map(len, old_tokens))]
+    new_offsets = [0, *accumulate(map(len, new_tokens))]
+    old_spans: Spans = []
+    new_spans: Spans = []
+    for tag, old_start, old_end, new_start, new_end in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        if old_start < old_end:
+            old_spans.append((old_offsets[old_start], old_offsets[old_end]))
+        if new_start < new_end:
+            new_spans.append((new_offsets[new_start], new_offsets[new_end]))
+    return old_spans, new_spans
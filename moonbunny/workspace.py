@@ -0,0 +1,101 @@
+import asyncio
+import glob
+import os
+from pathlib import Path
+import time
+from typing import Iterable, NamedTuple
+
+from textual import log
+
+from moonbunny.git import GitRequestFileStatus, GitTaskRunner
+from moonbunny.messages import GitPriority
+from moonbunny.models import BranchStatus
+from moonbunny.porcelain import parse_status
+
+
+def find_repositories(patterns: Iterable[str]) -> list[Path]:
+    """The repositories matching the given paths or glob patterns.
+
+    Paths may start with `~`. Anything which isn't the top of a working tree
+    is skipped, as are duplicates. Repositories are returned in the order of
+    the patterns, and sorted by path within each pattern.
+    """
+    repositories: dict[Path, None] = {}
+    for pattern in patterns:
+        expanded = os.path.expanduser(pattern)
+        for match in sorted(glob.glob(expanded)):
+            path = Path(match).resolve()
+            if (path / ".git").exists():
+                repositories[path] = None
+    return list(repositories)
+
+
+class RepositorySummary(NamedTuple):
+    """How a repository in the workspace stood when it was last refreshed."""
+
+    path: Path
+    branch: BranchStatus | None = None
+    changed: int = 0
+    """The number of files with changes, staged or not, including untracked files."""
+    stash: int = 0
+    error: str | None = None
+    """Why the repository couldn't be summarised, if it couldn't."""
+    refreshed_at: float | None = None
+    """When the summary was last refreshed, or `None` if it hasn't been yet."""
+
+
+class Workspace:
+    """Several repositories open at once, each with its own runner.
+
+    The runners share one pool of git processes, so the workspace as a whole
+    never runs more git processes than one repository would. The summary of
+    each repository is refreshed in the background at `PREFETCH` priority, one
+    repository at a time and spread out over the refresh interval, so anything
+    the user is doing in the open repository is never held up.
+    """
+
+    MIN_STAGGER = 0.2
+    """The shortest time between refreshing one repository and the next, in seconds."""
+
+    def __init__(
+        self, runners: dict[Path, GitTaskRunner], refresh_interval: float = 60
+    ) -> None:
+        """
+        Args:
+            runners: The runner for each repository, in the order they're listed.
+            refresh_interval: How often each summary is refreshed, in seconds.
+        """
+        self.runners = runners
+        self.refresh_interval = refresh_interval
+        self.summaries = {path: RepositorySummary(path) for path in runners}
+
+    async def refresh_summaries(self) -> None:
+        """Refresh the summaries forever, starting with a quick first pass."""
+        stagger = self.MIN_STAGGER
+        while True:
+            for path in self.runners:
+                await self.refresh_summary(path)
+                await asyncio.sleep(stagger)
+            stagger = max(self.MIN_STAGGER, self.refresh_interval / len(self.runners))
+
+    async def refresh_summary(self, path: Path) -> RepositorySummary:
+        """Refresh the summary of a repository from its status."""
+        result = await self.runners[path].submit(
+            GitRequestFileStatus(priority=GitPriority.PREFETCH), post_result=False
+        )
+        if result.returncode != 0:
+            error = result.stderr.decode("utf-8", errors="replace").strip()
+            summary = RepositorySummary(path, error=error or "git status failed")
+        else:
+            try:
+                status = parse_status(result.stdout)
+            except ValueError as error:
+                log.warning(f"Couldn't parse git status of {path}: {error}")
+                summary = RepositorySummary(path, error="couldn't read the status")
+            else:
+                summary = RepositorySummary(
+                    path, status.branch, len(status.entries), status.stash
+                )
+        summary = summary._replace(refreshed_at=time.time())
+        self.summaries[path] = summary
+        return summary
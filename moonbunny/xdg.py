@@ -26,6 +26,13 @@ def default_collection_directory() -> Path:
     return data_directory() / "default"
 
 
+def repository_data_directory() -> Path:
+    """Return (possibly creating) the directory for per-repository data."""
+    repository_dir = data_directory() / "repositories"
+    repository_dir.mkdir(exist_ok=True, parents=True)
+    return repository_dir
+
+
 def config_directory() -> Path:
     """Return (possibly creating) the application config directory."""
     return _moonbunny_directory(xdg_config_home())